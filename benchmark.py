@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+Benchmark the compare-telescopes workloads and compare them against stored baselines.
+
+Every workload runs in its own process so the peak memory (max RSS) and caches belong to that workload alone.
+Throughput is in operations per second: program starts, Gear constructions, comparisons or combinations.
+
+  benchmark.py --save            measure and store the results as the baseline
+  benchmark.py                   measure and exit 1 if a workload got slower or bigger than the baseline allows,
+                                 or has no baseline yet
+  benchmark.py --quick           skip the 1M comparison batch
+"""
+import argparse
+import json
+import os.path
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+import compare_telescopes as ct
+
+HERE = os.path.dirname(os.path.realpath(__file__))
+WORKLOADS = ('startup', 'gear-parse', 'gear-cached', 'compare', 'batch-10k', 'batch-1m', 'cross-product')
+QUICK_SKIP = ('batch-1m',)
+CROSS_PRODUCT_GEAR = 'cross-product.json'  # next to the synthetic gear file, smaller as the product grows squared
+
+
+def main():
+    parser = argparse.ArgumentParser(formatter_class=argparse.RawDescriptionHelpFormatter, description=__doc__)
+    parser.add_argument("--quick", action="store_true", help="Skip the slowest workloads")
+    parser.add_argument("--only", required=False, type=str, help="Run only these workloads [comma separated]")
+    parser.add_argument("--save", action="store_true", help="Store the results as the new baseline")
+    parser.add_argument("--baseline", default=os.path.join(HERE, 'benchmark-baseline.json'),
+                        help="Baseline file [default benchmark-baseline.json next to this script]")
+    parser.add_argument("--tolerance", default=0.25, type=float,
+                        help="Allowed throughput loss and memory growth against the baseline [float, default 0.25]")
+    parser.add_argument("--gear-size", default=10000, type=int,
+                        help="Telescopes and cameras each in the synthetic gear file [integer, default 10000]")
+    parser.add_argument("--cross-size", default=200, type=int,
+                        help="Telescopes and cameras each in the cross product gear file [integer, default 200]")
+    parser.add_argument("--run", required=False, type=str, help=argparse.SUPPRESS)
+    parser.add_argument("--gear-file", required=False, type=str, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run:
+        print(json.dumps(run_workload(args.run, args.gear_file)))
+        return
+
+    names = args.only.split(',') if args.only else [name for name in WORKLOADS
+                                                    if not (args.quick and name in QUICK_SKIP)]
+    unknown = [name for name in names if name not in WORKLOADS]
+    if unknown:
+        print('{} is an unknown workload, choose from {}'.format(', '.join(unknown), ', '.join(WORKLOADS)))
+        sys.exit(1)
+    baseline = {}
+    if os.path.isfile(args.baseline):
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)
+    elif not args.save:
+        print('No baseline {}, measure one on this machine with --save first'.format(args.baseline))
+        sys.exit(1)
+
+    results = {}
+    failed = []
+    with tempfile.TemporaryDirectory() as directory:
+        gear_file = os.path.join(directory, 'telescopes-and-cameras.json')
+        write_synthetic_gear(gear_file, args.gear_size)
+        write_synthetic_gear(os.path.join(directory, CROSS_PRODUCT_GEAR), args.cross_size)
+        print('{:14s} {:>10s} {:>12s} {:>9s} {:>12s} {:>8s}'.format(
+            'workload', 'seconds', 'ops/s', 'peak MB', 'base ops/s', 'change'))
+        for name in names:
+            output = subprocess.run([sys.executable, os.path.realpath(__file__), '--run', name, '--gear-file', gear_file],
+                                    check=True, stdout=subprocess.PIPE, universal_newlines=True).stdout
+            result = json.loads(output)
+            results[name] = result
+            base = baseline.get(name)
+            line = '{:14s} {:10.3f} {:12.1f} {:9.1f}'.format(
+                name, result['seconds'], result['ops_per_second'], result['peak_mb'])
+            if not base:
+                failed.append('{} has no baseline, measure one with --save'.format(name))
+            else:
+                change = result['ops_per_second'] / base['ops_per_second'] - 1
+                line += ' {:12.1f} {:+7.1f}%'.format(base['ops_per_second'], 100 * change)
+                if change < -args.tolerance:
+                    failed.append('{} throughput {:.1f} ops/s is {:.0f}% below the baseline {:.1f} ops/s'.format(
+                        name, result['ops_per_second'], -100 * change, base['ops_per_second']))
+                if result['peak_mb'] > base['peak_mb'] * (1 + args.tolerance):
+                    failed.append('{} peak memory {:.1f} MB is above the baseline {:.1f} MB'.format(
+                        name, result['peak_mb'], base['peak_mb']))
+            print(line)
+
+    if args.save:
+        baseline.update(results)
+        with open(args.baseline, 'w') as baseline_file:
+            json.dump(baseline, baseline_file, indent=4, sort_keys=True)
+        print('Saved baseline {}'.format(args.baseline))
+    elif failed:
+        print('REGRESSION')
+        for message in failed:
+            print('  ' + message)
+        sys.exit(1)
+
+
+def write_synthetic_gear(file, size):
+    """A custom gear file with size telescopes and size cameras of plausible, reproducible values."""
+    rng = random.Random(42)
+    scopes = {}
+    cameras = {}
+    for n in range(size):
+        d = rng.choice((80, 100, 130, 150, 203, 254, 305, 356, 432, 508))
+        if n % 2:
+            scopes['scope{}'.format(n)] = {'d': d, 'l': round(d * rng.uniform(2, 12)), 'o': round(rng.uniform(0, 0.5), 2)}
+        else:
+            scopes['scope{}'.format(n)] = {'d': d, 'f': round(rng.uniform(2, 12), 1)}
+        cameras['camera{}'.format(n)] = {'h': rng.randrange(1000, 10000), 'v': rng.randrange(1000, 7000),
+                                         'p': round(rng.uniform(2.4, 9), 2), 'q': round(rng.uniform(0.4, 0.95), 2)}
+    with open(file, 'w') as json_file:
+        json.dump({'scopes': scopes, 'cameras': cameras}, json_file)
+
+
+def batch_lines(count):
+    """CSV input for --batch, cycling through a few catalog setups with varying reducer and binning."""
+    yield 's1,c1,r1,c1b,s2,c2\n'
+    scopes = ('RASA8', 'TEC140', 'C8', 'CDK14', 'ED80')
+    cameras = ('ASI2600', 'ASI6200', 'ASI183', 'KAF16803')
+    for n in range(count):
+        yield '{},{},{},{},TEC140,ASI6200\n'.format(scopes[n % 5], cameras[n % 4], 0.6 + (n % 5) / 10, 1 + n % 4)
+
+
+def run_workload(name, gear_file):
+    """Run one workload in this process and return its seconds, operations per second and peak memory."""
+    start = time.perf_counter()
+    if name == 'startup':
+        operations = 5
+        for _ in range(operations):
+            subprocess.run([sys.executable, os.path.join(HERE, 'compare-telescopes.py'), '--d1', '100', '--f1', '6',
+                            '--d2', '80', '--f2', '7'], check=True, stdout=subprocess.DEVNULL)
+    elif name == 'gear-parse':
+        operations = 5
+        for _ in range(operations):
+            ct.Gear(gear_file, cache=False)
+    elif name == 'gear-cached':
+        ct.Gear(gear_file)  # writes the cache
+        start = time.perf_counter()
+        operations = 5
+        for _ in range(operations):
+            ct.Gear(gear_file)
+    elif name == 'compare':
+        operations = 10000
+        for _ in range(operations):
+            ct.compare(ct.Telescope(d=100, f=6), ct.Camera(h=4656, v=3520, p=3.8, q=0.75), ct.Telescope(d=80, f=7))
+    elif name in ('batch-10k', 'batch-1m'):
+        operations = 10000 if name == 'batch-10k' else 1000000
+        gear = ct.Gear(gear_file)
+        fields = ('line',) + ct.RECORD_FIELDS + ('error',)
+        with open(os.devnull, 'wb') as stream:
+            writer = ct.RecordWriter(stream, 'jsonl', fields)
+            for number, result in ct.batch(gear, batch_lines(operations)):
+                writer.write(ct.result_record(('line',), {'line': number}, result))
+            writer.close()
+    elif name == 'cross-product':
+        gear = ct.Gear(os.path.join(os.path.dirname(gear_file), CROSS_PRODUCT_GEAR))
+        product = ct.cross_product(gear.scopes, gear.cameras, (1, 0.8, 0.63), (1, 2, 3, 4))
+        operations = len(product['scope'])
+    else:
+        raise ValueError(name)
+    seconds = time.perf_counter() - start
+    peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if name == 'startup':
+        peak_kb = max(peak_kb, resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    return {'seconds': seconds, 'operations': operations, 'ops_per_second': operations / seconds,
+            'peak_mb': peak_kb / 1024}
+
+
+if __name__ == '__main__':
+    main()
@@ -3,6 +3,18 @@
 Compare the imaging performance of 2 telescopes for astrophotography.
 Performance indicators are: pixel scale (res), FOV, extended object irradiance (eoi), point object irradiance (poi), etendue (e), pixel etendue (pe), pixel signal (ps) and object signal (os).
 
+Version 1.16 add --pareto frontier of the known telescope, reducer, camera and binning combinations over several indicators
+Version 1.15 add --import to stream vendor CSV or JSON lines catalogs into the known telescopes and cameras
+Version 1.14 add --serve for a local HTTP service with compare, batch, sweep, query and stats endpoints
+Version 1.13 add --interactive what-if sessions that only recompute and reprint what changed
+Version 1.12 add --uncertainty Monte Carlo confidence intervals of the ratios
+Version 1.11 add --simulate to render star field frames and measure the predicted signals
+Version 1.10 add --seeing under-, well- and over-sampled fractions from a seeing log
+Version 1.9 add --mosaic panel grids and integration time for a target list
+Version 1.8 add --optimize to find the best telescope, reducer, camera and binning combinations within constraints
+Version 1.7 add --exposure absolute signal to noise and integration time over sky and target brightness grids
+Version 1.6 add --spectral per filter band comparison with QE and transmittance curves
+Version 1.5 add --matrix to compare every known telescope and camera combination in one pass
 Version 1.4 add a known list of telescopes and cameras, -s and -c
 Version 1.3 add ObjectSignal as os, rename et->e pet->pe, psi->ps
 Version 1.2 add defaults for aperture diameter, focal length, focal ratio
@@ -11,213 +23,73 @@ Version 1.0
 Source code at https://github.com/d33psky/compare-telescopes/
 """
 import argparse
-import math
-import textwrap
+import collections
+import contextlib
+import functools
+import itertools
 import json
+import re
+import textwrap
 import os.path
 import sys
+import time
 
-default_json_data = """
-{
-    "scopes": {
-        "ED80": { "d": 80, "l": 600 },
-        "ESPRIT100": { "d": 100, "f": 5.5 },
-        "ESPRIT150": { "d": 150, "f": 7 },
-        "APO130": { "d": 130, "l": 650 },
-        "TS-photoline-130": { "d": 130, "l": 910 },
-        "SV102ED": { "d": 102, "l": 710 },
-        "TOA150B": { "d": 150, "l": 1100 },
-        "APMLZOS152": { "d": 152, "l": 1200 },
-        "TEC140": { "d": 140, "l": 980 },
-        "epsilon-180ED": { "d": 180, "f": 2.8 },
-        "BS10ED": { "di": 10, "l": 711, "o": 0.35 },
-        "BS12ED": { "di": 12, "l": 854, "o": 0.34 },
-        "AGOiDK10": { "d": 254, "l": 1674, "o": 0.56 },
-        "AGOiDK12.5": { "d": 318, "l": 2128, "o": 0.54 },
-        "AGOiDK14.5": { "d": 368, "l": 2464, "o": 0.52 },
-        "AGOiDK17": { "d": 432, "l": 2884, "o": 0.49 },
-        "AGOiDK20": { "d": 508, "l": 3403, "o": 0.48 },
-        "dream16_3.75": { "di": 16, "f": 3.75, "o": 0.375 },
-        "MN-152": { "manufacturer": "Explore Scientific", "alias1": "MN6", "type": "Maksutov-Newton", "d": 152, "f": 5, "o": 0.32 },
-        "CDK12.5": { "d": 318, "l": 2541, "o": 0.37 },
-        "CDK14": { "d": 356, "l": 2563, "o": 0.24 },
-        "CDK17": { "d": 432, "l": 2939, "o": 0.24 },
-        "CDK20f7.77": { "d": 508, "l": 3951, "o": 0.15 },
-        "CDK20f6.8": { "d": 508, "l": 3454, "o": 0.15 },
-        "CDK24": { "d": 610, "l": 3974, "o": 0.22 },
-        "C8": { "di": 8, "f": 10, "o": 0.39 },
-        "C8-H3": { "di": 8, "l": 425, "o": 0.39 },
-        "C8-H4": { "di": 8, "l": 390, "o": 0.39 },
-        "C9.25": { "di": 9.25, "f": 10, "o": 0.36 },
-        "C11": { "di": 11, "f": 10, "o": 0.34 },
-        "C14": { "di": 14, "f": 10, "o": 0.32 },
-        "C14-H4": { "di": 14, "l": 715, "o": 0.32 },
-        "AT6RC": { "di": 6, "l": 1370, "o": 0.50 },
-        "AT10RC": { "di": 10, "l": 2000, "o": 0.43 },
-        "TSRC8": { "d": 203, "l": 1624, "o": 0.42 },
-        "GSRC10": { "d": 254, "l": 2000, "o": 0.44 },
-        "GSRC12": { "d": 304, "l": 2432, "o": 0.49 },
-        "GSRC14": { "di": 14, "l": 2854, "o": 0.5 },
-        "LX200-8f10": { "di": 8, "f": 10, "o": 0.38 },
-        "LX200-10f10": { "di": 10, "f": 10, "o": 0.37 },
-        "LX200-14f10": { "di": 14, "f": 10, "o": 0.32 },
-        "ACF10f8": { "di": 10, "f": 8, "o": 0.47 },
-        "ACF12f8": { "di": 12, "f": 8, "o": 0.41 },
-        "ACF14f8": { "di": 14, "f": 8, "o": 0.36 },
-        "SWE250PDS": { "d": 250, "l": 1200, "o": 0.25 },
-        "MEWLON180": { "d": 180, "l": 2160, "o": 0.3 },
-        "ONTC808": { "d": 203, "l": 800, "o": 0.36 },
-        "ONTC1010": { "d": 254, "l": 1000, "o": 0.31 },
-        "ONTC1212": { "d": 303, "l": 1200, "o": 0.29 },
-        "RH200": { "d": 200, "l": 600, "o": 0.55 },
-        "RH305": { "d": 305, "l": 1159, "o": 0.24 },
-        "RASA8": { "di": 8, "l": 400, "o": 0.46 },
-        "RASA11": { "di": 11, "l": 620, "o": 0.50 },
-        "HUBBLE": { "d": 2400, "l": 57600, "o": 0.127, "t": 0.85 },
-        "EUCLID": { "d": 1200, "l": 24500, "o": 0.0, "t": 0.0 },
-        "ELT": { "d": 39300, "l": 743400, "o": 0.104 },
-        "VLT": { "d": 8200,  "l": 120000, "o": 0.136 },
-        "GTC": { "d": 10400,  "l": 169900, "o": 0.115 },
-        "KECK_p": { "d": 10000,  "l": 17500 },
-        "KECK_sf15": { "d": 10000,  "l": 149600, "o": 0.145 },
-        "KECK_sf25": { "d": 10000,  "l": 249700, "o": 0.050 },
-        "KECK_sf40": { "d": 10000,  "l": 395000, "o": 0.050 },
-        "TMT": { "d": 30000,  "l": 450000, "o": 0.103 }
-    },
-    "cameras": {
-        "ASI071": { "h": 4944, "v": 3284, "p": 4.79, "q": 0.50 },
-        "ASI120": { "h": 1280, "v": 960, "p": 3.75, "q": 0.80 },
-        "ASI2400MC": { "m": "ZWO", "s": "IMX410", "sm": "Sony", "h": 6072, "v": 4042, "p": 5.94, "q": 0.8 },
-        "ASI2600": { "h": 6248, "v": 4176, "p": 3.76, "q": 0.8 },
-        "ASI6200": { "m": "ZWO", "s": "IMX455", "sm": "Sony", "h": 9576, "v": 6388, "p": 3.76, "q": 0.91 },
-        "ASI1600": { "h": 4656, "v": 3520, "p": 3.8, "q": 0.60 },
-        "ASI462MC": { "h": 1936, "v": 1096, "p": 2.9, "q": 0.9 },
-        "ASI290": { "h": 1936, "v": 1096, "p": 2.9, "q": 0.8 },
-        "ASI294": { "h": 4144, "v": 2822, "p": 4.63, "q": 0.75 },
-        "ASI385": { "h": 1936, "v": 1096, "p": 3.75, "q": 0.80 },
-        "ASI533": { "h": 3008, "v": 3008, "p": 3.76, "q": 0.80 },
-        "ASI183": { "h": 5496, "v": 3672, "p": 2.40, "q": 0.84 },
-        "ATIK11000": { "h": 4007, "v": 2671, "p": 9.0, "q": 0.5 },
-        "ATIK4000": { "h": 2047, "v": 2047, "p": 7.4, "q": 0.55 },
-        "KAI11002": { "h": 4008, "v": 2672, "p": 9.0, "q": 0.5 },
-        "ATIK16200": { "h": 4499, "v": 3599, "p": 6.0, "q": 0.6 },
-        "ATIK383": { "h": 3354, "v": 2529, "p": 5.4, "q": 0.56 },
-        "ATIKONE6": { "h": 2749, "v": 2199, "p": 4.54, "q": 0.66 },
-        "ATIKONE9": { "h": 3380, "v": 2704, "p": 3.69, "q": 0.77 },
-        "AtikHorizonII": { "h": 4656, "v": 3520, "p": 3.8, "q": 0.60 },
-        "EOS40D": { "h": 3888, "v": 2592, "p": 5.7, "q": 0.33 },
-        "EOS500D": { "h": 4752 , "v": 3168 , "p": 4.68, "q": 0.38 },
-        "EOS550D": { "h": 5184 , "v": 3456, "p": 4.29, "q": 0.4 },
-        "EOS70D": { "h": 5472, "v": 3648, "p": 4.1, "q": 0.48 },
-        "EOS6D": { "h": 5472, "v": 3648, "p": 6.54, "q": 0.5 },
-        "D5300": { "h": 6000, "v": 4000, "p": 3.92, "q": 0.55 },
-        "D5600": { "h": 6000, "v": 4000, "p": 3.92, "q": 0.52 },
-        "D610": { "m": "Nikon", "h": 6016, "v": 4016, "p":  5.95, "q": 0.49 },
-        "KAF3200ME": { "h": 2184, "v": 1472, "p": 6.8, "q": 0.85 },
-        "KAF8300": { "h": 3326, "v": 2504, "p": 5.4, "q": 0.56 },
-        "QSI683": { "h": 3326, "v": 2504, "p": 5.4, "q": 0.57 },
-        "QSI6120": { "m": "QSI", "s": "ICX834", "sm": "Sony", "h": 4250, "v": 2838, "p": 3.1, "q": 0.77 },
-        "KAF16803": { "h": 4096, "v": 4096, "p": 9.0, "q": 0.6 },
-        "KL4040": { "m": "FLI", "s": "GSense4040", "sm": "GPixel", "h": 4096, "v": 4096, "p": 9.0, "q": 0.74 },
-        "QHY163": { "h": 4656, "v": 3522, "p": 3.8, "q": 0.6 },
-        "QHY183": { "h": 5544, "v": 3694, "p": 2.4, "q": 0.84 },
-        "QHY268M": { "m": "QHY", "sm": "Sony", "s": "IMX571", "h": 6280, "v": 4210, "p": 3.76, "q": 0.9 },
-        "QHY23": { "h": 3468, "v": 2728, "p": 3.69, "q": 0.8 },
-        "ST10XME": { "m": "SBIG", "h": 2184, "v": 1472, "p": 6.8, "q": 0.5 },
-        "SX694": { "h": 2750, "v": 2200, "p": 4.54, "q": 0.77 },
-        "SONYA7S": { "h": 4240, "v": 2832, "p": 8.4, "q": 0.65 },
-        "IMX511": { "h": 5215, "v": 4927, "p": 1.12, "q": 0.8 },
-        "HAWAII-4RG": { "h": 4096, "v": 4096, "p": 15, "q": 0.70 },
-        "ACS": { "h": 4096, "v": 4096, "p": 15, "q": 0.9, "r": 1.09 },
-        "WFC3": { "h": 4096, "v": 4096, "p": 15, "q": 0.9, "r": 1.354 },
-        "EUCLID-VIS": { "h": 24576, "v": 24792, "p": 12, "q": 0.9 }
-    }
-}
-"""
-
-
-class Gear():
-    def __init__(self, file=None):
-        print("file {}".format(file))
-        self.file_data = None
-        self.default_data = json.loads(default_json_data)
-        if os.path.isfile(file):
-            with open(file) as json_file:
-                self.file_data = json.load(json_file)
-        self.scopes = {x.lower(): y for x, y in {**self.file_data['scopes'], **self.default_data['scopes']}.items()}
-        self.cameras = {x.lower(): y for x, y in {**self.file_data['cameras'], **self.default_data['cameras']}.items()}
-
-    def list_scopes_and_cameras(self, as_json=None):
-        if as_json:
-            print('Default data:')
-            print(json.dumps(self.default_data, indent=4, sort_keys=True))
-            print('Custom data:')
-            print(json.dumps(self.file_data, indent=4, sort_keys=True))
-        else:
-            for name in sorted(self.scopes.items()) + sorted(self.cameras.items()):
-                line = "{:15s}".format(name[0])
-                for key in name[1].keys():
-                    value = name[1][key]
-                    line += " --{:2s} {:<6}".format(key, value)
-                print("{}".format(line))
-
-    def scope(self, name):
-        d = None
-        di = None
-        l = None
-        f = None
-        o = None
-        if name.lower() not in self.scopes:
-            print('{} is an unknown telescope'.format(name))
-            sys.exit(1)
-        scope_dict = self.scopes.get(name.lower())
-        if 'd' in scope_dict:
-            d = scope_dict['d']
-        if 'di' in scope_dict:
-            di = scope_dict['di']
-        if 'l' in scope_dict:
-            l = scope_dict['l']
-        if 'f' in scope_dict:
-            f = scope_dict['f']
-        if 'o' in scope_dict:
-            o = scope_dict['o']
-        return d, di, l, f, o
-
-    def camera(self, name):
-        h = None
-        v = None
-        p = None
-        q = None
-        r = 1
-        if name.lower() not in self.cameras:
-            print('{} is an unknown camera'.format(name))
-            sys.exit(1)
-        camera_dict = self.cameras.get(name.lower())
-        if 'h' in camera_dict:
-            h = camera_dict['h']
-        if 'v' in camera_dict:
-            v = camera_dict['v']
-        if 'p' in camera_dict:
-            p = camera_dict['p']
-        if 'q' in camera_dict:
-            q = camera_dict['q']
-        if 'r' in camera_dict:
-            r = camera_dict['r']
-        return h, v, p, q, r
+from compare_telescopes import CompareError, Gear, CatalogImport, Profile, Telescope, Camera, Ratios, RecordWriter, compare, \
+    cross_product, ratio_matrix, batch, flatten, encode_result, result_record, resolve_setups, ratio_table, \
+    setup_specs, sweep, sweep_rows, sweep_values, profile_stage, OUTPUT_FORMATS, PRODUCT_METRICS, RECORD_FIELDS, \
+    ROW_KEYS, SHORT_NAMES, SCOPE_QUERY_KEYS, CAMERA_QUERY_KEYS, FILTERS, spectral_bands, exposure_grid, \
+    EXPOSURE_COLUMNS, SKY_SQM, serve, WhatIf, WHAT_IF_TELESCOPE_KEYS, WHAT_IF_CAMERA_KEYS, monte_carlo, \
+    UNCERTAIN_KEYS, UNCERTAINTY_COLUMNS, simulate, SIMULATION_COLUMNS, SIMULATION_TILE, STAR_MAGNITUDE, \
+    seeing_histogram, sampling, SAMPLING, SEEING_COLUMNS, mosaic, MOSAIC_COLUMNS, optimize, OPTIMIZE_KEYS, \
+    PRODUCT_LABELS, Setup, pareto, PARETO_OBJECTIVES, setup_record, SETUP_COLUMNS, MATRIX_COLUMNS, \
+    SETUP_MATRIX_COLUMNS
 
 
 def main():
+    start = time.perf_counter()
     parser = argparse.ArgumentParser(
         formatter_class=argparse.RawDescriptionHelpFormatter,
         description=__doc__,
         epilog='Use --formulas to read about the math behind the performance indicators.')
-    parser.add_argument("--just_numbers", action="store_true", help="Output just the numbers")
+    parser.add_argument("--just_numbers", action="store_true", help="Output just the numbers, as one CSV line without header")
+    parser.add_argument("--format", required=False, choices=('text',) + OUTPUT_FORMATS,
+                        help="Output every number of the comparison as one record with a fixed set of fields. Default text, for --batch and --sweep jsonl. npy needs --output")
+    parser.add_argument("--output", required=False, type=str, help="Write --format output to this file instead of stdout")
     parser.add_argument("--brief", action="store_true", help="Brief output")
     parser.add_argument("--detail", action="store_true", help="Detail output")
     parser.add_argument("--legend", action="store_true", help="Legend")
     parser.add_argument("--formulas", action="store_true", help="Show the used formulas")
     parser.add_argument("--list", action="store_true", help="Print list of known telescopes and cameras")
     parser.add_argument("--json", action="store_true", help="Print list of known telescopes and cameras as json")
+    parser.add_argument("--import", action="append", dest="imports", metavar="FILE",
+                        help="Add the telescopes and cameras of a vendor CSV or JSON lines file to the known ones, may be repeated. Rows have a name, kind (scope or camera) and the fields of --json. Bad rows and duplicates with other values are reported and left out, duplicates by name, alias or camera m, s and geometry become aliases. Writes telescopes-and-cameras.json, or --output")
+    parser.add_argument("--query", action="append", metavar="KEY=MIN:MAX",
+                        help="List the known telescopes and cameras within a range, MIN or MAX may be left out. Telescope keys: {}, camera keys: {} (width and height of the sensor in mm)".format(
+                            ', '.join(SCOPE_QUERY_KEYS), ', '.join(CAMERA_QUERY_KEYS)))
+    parser.add_argument("--batch", action="store_true",
+                        help="Read one comparison per line from stdin, as JSON or as CSV with a header line, keyed like the options below (d1, l1, c1h, s1, c1, ...). Writes one JSON result per line")
+    parser.add_argument("--sweep", action="append", metavar="KEY=VALUES",
+                        help="Compare every combination of the swept options on top of the other options, for example --sweep r1=0.6:1.0:0.1 --sweep s1=RASA8,TEC140. Writes one JSON result per line")
+    parser.add_argument("--serve", required=False, type=int, metavar="PORT",
+                        help="Serve comparisons over HTTP on PORT with the known telescopes and cameras loaded once: /compare, /batch, /sweep, /query and /stats (latency percentiles)")
+    parser.add_argument("--host", default='127.0.0.1', type=str, help="Address for --serve [default 127.0.0.1]")
+    parser.add_argument("--jobs", required=False, type=int, help="Number of processes for --sweep, --simulate and --pareto [integer, default all cores]")
+    parser.add_argument("--setup", action="append", metavar="KEY=VALUE,...",
+                        help="Compare any number of setups instead of telescope 1 and 2, keyed like the options without their number, for example --setup s=RASA8,c=ASI2600 --setup d=140,l=980,c=ASI6200,b=2. Setups copy the first one like telescope 2 does")
+    parser.add_argument("--baseline", required=False, type=int, help="Setup to compare the others against [integer, default 1]")
+    parser.add_argument("--matrix", required=False, type=str,
+                        help="Print one indicator (res, fov, eoi, poi, e, pe, ps, os) of every known telescope and camera combination as a ratio against telescope 1 with camera 1. With --setup, of every setup against every setup")
+    parser.add_argument("--optimize", required=False, type=str,
+                        help="Print the best known telescope, reducer, camera and binning combinations by one indicator (ps, pe, e, os) within the --query ranges, which also take {} (pixel scale [\"/pixel] and FOV [arcmin] of the combination)".format(
+                            ', '.join(OPTIMIZE_KEYS)))
+    parser.add_argument("--pareto", nargs="?", const=','.join(PARETO_OBJECTIVES[:4]), metavar="OBJECTIVES",
+                        help="Print the known telescope, reducer, camera and binning combinations that no other combination beats on all of the comma separated objectives at once, within the --query ranges: {} (largest pixel signal, largest FOV, pixel scale closest to --pixel_scale, smallest aperture, lowest scope and camera price fields) [default {}]. Needs numpy".format(
+                            ', '.join(PARETO_OBJECTIVES), ','.join(PARETO_OBJECTIVES[:4])))
+    parser.add_argument("--pixel_scale", default=1.0, type=float,
+                        help="Target pixel scale of the --pareto res objective [\"/pixel, default 1]")
+    parser.add_argument("--top", default=10, type=int, help="Number of combinations for --optimize [integer, default 10]")
+    parser.add_argument("--reducers", required=False, type=str, help="Focal reducer factors for --matrix, --optimize and --pareto [comma separated floats]")
+    parser.add_argument("--binnings", required=False, type=str, help="Camera binning factors for --matrix, --optimize and --pareto [comma separated integers]")
 
     parser.add_argument("--s1", required=False, type=str, help="Scope 1")
     parser.add_argument("--d1", required=False, type=float, help="Telescope 1 aperture Diameter [mm]")
@@ -234,6 +106,9 @@ def main():
     parser.add_argument("--c1p", required=False, type=float, help="Camera 1 Pixel size [μm]")
     parser.add_argument("--c1q", required=False, type=float, help="Camera 1 QE ratio [float, 0-1]")
     parser.add_argument("--c1b", required=False, type=float, help="Camera 1 binning factor [integer, 1-]")
+    parser.add_argument("--c1rn", required=False, type=float, help="Camera 1 Read Noise per pixel [e-]")
+    parser.add_argument("--c1dc", required=False, type=float, help="Camera 1 Dark Current per pixel [e-/s]")
+    parser.add_argument("--c1fw", required=False, type=float, help="Camera 1 Full Well per pixel [e-]")
 
     parser.add_argument("--s2", required=False, type=str, help="Scope 2")
     parser.add_argument("--d2", required=False, type=float, help="Telescope 2 aperture Diameter [mm]")
@@ -250,268 +125,677 @@ def main():
     parser.add_argument("--c2p", required=False, type=float, help="Camera 2 Pixel size [μm]")
     parser.add_argument("--c2q", required=False, type=float, help="Camera 2 QE ratio [float, 0-1]")
     parser.add_argument("--c2b", required=False, type=float, help="Camera 2 binning factor [integer, 1-]")
+    parser.add_argument("--c2rn", required=False, type=float, help="Camera 2 Read Noise per pixel [e-]")
+    parser.add_argument("--c2dc", required=False, type=float, help="Camera 2 Dark Current per pixel [e-/s]")
+    parser.add_argument("--c2fw", required=False, type=float, help="Camera 2 Full Well per pixel [e-]")
 
+    parser.add_argument("--spectral", action="store_true",
+                        help="Also compare per filter band, with the qc (QE) and tc (transmittance) curves of known cameras and telescopes where they have them")
+    parser.add_argument("--filters", required=False, type=str,
+                        help="Filter bands for --spectral [comma separated, default all of {}]".format(','.join(FILTERS)))
+    parser.add_argument("--exposure", action="store_true",
+                        help="Print the absolute signal to noise ratio of one pixel and the integration time to reach --snr for every --sky and --target brightness instead of the ratios")
+    parser.add_argument("--sky", default=str(SKY_SQM), type=str,
+                        help="Sky brightness for --exposure [mag/arcsec², start:stop:step or comma separated, default {}]".format(SKY_SQM))
+    parser.add_argument("--target", default='22', type=str,
+                        help="Target surface brightness for --exposure [mag/arcsec², start:stop:step or comma separated, default 22]")
+    parser.add_argument("--snr", default=10, type=float, help="Signal to noise ratio to reach for --exposure [float, default 10]")
+    parser.add_argument("--integration", default=3600, type=float,
+                        help="Total integration time for the --exposure signal to noise ratio [s, default 3600]")
+    parser.add_argument("--sub", default=300, type=float, help="Sub exposure time for --exposure [s, default 300]")
+    parser.add_argument("--mosaic", required=False, type=str, metavar="FILE",
+                        help="Plan the mosaic panels of every target in FILE (- for stdin), JSON lines or CSV with a header line with name and width and height [arcmin] or ra_min, ra_max, dec_min and dec_max [degrees], for every telescope or --setup. --integration is the time per panel")
+    parser.add_argument("--overlap", default=0.1, type=float, help="Overlap of the --mosaic panels [float, 0-1, default 0.1]")
+    parser.add_argument("--seeing", required=False, type=str, metavar="FILE",
+                        help="Print the fraction of the seeing measurements in FILE that every telescope or --setup under-, well- and over-samples. FILE has one FWHM [arcsec] per line, in the last comma or whitespace separated field")
+    parser.add_argument("--seeing_column", default=-1, type=int,
+                        help="Field of the FWHM in the --seeing lines [integer, counting from 0, default -1 for the last]")
+    parser.add_argument("--sampling", default='{:g}:{:g}'.format(*SAMPLING), type=str,
+                        help="Pixels per FWHM below which --seeing is under-sampled and above which it is over-sampled [MIN:MAX, default {:g}:{:g}]".format(*SAMPLING))
+    parser.add_argument("--simulate", action="store_true",
+                        help="Render a synthetic star field frame of --sub seconds with every telescope or --setup, with photon and read noise, and print the measured against the predicted star, sky pixel and star peak signals. Needs numpy")
+    parser.add_argument("--stars", default=1000, type=int, help="Number of stars for --simulate [integer, default 1000]")
+    parser.add_argument("--magnitude", default=STAR_MAGNITUDE, type=float,
+                        help="Star magnitude for --simulate [float, default {:g}]".format(STAR_MAGNITUDE))
+    parser.add_argument("--fwhm", default=0, type=float, help="Seeing FWHM for --simulate [arcsec, default 0 for none]")
+    parser.add_argument("--tile", default=SIMULATION_TILE, type=int,
+                        help="Tile size that --simulate renders at a time [pixels, default {}]".format(SIMULATION_TILE))
+    parser.add_argument("--seed", default=1, type=int, help="Random seed for --simulate and --uncertainty [integer, default 1]")
+    parser.add_argument("--uncertainty", required=False, type=int, metavar="N",
+                        help="Draw N samples of the uncertain specs and print the median and confidence interval of the eoi, poi, e, pe, ps and os ratios of telescope 1 against 2, or of every --setup against the --baseline. Known telescopes and cameras can list standard deviations as ud, ul, uf, uo, ut, up and uq, --setup takes them too. Needs numpy")
+    parser.add_argument("--uncertain", action="append", metavar="KEY=SD",
+                        help="Standard deviation of a telescope 1 or 2 spec for --uncertainty, keyed like the options ({}), for example --uncertain c1q=0.05 --uncertain o2=0.02".format(
+                            ', '.join(['{}1'.format(key) for key in UNCERTAIN_KEYS if key not in ('p', 'q')] + ['c1p', 'c1q'])))
+    parser.add_argument("--confidence", default=0.95, type=float,
+                        help="Confidence interval for --uncertainty [float, 0-1, default 0.95]")
+    parser.add_argument("--interactive", action="store_true",
+                        help="Start a what-if session on telescope 1 and 2 or the --setup list: read changes like d1=150 c2b=2 s2=RASA8 from stdin and reprint only the setups that changed. explain shows every intermediate value that changed, show reprints all, quit ends")
+    parser.add_argument("--profile", action="store_true",
+                        help="Write the time and call count of every stage (arguments, gear, lookup, optics, metrics, seeing, simulate, url, output) as JSON to stderr")
     args = parser.parse_args()
+    if args.profile:
+        with Profile() as profile:
+            profile.start = start
+            profile.add('arguments', time.perf_counter() - start)
+            try:
+                run(args)
+            finally:
+                sys.stderr.write(json.dumps(profile.report(), indent=4) + '\n')
+    else:
+        run(args)
+
+
+def run(args):
     if args.formulas:
         print_formulas()
         sys.exit(0)
-    if args.s1 or args.c1 or args.s2 or args.c2 or args.list or args.json:
-        path = os.path.dirname(os.path.realpath(sys.argv[0]))
-        gear = Gear(file="{}/telescopes-and-cameras.json".format(path))
-    if args.list or args.json:
-        gear.list_scopes_and_cameras(args.json)
-        sys.exit(0)
-    c1r = 1.0
-    c2r = 1.0
-    if args.s1:
-        args.d1, args.di1, args.l1, args.f1, args.o1 = gear.scope(args.s1)
-    if args.s2:
-        args.d2, args.di2, args.l2, args.f2, args.o2 = gear.scope(args.s2)
-    if args.c1:
-        args.c1h, args.c1v, args.c1p, args.c1q, c1r = gear.camera(args.c1)
-    if args.c2:
-        args.c2h, args.c2v, args.c2p, args.c2q, c2r = gear.camera(args.c2)
-
-    t1_aperture_diameter = args.d1 if args.d1 else args.di1 * 25.4 if args.di1 else None
-    t1_focal_reducer = args.r1 if args.r1 else 1
-    t1_focal_reducer *= c1r
-    t1_obstruction_ratio = args.o1 if args.o1 else 0
-    t1_transmittance_factor = args.t1 if args.t1 else 1
-    if t1_aperture_diameter:
-        if args.l1:
-            t1_focal_length = args.l1 * t1_focal_reducer
-            if args.f1:
-                print('Need ONLY 2 out of 3 of Telescope 1 aperture Diameter, Focal length, Focal ratio')
-                sys.exit(1)
-            t1_focal_ratio = t1_focal_length / t1_aperture_diameter
+    path = os.path.dirname(os.path.realpath(sys.argv[0]))
+    try:
+        if args.batch:
+            with output(args) as stream:
+                run_batch(Gear(file="{}/telescopes-and-cameras.json".format(path)), args, stream)
+            sys.exit(0)
+        if args.imports:
+            run_import(args, "{}/telescopes-and-cameras.json".format(path))
+            sys.exit(0)
+        if args.serve:
+            gear = Gear(file="{}/telescopes-and-cameras.json".format(path))
+            print('Serving on http://{}:{}/'.format(args.host, args.serve))
+            try:
+                serve(gear, args.host, args.serve)
+            except KeyboardInterrupt:
+                pass
+            except OSError as e:
+                raise CompareError('Cannot serve on {}:{}: {}'.format(args.host, args.serve, e))
+            sys.exit(0)
+        if args.sweep:
+            with output(args) as stream:
+                run_sweep(args, "{}/telescopes-and-cameras.json".format(path), stream)
+            sys.exit(0)
+        if args.s1 or args.c1 or args.s2 or args.c2 or args.list or args.json or args.matrix or args.query or \
+                args.setup or args.optimize or args.pareto or args.interactive:
+            if args.format in (None, 'text') and not args.just_numbers:
+                print("file {}/telescopes-and-cameras.json".format(path))
+            gear = Gear(file="{}/telescopes-and-cameras.json".format(path))
+        if args.list or args.json:
+            gear.list_scopes_and_cameras(args.json)
+            sys.exit(0)
+        if args.optimize:
+            run_optimize(gear, args)
+            sys.exit(0)
+        if args.pareto:
+            run_pareto(gear, args)
+            sys.exit(0)
+        if args.query:
+            run_query(gear, args.query)
+            sys.exit(0)
+        if args.setup:
+            run_setups(gear, args)
+            sys.exit(0)
+        telescope1 = gear.telescope_spec(args.s1, r=args.r1, t=args.t1) if args.s1 else \
+            Telescope(d=args.d1, di=args.di1, l=args.l1, f=args.f1, o=args.o1, r=args.r1, t=args.t1)
+        telescope2 = gear.telescope_spec(args.s2, r=args.r2, t=args.t2) if args.s2 else \
+            Telescope(d=args.d2, di=args.di2, l=args.l2, f=args.f2, o=args.o2, r=args.r2, t=args.t2)
+        camera1 = gear.camera_spec(args.c1, b=args.c1b, rn=args.c1rn, dc=args.c1dc, fw=args.c1fw) if args.c1 else \
+            Camera(h=args.c1h, v=args.c1v, p=args.c1p, q=args.c1q, b=args.c1b, rn=args.c1rn, dc=args.c1dc, fw=args.c1fw)
+        camera2 = gear.camera_spec(args.c2, b=args.c2b, rn=args.c2rn, dc=args.c2dc, fw=args.c2fw) if args.c2 else \
+            Camera(h=args.c2h, v=args.c2v, p=args.c2p, q=args.c2q, b=args.c2b, rn=args.c2rn, dc=args.c2dc, fw=args.c2fw)
+        if args.exposure:
+            run_exposure(args, [(telescope1, camera1), (telescope2, camera2)])
+            sys.exit(0)
+        if args.interactive:
+            run_interactive(gear, args, [(telescope1, camera1), (telescope2, camera2)], [2, 1])
+            sys.exit(0)
+        if args.mosaic:
+            run_mosaic(args, [(telescope1, camera1), (telescope2, camera2)])
+            sys.exit(0)
+        if args.seeing:
+            run_seeing(args, [(telescope1, camera1), (telescope2, camera2)])
+            sys.exit(0)
+        if args.simulate:
+            run_simulate(args, [(telescope1, camera1), (telescope2, camera2)])
+            sys.exit(0)
+        if args.uncertainty:
+            uncertainties = [gear.uncertainties(args.s1, args.c1) if args.s1 or args.c1 else {},
+                             gear.uncertainties(args.s2, args.c2) if args.s2 or args.c2 else {}]
+            for text in args.uncertain or ():
+                key, _, value = text.partition('=')
+                n = key[1] if key.startswith('c') and key[1:2] in ('1', '2') else key[-1:]
+                field = key[2:] if key.startswith('c') and key[1:2] in ('1', '2') else key[:-1]
+                if n not in ('1', '2') or field not in UNCERTAIN_KEYS:
+                    raise CompareError('{} is an unknown uncertain spec'.format(key))
+                uncertainties[int(n) - 1][field] = (parse_uncertainty(key, value), ('setup', int(n)))
+            run_uncertainty(args, [(telescope1, camera1), (telescope2, camera2)], uncertainties, 1)
+            sys.exit(0)
+        filters = parse_filters(args.filters)
+        if args.matrix:
+            with profile_stage('output'):
+                print_matrix(gear, args, telescope1, camera1)
+            sys.exit(0)
+        comparison = compare(telescope1, camera1, telescope2, camera2)
+        if args.just_numbers or args.format not in (None, 'text'):
+            with output(args) as stream:
+                writer = RecordWriter(stream, args.format if args.format not in (None, 'text') else 'csv',
+                                      RECORD_FIELDS, header=not args.just_numbers)
+                writer.write(flatten(comparison))
+                writer.close()
+            sys.exit(0)
+    except CompareError as e:
+        print(e)
+        sys.exit(1)
+
+    with profile_stage('output'):
+        print(comparison.url + '\n')
+        rows = [(comparison.setup1, comparison.ratios12), (comparison.setup2, comparison.ratios21)]
+        if args.brief or not args.detail:
+            print_brief(rows, args.legend)
         else:
-            if args.f1:
-                t1_focal_ratio = args.f1 * t1_focal_reducer
-            else:
-                t1_focal_ratio = 10 * t1_focal_reducer  # choose f/10
-            t1_focal_length = t1_aperture_diameter * t1_focal_ratio
+            print_detail(rows)
+        if args.spectral:
+            print_spectral(comparison, [(telescope1, camera1), (telescope2, camera2)], filters)
+
+
+@contextlib.contextmanager
+def output(args):
+    """Binary stream for --format output: the --output file, or stdout."""
+    if args.format == 'npy' and not args.output:
+        raise CompareError('--format npy needs --output')
+    if args.output:
+        try:
+            stream = open(args.output, 'wb')
+        except OSError as e:
+            raise CompareError('Cannot write {}: {}'.format(args.output, e))
+        with stream:
+            yield stream
     else:
-        if args.l1:
-            t1_focal_length = args.l1 * t1_focal_reducer
-            if args.f1:
-                t1_focal_ratio = args.f1 * t1_focal_reducer
-                t1_aperture_diameter = t1_focal_length / t1_focal_ratio
-            else:
-                t1_aperture_diameter = 100  # choose d=100mm
-                t1_focal_ratio = t1_focal_length / t1_aperture_diameter
+        yield sys.stdout.buffer
+
+
+def record_format(args):
+    return args.format if args.format not in (None, 'text') else 'jsonl'
+
+
+def parse_ranges(queries):
+    """The --query KEY=MIN:MAX texts as {key: (low, high)}, None for a left out bound."""
+    ranges = {}
+    for text in queries or ():
+        key, _, bounds = text.partition('=')
+        low, _, high = bounds.partition(':')
+        try:
+            ranges[key] = (float(low) if low else None, float(high) if high else None)
+        except ValueError:
+            raise CompareError('Bad range {}, expected KEY=MIN:MAX'.format(text))
+    return ranges
+
+
+def run_query(gear, queries):
+    scope_ranges = {}
+    camera_ranges = {}
+    for key, bounds in parse_ranges(queries).items():
+        if key in SCOPE_QUERY_KEYS:
+            scope_ranges[key] = bounds
+        elif key in CAMERA_QUERY_KEYS:
+            camera_ranges[key] = bounds
         else:
-            t1_aperture_diameter = 100  # choose d=100mm
-            if args.f1:
-                t1_focal_ratio = args.f1 * t1_focal_reducer
-            else:
-                t1_focal_ratio = 10 * t1_focal_reducer  # choose f/10
-            t1_focal_length = t1_aperture_diameter * t1_focal_ratio
-    t1_obstruction_diameter = t1_obstruction_ratio * t1_aperture_diameter
-
-    t2_aperture_diameter = args.d2 if args.d2 else args.di2 * 25.4 if args.di2 else None
-    t2_focal_reducer = args.r2 if args.r2 else 1
-    t2_focal_reducer *= c2r
-    t2_obstruction_ratio = args.o2 if args.o2 else 0
-    t2_transmittance_factor = args.t2 if args.t2 else 1
-    if t2_aperture_diameter:
-        if args.l2:
-            t2_focal_length = args.l2 * t2_focal_reducer
-            if args.f2:
-                print('Need ONLY 2 out of 3 of Telescope 2 aperture Diameter, Focal length, Focal ratio')
-                sys.exit(1)
-            t2_focal_ratio = t2_focal_length / t2_aperture_diameter
+            raise CompareError('{} is an unknown telescope or camera attribute'.format(key))
+    gear.list_scopes_and_cameras(scopes=gear.query_scopes(**scope_ranges) if scope_ranges else [],
+                                 cameras=gear.query_cameras(**camera_ranges) if camera_ranges else [])
+
+
+def run_import(args, file):
+    catalog = CatalogImport(Gear(file=file).file_data)
+    for name in args.imports:
+        try:
+            with open(name, newline='') as lines:
+                for number, result in catalog.read(lines):
+                    if isinstance(result, CompareError):
+                        print('{}:{}: {}'.format(name, number, result))
+        except OSError as e:
+            raise CompareError('Cannot read {}: {}'.format(name, e))
+    target = args.output or file
+    temporary = '{}.{}'.format(target, os.getpid())
+    try:
+        with open(temporary, 'w') as json_file:
+            json.dump(catalog.catalog(), json_file, indent=4)
+        os.replace(temporary, target)
+    except OSError as e:
+        raise CompareError('Cannot write {}: {}'.format(target, e))
+    counts = catalog.counts
+    print('{} added, {} duplicates, {} rejected of which {} conflicts, {} telescopes and {} cameras in {}'.format(
+        counts['added'], counts['duplicates'], counts['errors'], counts['conflicts'],
+        len(catalog.entries['scopes']), len(catalog.entries['cameras']), target))
+    collisions = Gear(file=target).collisions
+    if collisions:
+        print('{} replace the default ones: {}'.format(len(collisions), ', '.join(name for _, name in collisions)))
+
+
+def run_optimize(gear, args):
+    metric = SHORT_NAMES.get(args.optimize, args.optimize)
+    reducers = [float(x) for x in args.reducers.split(',')] if args.reducers else [1]
+    binnings = [int(x) for x in args.binnings.split(',')] if args.binnings else [1]
+    print_optima(args, optimize(gear, parse_ranges(args.query), metric, args.top, reducers, binnings),
+                 [(args.optimize, lambda optimum: getattr(optimum.setup, metric))])
+
+
+def run_pareto(gear, args):
+    objectives = args.pareto.split(',')
+    reducers = [float(x) for x in args.reducers.split(',')] if args.reducers else [1]
+    binnings = [int(x) for x in args.binnings.split(',')] if args.binnings else [1]
+    frontier = pareto(gear, parse_ranges(args.query), objectives, args.pixel_scale, reducers, binnings, args.jobs)
+    if args.format in (None, 'text') and frontier:
+        print('{} combinations on the frontier of {}'.format(len(frontier), ', '.join(objectives)))
+    metrics = [('ps', lambda optimum: optimum.setup.pixel_signal)]
+    if 'price' in objectives:
+        metrics.append(('price', lambda optimum: gear.scopes[optimum.scope]['price'] + gear.cameras[optimum.camera]['price']))
+    print_optima(args, frontier, metrics)
+
+
+def print_optima(args, optima, metrics):
+    """Print Optimum tuples, or write them as --format records. metrics are the (label, function of the Optimum) to print."""
+    if args.format not in (None, 'text'):
+        with output(args) as stream:
+            writer = RecordWriter(stream, args.format,
+                                  PRODUCT_LABELS + tuple(field for field in Setup._fields if field not in PRODUCT_LABELS))
+            for optimum in optima:
+                record = optimum._asdict()
+                record.update(record.pop('setup')._asdict())
+                writer.write(record)
+            writer.close()
+        return
+    if not optima:
+        print('No combination within the constraints')
+    for n, optimum in enumerate(optima, 1):
+        s = optimum.setup
+        print('{:2d} {:20.20s} x{:<4g} {:15.15s} b{} f/{:<5.2f} l={:4.0f}mm D={:3.0f}mm res={:3.2f}"/p FOV={:3.0f}\'x{:3.0f}\' {}'.format(
+            n, optimum.scope, optimum.reducer, optimum.camera, optimum.binning, s.focal_ratio, s.focal_length,
+            s.aperture_diameter, s.arcsec_p, s.view_h / 60, s.view_v / 60,
+            ' '.join('{}={:.4g}'.format(label, metric(optimum)) for label, metric in metrics)))
+
+
+def run_batch(gear, args, stream):
+    writer = RecordWriter(stream, record_format(args), ('line',) + RECORD_FIELDS + ('error',))
+    for number, result in batch(gear, sys.stdin):
+        writer.write(result_record(('line',), {'line': number}, result))
+    writer.close()
+
+
+def run_sweep(args, file, stream):
+    parameters = []
+    for text in args.sweep:
+        key, _, values = text.partition('=')
+        parameters.append((key, sweep_values(values)))
+    base = {key: getattr(args, key) for key in ROW_KEYS if getattr(args, key) is not None}
+    keys = [key for key, _ in parameters]
+    writer = RecordWriter(stream, record_format(args), tuple(keys) + RECORD_FIELDS + ('error',))
+    convert = functools.partial(encode_result, writer.format, writer.fields, keys)
+    for _, data in sweep(sweep_rows(base, parameters), file, args.jobs, convert=convert):
+        writer.write_encoded(data)
+    writer.close()
+
+
+def run_setups(gear, args):
+    specs = []
+    uncertainties = []
+    for n, text in enumerate(args.setup, 1):
+        setup = {}
+        for item in text.split(','):
+            key, _, value = item.partition('=')
+            setup[key] = value
+        uncertain = gear.uncertainties(setup.get('s'), setup.get('c'))
+        for key in [key for key in setup if key[:1] == 'u' and key[1:] in UNCERTAIN_KEYS]:
+            uncertain[key[1:]] = (parse_uncertainty(key, setup.pop(key)), ('setup', n))
+        specs.append(setup_specs(gear, setup))
+        uncertainties.append(uncertain)
+    if args.exposure:
+        run_exposure(args, specs, name='Setup')
+        return
+    if args.mosaic:
+        run_mosaic(args, specs, name='Setup')
+        return
+    if args.seeing:
+        run_seeing(args, specs, name='Setup')
+        return
+    if args.simulate:
+        run_simulate(args, specs, name='Setup')
+        return
+    baseline = args.baseline if args.baseline else 1
+    if not 1 <= baseline <= len(specs):
+        raise CompareError('--baseline {} is not one of the {} setups'.format(baseline, len(specs)))
+    if args.uncertainty:
+        run_uncertainty(args, specs, uncertainties, baseline - 1, name='Setup')
+        return
+    if args.interactive:
+        run_interactive(gear, args, specs, [baseline] * len(specs), name='Setup')
+        return
+    setups = resolve_setups(specs)
+    if args.matrix:
+        metric = SHORT_NAMES.get(args.matrix, args.matrix)
+        if metric not in PRODUCT_METRICS:
+            raise CompareError('{} is an unknown performance indicator'.format(args.matrix))
+        if metric in Ratios._fields:
+            matrix = [[getattr(x, metric) for x in row] for row in ratio_table(setups)]
         else:
-            if args.f2:
-                t2_focal_ratio = args.f2 * t2_focal_reducer
-            else:
-                t2_focal_ratio = 10 * t2_focal_reducer  # choose f/10
-            t2_focal_length = t2_aperture_diameter * t2_focal_ratio
+            matrix = [[getattr(a, metric) / getattr(b, metric) for b in setups] for a in setups]
+        if args.format not in (None, 'text'):
+            with output(args) as stream:
+                writer = RecordWriter(stream, args.format, SETUP_MATRIX_COLUMNS)
+                for n, row in enumerate(matrix, 1):
+                    for against, value in enumerate(row, 1):
+                        writer.write({'setup': n, 'against': against, 'ratio': value})
+                writer.close()
+            return
+        print('{:10s}'.format('') + ''.join(' {:>9s}'.format('Setup {}'.format(n)) for n in range(1, len(setups) + 1)))
+        for n, row in enumerate(matrix, 1):
+            print('{:10s}'.format('Setup {}'.format(n)) + ''.join(' {:9.2f}'.format(value) for value in row))
+        return
+    rows = list(zip(setups, ratio_table(setups, baseline - 1)))
+    if args.format not in (None, 'text'):
+        with output(args) as stream:
+            writer = RecordWriter(stream, args.format, SETUP_COLUMNS)
+            for n, (setup, ratios) in enumerate(rows, 1):
+                writer.write(setup_record(n, setup, ratios))
+            writer.close()
+        return
+    if args.brief or not args.detail:
+        print_brief(rows, args.legend, name='Setup')
     else:
-        if args.l2:
-            t2_focal_length = args.l2 * t2_focal_reducer
-            if args.f2:
-                t2_focal_ratio = args.f2 * t2_focal_reducer
-                t2_aperture_diameter = t2_focal_length / t2_focal_ratio
-            else:
-                t2_aperture_diameter = 100  # choose d=100mm
-                t2_focal_ratio = t2_focal_length / t2_aperture_diameter
-        else:
-            t2_aperture_diameter = t1_aperture_diameter
-            if args.f2:
-                t2_focal_ratio = args.f2 * t2_focal_reducer
-            else:
-                if args.r2:
-                    t2_focal_ratio = (t1_focal_ratio/t1_focal_reducer) * t2_focal_reducer
-                else:
-                    t2_focal_ratio = t1_focal_ratio
-            t2_focal_length = t2_aperture_diameter * t2_focal_ratio
-            t2_obstruction_ratio = t1_obstruction_ratio
-            t2_transmittance_factor = t1_transmittance_factor
-    t2_obstruction_diameter = t2_obstruction_ratio * t2_aperture_diameter
-
-    arcsec_per_radian = (360 / (2 * math.pi)) * 60 * 60  # 206265.something
-
-    t1_obstruction_area = math.pi * (t1_obstruction_diameter / 2) ** 2
-    t1_aperture_area = math.pi * (t1_aperture_diameter / 2) ** 2 - t1_obstruction_area
-    t1_resolving_power = 1.22 * 500e-9 * 180 / (t1_aperture_diameter / 1000 * math.pi) * 3600  # for green
-    t1_plate_scale = arcsec_per_radian / (t1_focal_ratio * t1_aperture_diameter)
-    c1_h = args.c1h if args.c1h else 1000  # picked some defaults to work with
-    c1_v = args.c1v if args.c1v else 1000
-    c1_p = args.c1p if args.c1p else 3.8
-    c1_b = args.c1b if args.c1b else 1
-
-    t2_obstruction_area = math.pi * (t2_obstruction_diameter / 2) ** 2
-    t2_aperture_area = math.pi * (t2_aperture_diameter / 2) ** 2 - t2_obstruction_area
-    t2_resolving_power = 1.22 * 500e-9 * 180 / (t2_aperture_diameter / 1000 * math.pi) * 3600
-    t2_plate_scale = arcsec_per_radian / (t2_focal_ratio * t2_aperture_diameter)
-    c2_h = args.c2h if args.c2h else c1_h
-    c2_v = args.c2v if args.c2v else c1_v
-    c2_p = args.c2p if args.c2p else c1_p
-    c2_b = args.c2b if args.c2b else 1
-
-    url_args = 'https://lambermont.dyndns.org/astro/code/compare-telescopes.html?a'
-    url_args += '&d1={}'.format(args.d1) if args.d1 else ''
-    url_args += "&di1={}".format(args.di1) if args.di1 else ''
-    url_args += "&o1={}".format(args.o1) if args.o1 else ''
-    url_args += "&l1={}".format(args.l1) if args.l1 else ''
-    url_args += "&f1={}".format(args.f1) if args.f1 else ''
-    url_args += "&r1={}".format(args.r1) if args.r1 else ''
-    url_args += "&t1={}".format(args.t1) if args.t1 else ''
-    url_args += "&c1h={}".format(args.c1h) if args.c1h else ''
-    url_args += "&c1v={}".format(args.c1v) if args.c1v else ''
-    url_args += "&c1p={}".format(args.c1p) if args.c1p else ''
-    url_args += "&c1q={}".format(args.c1q) if args.c1q else ''
-    url_args += "&c1b={}".format(args.c1b) if args.c1b else ''
-    url_args += "&d2={}".format(args.d2) if args.d2 else ''
-    url_args += "&di2={}".format(args.di2) if args.di2 else ''
-    url_args += "&o2={}".format(args.o2) if args.o2 else ''
-    url_args += "&l2={}".format(args.l2) if args.l2 else ''
-    url_args += "&f2={}".format(args.f2) if args.f2 else ''
-    url_args += "&r2={}".format(args.r2) if args.r2 else ''
-    url_args += "&t2={}".format(args.t2) if args.t2 else ''
-    url_args += "&c2h={}".format(args.c2h) if args.c2h else ''
-    url_args += "&c2v={}".format(args.c2v) if args.c2v else ''
-    url_args += "&c2p={}".format(args.c2p) if args.c2p else ''
-    url_args += "&c2q={}".format(args.c2q) if args.c2q else ''
-    url_args += "&c2b={}".format(args.c2b) if args.c2b else ''
-    print(url_args + '\n')
-
-    c1_h /= c1_b
-    c1_v /= c1_b
-    c1_p *= c1_b
-    c2_h /= c2_b
-    c2_v /= c2_b
-    c2_p *= c2_b
-
-    c1_a = c1_h * c1_p * c1_v * c1_p
-    c1_q = args.c1q if args.c1q else 1
-    c2_a = c2_h * c2_p * c2_v * c2_p
-    c2_q = args.c2q if args.c2q else c1_q
-
-    t1_arcsec_p = arcsec_per_radian / t1_focal_length * c1_p / 1000
-    t1_view_h = c1_h * arcsec_per_radian / t1_focal_length * c1_p / 1000
-    t1_view_v = c1_v * arcsec_per_radian / t1_focal_length * c1_p / 1000
-    t1_view_a = t1_view_h * t1_view_v
-    t1_etendue = t1_aperture_area * t1_view_a / 1e6  # / (57.296**2 * 3600**2)
-    t1_pixel_etendue = t1_aperture_area * t1_arcsec_p ** 2
-    t1_pixel_signal = t1_pixel_etendue * c1_q * t1_transmittance_factor
-
-    t2_arcsec_p = arcsec_per_radian / t2_focal_length * c2_p / 1000
-    t2_view_h = c2_h * arcsec_per_radian / t2_focal_length * c2_p / 1000
-    t2_view_v = c2_v * arcsec_per_radian / t2_focal_length * c2_p / 1000
-    t2_view_a = t2_view_h * t2_view_v
-    t2_etendue = t2_aperture_area * t2_view_a / 1e6  # / (57.296**2 * 3600**2)
-    t2_pixel_etendue = t2_aperture_area * t2_arcsec_p ** 2
-    t2_pixel_signal = t2_pixel_etendue * c2_q * t2_transmittance_factor
-
-    t1_t2_extended_object_irradiance_factor = (1 / (t1_focal_ratio / t2_focal_ratio) ** 2)
-    t2_t1_extended_object_irradiance_factor = (1 / (t2_focal_ratio / t1_focal_ratio) ** 2)
-    t1_t2_point_object_irradiance_factor = (1 / (t1_focal_ratio / t2_focal_ratio) ** 2) * (
-            t1_aperture_area / t2_aperture_area)
-    t2_t1_point_object_irradiance_factor = (1 / (t2_focal_ratio / t1_focal_ratio) ** 2) * (
-            t2_aperture_area / t1_aperture_area)
-    t1_t2_aperture_area = t1_aperture_area / t2_aperture_area
-    t2_t1_aperture_area = t2_aperture_area / t1_aperture_area
-    c1_c2_area = c1_a / c2_a
-    c2_c1_area = c2_a / c1_a
-    t1_t2_view_factor = t1_view_a / t2_view_a
-    t2_t1_view_factor = t2_view_a / t1_view_a
-    t1_t2_etendue = t1_etendue / t2_etendue
-    t2_t1_etendue = t2_etendue / t1_etendue
-    t1_t2_pixel_etendue = t1_pixel_etendue / t2_pixel_etendue
-    t2_t1_pixel_etendue = t2_pixel_etendue / t1_pixel_etendue
-    t1_t2_pixel_signal = t1_pixel_signal / t2_pixel_signal
-    t2_t1_pixel_signal = t2_pixel_signal / t1_pixel_signal
-
-    t1_t2_object_signal = t1_aperture_area / t2_aperture_area * c1_q / c2_q * t1_transmittance_factor / t2_transmittance_factor
-    t2_t1_object_signal = t2_aperture_area / t1_aperture_area * c2_q / c1_q * t2_transmittance_factor / t1_transmittance_factor
+        print_detail(rows, name='Setup')
 
-    if args.brief or not args.detail:
-        print(
-            'Telescope 1 f/{:<5.2f} l={:4.0f}mm D={:3.0f}mm O={:2.0f}% res={:3.2f}"/p FOV={:2.0f}\'x{:2.0f}\'={:5.2f}x eoi={:5.2f}x poi={:5.2f}x e={:5.2f}x pe={:5.2f}x ps={:5.2f}x os={:5.2f}x'.format(
-                t1_focal_ratio, t1_focal_length, t1_aperture_diameter, 100 * t1_obstruction_ratio, t1_arcsec_p,
-                                                                       t1_view_h / 60, t1_view_v / 60,
-                t1_t2_view_factor, t1_t2_extended_object_irradiance_factor, t1_t2_point_object_irradiance_factor,
-                t1_t2_etendue, t1_t2_pixel_etendue, t1_t2_pixel_signal, t1_t2_object_signal))
-        print(
-            'Telescope 2 f/{:<5.2f} l={:4.0f}mm D={:3.0f}mm O={:2.0f}% res={:3.2f}"/p FOV={:2.0f}\'x{:2.0f}\'={:5.2f}x eoi={:5.2f}x poi={:5.2f}x e={:5.2f}x pe={:5.2f}x ps={:5.2f}x os={:5.2f}x'.format(
-                t2_focal_ratio, t2_focal_length, t2_aperture_diameter, 100 * t2_obstruction_ratio, t2_arcsec_p,
-                                                                       t2_view_h / 60, t2_view_v / 60,
-                t2_t1_view_factor, t2_t1_extended_object_irradiance_factor, t2_t1_point_object_irradiance_factor,
-                t2_t1_etendue, t2_t1_pixel_etendue, t2_t1_pixel_signal, t2_t1_object_signal))
-        if args.legend:
-            print(
-                '# F-number focalLength apertureDiameter Obstruction RESolution FieldOfView ExtendedObjectIrradiance PixelOI Etendue PixelEtendue PixelSignal ObjectSignal')
+
+def run_exposure(args, specs, name='Telescope'):
+    grids = []
+    for option, text in (('--sky', args.sky), ('--target', args.target)):
+        values = sweep_values(text)
+        if not all(isinstance(value, float) for value in values):
+            raise CompareError('Bad {} {}, expected mag/arcsec² numbers'.format(option, text))
+        grids.append(values)
+    if args.snr <= 0 or args.integration <= 0 or args.sub <= 0:
+        raise CompareError('--snr, --integration and --sub must be positive')
+    columns = exposure_grid(resolve_setups(specs), [camera for _, camera in specs], grids[0], grids[1], args.snr,
+                            args.integration, args.sub)
+    rows = [dict(zip(EXPOSURE_COLUMNS, values)) for values in zip(*(columns[key] for key in EXPOSURE_COLUMNS))]
+    if args.format not in (None, 'text'):
+        with output(args) as stream:
+            writer = RecordWriter(stream, args.format, EXPOSURE_COLUMNS)
+            for row in rows:
+                writer.write(row)
+            writer.close()
+        return
+    for row in rows:
+        print('{} {} sky={:5.2f} target={:5.2f} target={:8.3f}e-/s sky={:8.3f}e-/s dark={:6.3f}e-/s snr={:6.1f} in {:.0f}s time={:8.0f}s for snr {:g} max sub={:6.0f}s'.format(
+            name, row['setup'], row['sky'], row['target'], row['target_rate'], row['sky_rate'], row['dark_rate'],
+            row['snr'], args.integration, row['time'], args.snr, row['max_sub']))
+
+
+def run_mosaic(args, specs, name='Telescope'):
+    setups = resolve_setups(specs)
+    try:
+        lines = sys.stdin if args.mosaic == '-' else open(args.mosaic)
+    except OSError as e:
+        raise CompareError('Cannot read {}: {}'.format(args.mosaic, e))
+    with lines:
+        records = mosaic(setups, lines, args.overlap, args.integration)
+        if args.format not in (None, 'text'):
+            with output(args) as stream:
+                writer = RecordWriter(stream, args.format, MOSAIC_COLUMNS)
+                for record in records:
+                    writer.write(record)
+                writer.close()
+            return
+        panels = [0] * len(setups)
+        for record in records:
+            if 'error' in record:
+                print('Line {} {}'.format(record['line'], record['error']))
+                continue
+            panels[record['setup'] - 1] += record['panels']
+            print('{:20.20s} {:4.0f}\'x{:4.0f}\' {} {} {:2d}x{:<2d}={:3d} panels{} coverage {:3.0f}% time={:6.1f}h'.format(
+                str(record['target']), record['width'], record['height'], name, record['setup'], record['panels_h'],
+                record['panels_v'], record['panels'], ' rotated' if record['rotated'] else '', 100 * record['coverage'],
+                record['time'] / 3600))
+    for n, count in enumerate(panels, 1):
+        print('{} {} total {} panels, time={:.1f}h'.format(name, n, count, count * args.integration / 3600))
+
+
+def run_seeing(args, specs, name='Telescope'):
+    under, _, over = args.sampling.partition(':')
+    try:
+        under, over = float(under), float(over)
+    except ValueError:
+        raise CompareError('Bad --sampling {}, expected MIN:MAX'.format(args.sampling))
+    histogram = seeing_histogram(args.seeing, args.seeing_column)
+    rows = []
+    for n, setup in enumerate(resolve_setups(specs), 1):
+        rows.append(dict(zip(SEEING_COLUMNS, (n, setup.arcsec_p) + sampling(histogram, setup.arcsec_p, under, over))))
+    if args.format not in (None, 'text'):
+        with output(args) as stream:
+            writer = RecordWriter(stream, args.format, SEEING_COLUMNS)
+            for row in rows:
+                writer.write(row)
+            writer.close()
+        return
+    for row in rows:
+        print('{} {} res={:3.2f}"/p median seeing {:3.2f}" under-sampled {:5.1f}% well sampled {:5.1f}% over-sampled {:5.1f}% of {} measurements'.format(
+            name, row['setup'], row['arcsec_p'], row['median'], 100 * row['under'], 100 * row['well'],
+            100 * row['over'], row['count']))
+
+
+def run_simulate(args, specs, name='Telescope'):
+    try:
+        sky = float(args.sky)
+    except ValueError:
+        raise CompareError('Bad --sky {}, --simulate takes one mag/arcsec² number'.format(args.sky))
+    if args.stars < 1 or args.tile < 1 or args.sub <= 0:
+        raise CompareError('--stars, --tile and --sub must be positive')
+    rows = simulate(resolve_setups(specs), [camera for _, camera in specs], args.stars, args.magnitude, sky, args.sub,
+                    args.fwhm, args.tile, args.jobs, args.seed)
+    if args.format not in (None, 'text'):
+        with output(args) as stream:
+            writer = RecordWriter(stream, args.format, SIMULATION_COLUMNS)
+            for row in rows:
+                writer.write(row)
+            writer.close()
+        return
+    for row in rows:
+        print('{} {} {} stars star={:10.1f}e-/s ({:10.1f}) pixel={:8.3f}e-/s ({:8.3f}) peak={:9.1f}e-/s ({:9.1f}) measured (predicted)'.format(
+            name, row['setup'], row['stars'], row['star_rate'], row['predicted_star_rate'], row['pixel_rate'],
+            row['predicted_pixel_rate'], row['peak_rate'], row['predicted_peak_rate']))
+    for row in rows[1:]:
+        print('{} {} against 1 os={:5.2f}x ({:5.2f}x) ps={:5.2f}x ({:5.2f}x) peak={:5.2f}x ({:5.2f}x) measured (predicted)'.format(
+            name, row['setup'], row['star_rate'] / rows[0]['star_rate'],
+            row['predicted_star_rate'] / rows[0]['predicted_star_rate'], row['pixel_rate'] / rows[0]['pixel_rate'],
+            row['predicted_pixel_rate'] / rows[0]['predicted_pixel_rate'], row['peak_rate'] / rows[0]['peak_rate'],
+            row['predicted_peak_rate'] / rows[0]['predicted_peak_rate']))
+
+
+def parse_uncertainty(key, value):
+    try:
+        value = float(value)
+    except ValueError:
+        raise CompareError('Bad uncertainty for {}: {!r}'.format(key, value))
+    if value < 0:
+        raise CompareError('Uncertainty {} of {} is negative'.format(value, key))
+    return value
+
+
+def run_uncertainty(args, specs, uncertainties, baseline, name='Telescope'):
+    rows = monte_carlo(resolve_setups(specs), specs, uncertainties, args.uncertainty, baseline, args.confidence,
+                       args.seed)
+    if args.format not in (None, 'text'):
+        with output(args) as stream:
+            writer = RecordWriter(stream, args.format, UNCERTAINTY_COLUMNS)
+            for row in rows:
+                writer.write(row)
+            writer.close()
+        return
+    short = {metric: key for key, metric in SHORT_NAMES.items()}
+    for row in rows:
+        print('{} {} against {} {:3s} nominal {:6.3f}x median {:6.3f}x {:g}% in {:6.3f}x - {:6.3f}x, above 1x in {:5.1f}%'.format(
+            name, row['setup'], baseline + 1, short[row['metric']], row['nominal'], row['median'],
+            100 * args.confidence, row['low'], row['high'], 100 * row['above']))
+
+
+def run_interactive(gear, args, specs, against, name='Telescope'):
+    """
+    What-if session over stdin: every line sets fields keyed like the options, with the setup number (d1, c2b,
+    s2=RASA8, c1=ASI2600, an empty value unsets), and reprints the setups whose line changed. A line that fails
+    leaves the setups as they were.
+    """
+    what_if = WhatIf(specs)
+    numbers = list(range(1, len(specs) + 1))
+
+    def lines():
+        return [(n, what_if.setup(n), what_if.ratios(n, against[n - 1])) for n in numbers]
+
+    shown = lines()
+    print_brief([row[1:] for row in shown], args.legend, name=name, numbers=numbers)
+    explained = what_if.changes()
+    prompt = sys.stdin.isatty()
+    while True:
+        if prompt:
+            sys.stdout.write('> ')
+            sys.stdout.flush()
+        line = sys.stdin.readline()
+        if not line or line.strip() in ('quit', 'exit'):
+            return
+        command = line.strip()
+        if not command:
+            continue
+        if command == 'show':
+            print_brief([row[1:] for row in shown], name=name, numbers=numbers)
+            continue
+        if command == 'explain':
+            for node, old, new in explained:
+                print('{:40s} {} -> {}'.format(node, old, new))
+            continue
+        inputs = what_if.inputs()
+        try:
+            for item in command.split():
+                set_what_if(gear, what_if, item)
+            current = lines()
+        except CompareError as e:
+            what_if.restore(inputs)
+            print(e)
+            continue
+        changed = [row for row, old in zip(current, shown) if row != old]
+        print_brief([row[1:] for row in changed], name=name, numbers=[row[0] for row in changed])
+        shown = current
+        explained = what_if.changes()
+
+
+def set_what_if(gear, what_if, item):
+    """Apply one KEY=VALUE of an --interactive line."""
+    key, _, value = item.partition('=')
+    name = re.fullmatch(r'(s|c)(\d+)', key)
+    camera = re.fullmatch(r'c(\d+)([a-z]+)', key)
+    telescope = re.fullmatch(r'([a-z]+)(\d+)', key)
+    if name:
+        n = int(name.group(2))
+        if name.group(1) == 's':
+            fields = dict(zip(('d', 'di', 'l', 'f', 'o'), gear.scope(value)))
+        else:
+            fields = dict(zip(('h', 'v', 'p', 'q', 'cr'), gear.camera(value)))
+    elif camera and camera.group(2) in WHAT_IF_CAMERA_KEYS and camera.group(2) != 'cr' or \
+            telescope and telescope.group(1) in WHAT_IF_TELESCOPE_KEYS:
+        n, field = (int(camera.group(1)), camera.group(2)) if camera else (int(telescope.group(2)), telescope.group(1))
+        try:
+            fields = {field: float(value) if value else None}
+        except ValueError:
+            raise CompareError('Bad value for {}: {!r}'.format(key, value))
     else:
-        print('---')
-        print('OTA 1 resolving power {:.3f} [arcsec], plate scale {:.3f} [arcsec/mm] = {:.1f} [μm/arcsec]'.format(
-            t1_resolving_power, t1_plate_scale, 1000 / t1_plate_scale))
-        print(
-            'OTA 1 focal ratio f/{:.1f}, focal length {:.0f} [mm], aperture diameter {:.0f} [mm], central obstruction ratio {:.2f}, diameter {:.0f} [mm]'.format(
-                t1_focal_ratio, t1_focal_length, t1_aperture_diameter, t1_obstruction_ratio, t1_obstruction_diameter))
-        print('OTA 1 aperture area {:.2f} [mm^2], collects {:.2f}x more photons'.format(
-            t1_aperture_area, t1_t2_aperture_area))
+        raise CompareError('{} is an unknown key, expected one like d1, c2b, s1 or c2'.format(key))
+    for field, value in fields.items():
+        what_if.set(n, field, value)
+
+
+def print_brief(rows, legend=False, name='Telescope', numbers=None):
+    """One line per (setup, ratios) row, numbered from 1 or by numbers."""
+    for n, (s, x) in zip(numbers if numbers else itertools.count(1), rows):
         print(
-            'Camera 1 pixel size {:.3f} [μm], sensor size {:.0f}x{:.0f} [pixels*pixels], {:.1f}x{:.1f} [mm*mm], sensor area {:.2f} [mm^2] ={:.2f}x larger'.format(
-                c1_p, c1_h, c1_v, c1_h * c1_p / 1e3, c1_v * c1_p / 1e3, c1_a / 1e6, c1_c2_area))
-        print('Camera 1 quantum efficiency factor {:.2f}'.format(c1_q))
+            '{} {} f/{:<5.2f} l={:4.0f}mm D={:3.0f}mm O={:2.0f}% res={:3.2f}"/p FOV={:2.0f}\'x{:2.0f}\'={:5.2f}x eoi={:5.2f}x poi={:5.2f}x e={:5.2f}x pe={:5.2f}x ps={:5.2f}x os={:5.2f}x'.format(
+                name, n, s.focal_ratio, s.focal_length, s.aperture_diameter, 100 * s.obstruction_ratio, s.arcsec_p,
+                s.view_h / 60, s.view_v / 60, x.view_a, x.extended_object_irradiance, x.point_object_irradiance,
+                x.etendue, x.pixel_etendue, x.pixel_signal, x.object_signal))
+    if legend:
         print(
-            'Telescope 1 resolution {:.4f} [arcsec/pixel], FOV {:.3f}x{:.3f} [arcsec*arcsec]={:.2f}x{:.2f} [arcmin*arcmin] ={:.4f}x larger, optical transmittance factor {:.2f}'.format(
-                t1_arcsec_p, t1_view_h, t1_view_v, t1_view_h / 60, t1_view_v / 60, t1_t2_view_factor,
-                t1_transmittance_factor))
-        print('Telescope 1 extended object irradiance is {:.2f}x more'.format(t1_t2_extended_object_irradiance_factor))
-        print('Telescope 1    point object irradiance is {:.2f}x more'.format(t1_t2_point_object_irradiance_factor))
-        print('Telescope 1       etendue {:.2f} [m^2arcsec^2] ={:.2f}x more'.format(t1_etendue, t1_t2_etendue))
-        print('Telescope 1 pixel etendue {:.2f} [mm^2arcsec^2] ={:.2f}x more'.format(t1_pixel_etendue,
-                                                                                     t1_t2_pixel_etendue))
-        print('Telescope 1 pixel signal is {:.2f}x more'.format(t1_t2_pixel_signal))
-        print('Telescope 1 object signal is {:.2f}x more'.format(t1_t2_object_signal))
-        print('---')
-        print('OTA 2 resolving power {:.3f} [arcsec], plate scale {:.3f} [arcsec/mm] = {:.1f} [μm/arcsec]'.format(
-            t2_resolving_power, t2_plate_scale, 1000 / t2_plate_scale))
+            '# F-number focalLength apertureDiameter Obstruction RESolution FieldOfView ExtendedObjectIrradiance PixelOI Etendue PixelEtendue PixelSignal ObjectSignal')
+
+
+def print_detail(rows, name='Telescope'):
+    print('---')
+    for n, (s, x) in enumerate(rows, 1):
+        print('OTA {} resolving power {:.3f} [arcsec], plate scale {:.3f} [arcsec/mm] = {:.1f} [μm/arcsec]'.format(
+            n, s.resolving_power, s.plate_scale, 1000 / s.plate_scale))
         print(
-            'OTA 2 focal ratio f/{:.1f}, focal length {:.0f} [mm], aperture diameter {:.0f} [mm], central obstruction ratio {:.2f}, diameter {:.0f} [mm]'.format(
-                t2_focal_ratio, t2_focal_length, t2_aperture_diameter, t2_obstruction_ratio, t2_obstruction_diameter))
-        print('OTA 2 aperture area {:.2f} [mm^2], collects {:.2f}x more photons'.format(
-            t2_aperture_area, t2_t1_aperture_area))
+            'OTA {} focal ratio f/{:.1f}, focal length {:.0f} [mm], aperture diameter {:.0f} [mm], central obstruction ratio {:.2f}, diameter {:.0f} [mm]'.format(
+                n, s.focal_ratio, s.focal_length, s.aperture_diameter, s.obstruction_ratio, s.obstruction_diameter))
+        print('OTA {} aperture area {:.2f} [mm^2], collects {:.2f}x more photons'.format(
+            n, s.aperture_area, x.aperture_area))
         print(
-            'Camera 2 pixel size {:.3f} [μm], sensor size {:.0f}x{:.0f} [pixels*pixels], {:.1f}x{:.1f} [mm*mm], sensor area {:.2f} [mm^2] ={:.2f}x larger'.format(
-                c2_p, c2_h, c2_v, c2_h * c2_p / 1e3, c2_v * c2_p / 1e3, c2_a / 1e6, c2_c1_area))
-        print('Camera 2 quantum efficiency factor {:.2f}'.format(c2_q))
+            'Camera {} pixel size {:.3f} [μm], sensor size {:.0f}x{:.0f} [pixels*pixels], {:.1f}x{:.1f} [mm*mm], sensor area {:.2f} [mm^2] ={:.2f}x larger'.format(
+                n, s.pixel_size, s.pixels_h, s.pixels_v, s.pixels_h * s.pixel_size / 1e3,
+                s.pixels_v * s.pixel_size / 1e3, s.sensor_area / 1e6, x.sensor_area))
+        print('Camera {} quantum efficiency factor {:.2f}'.format(n, s.qe))
         print(
-            'Telescope 2 resolution {:.4f} [arcsec/pixel], FOV {:.3f}x{:.3f} [arcsec*arcsec]={:.2f}x{:.2f} [arcmin*arcmin] ={:.4f}x larger, optical transmittance factor {:.2f}'.format(
-                t2_arcsec_p, t2_view_h, t2_view_v, t2_view_h / 60, t2_view_v / 60, t2_t1_view_factor,
-                t2_transmittance_factor))
-        print('Telescope 2 extended object irradiance is {:.2f}x more'.format(t2_t1_extended_object_irradiance_factor))
-        print('Telescope 2    point object irradiance is {:.2f}x more'.format(t2_t1_point_object_irradiance_factor))
-        print('Telescope 2       etendue {:.2f} [m^2arcsec^2] ={:.2f}x more'.format(t2_etendue, t2_t1_etendue))
-        print('Telescope 2 pixel etendue {:.2f} [mm^2arcsec^2] ={:.2f}x more'.format(t2_pixel_etendue,
-                                                                                     t2_t1_pixel_etendue))
-        print('Telescope 2 pixel signal is {:.2f}x more'.format(t2_t1_pixel_signal))
-        print('Telescope 2 object signal is {:.2f}x more'.format(t2_t1_object_signal))
+            '{} {} resolution {:.4f} [arcsec/pixel], FOV {:.3f}x{:.3f} [arcsec*arcsec]={:.2f}x{:.2f} [arcmin*arcmin] ={:.4f}x larger, optical transmittance factor {:.2f}'.format(
+                name, n, s.arcsec_p, s.view_h, s.view_v, s.view_h / 60, s.view_v / 60, x.view_a, s.transmittance_factor))
+        print('{} {} extended object irradiance is {:.2f}x more'.format(name, n, x.extended_object_irradiance))
+        print('{} {}    point object irradiance is {:.2f}x more'.format(name, n, x.point_object_irradiance))
+        print('{} {}       etendue {:.2f} [m^2arcsec^2] ={:.2f}x more'.format(name, n, s.etendue, x.etendue))
+        print('{} {} pixel etendue {:.2f} [mm^2arcsec^2] ={:.2f}x more'.format(
+            name, n, s.pixel_etendue, x.pixel_etendue))
+        print('{} {} pixel signal is {:.2f}x more'.format(name, n, x.pixel_signal))
+        print('{} {} object signal is {:.2f}x more'.format(name, n, x.object_signal))
         print('---')
 
 
+def parse_filters(text):
+    """The --filters bands as name: (start, stop), None for all of FILTERS."""
+    if not text:
+        return None
+    names = text.split(',')
+    unknown = [name for name in names if name not in FILTERS]
+    if unknown:
+        raise CompareError('{} is an unknown filter, choose from {}'.format(', '.join(unknown), ', '.join(FILTERS)))
+    return collections.OrderedDict((name, FILTERS[name]) for name in names)
+
+
+def print_spectral(comparison, specs, filters=None):
+    bands = [spectral_bands(setup, telescope, camera, filters, specs[0]) for setup, (telescope, camera) in
+             zip((comparison.setup1, comparison.setup2), specs)]
+    for n, (own, other) in enumerate(((bands[0], bands[1]), (bands[1], bands[0])), 1):
+        for name, band in own.items():
+            print('Telescope {} {:4s} {:3.0f}nm resolving power {:.3f}" QE {:.2f} T {:.2f} ps={:5.2f}x os={:5.2f}x'.format(
+                n, name, band.wavelength, band.resolving_power, band.qe, band.transmittance_factor,
+                band.pixel_signal / other[name].pixel_signal, band.object_signal / other[name].object_signal))
+
+
+def print_matrix(gear, args, telescope1, camera1):
+    metric = SHORT_NAMES.get(args.matrix, args.matrix)
+    if metric not in PRODUCT_METRICS:
+        raise CompareError('{} is an unknown performance indicator'.format(args.matrix))
+    reducers = [float(x) for x in args.reducers.split(',')] if args.reducers else [1]
+    binnings = [int(x) for x in args.binnings.split(',')] if args.binnings else [1]
+    baseline = cross_product({'1': telescope1._asdict()}, {'1': camera1._asdict()}, [telescope1.r], [camera1.b])
+    product = cross_product(gear.scopes, gear.cameras, reducers, binnings)
+    matrix = ratio_matrix(product, baseline, metric)
+    width = len(matrix[0])
+    if args.format not in (None, 'text'):
+        with output(args) as stream:
+            writer = RecordWriter(stream, args.format, MATRIX_COLUMNS)
+            for n, value in enumerate(itertools.chain.from_iterable(matrix)):
+                record = {label: product[label][n] for label in PRODUCT_LABELS}
+                record['ratio'] = value
+                writer.write(record)
+            writer.close()
+        return
+    print('{:20s}'.format('') + ''.join(
+        ' {:>13.13s}'.format(camera if len(binnings) == 1 else '{}/{}'.format(camera, binning))
+        for camera, binning in zip(product['camera'][:width], product['binning'][:width])))
+    for row, scope, reducer in zip(matrix, product['scope'][::width], product['reducer'][::width]):
+        label = scope if len(reducers) == 1 else '{} x{:g}'.format(scope, reducer)
+        print('{:20.20s}'.format(label) + ''.join(' {:13.2f}'.format(value) for value in row))
+
+
 def print_formulas():
     formulas = textwrap.dedent("""\
     - Pixel Scale, or pixel resolution, is the solid angle that is projected on a single pixel.
@@ -0,0 +1,2564 @@
+"""
+Library behind compare-telescopes.py, so telescope and camera comparisons can run in-process.
+
+    import compare_telescopes as ct
+    comparison = ct.compare(ct.Telescope(d=100, f=6), None, ct.Telescope(d=80, f=7))
+    comparison.ratios12.pixel_signal
+
+Errors are raised as CompareError instead of exiting.
+"""
+import bisect
+import collections
+import concurrent.futures
+import contextlib
+import csv
+import functools
+import hashlib
+import heapq
+import http.server
+import itertools
+import json
+import math
+import mmap
+import operator
+import os
+import os.path
+import struct
+import threading
+import time
+import urllib.parse
+
+default_json_data = """
+{
+    "scopes": {
+        "ED80": { "d": 80, "l": 600 },
+        "ESPRIT100": { "d": 100, "f": 5.5 },
+        "ESPRIT150": { "d": 150, "f": 7 },
+        "APO130": { "d": 130, "l": 650 },
+        "TS-photoline-130": { "d": 130, "l": 910 },
+        "SV102ED": { "d": 102, "l": 710 },
+        "TOA150B": { "d": 150, "l": 1100 },
+        "APMLZOS152": { "d": 152, "l": 1200 },
+        "TEC140": { "d": 140, "l": 980 },
+        "epsilon-180ED": { "d": 180, "f": 2.8 },
+        "BS10ED": { "di": 10, "l": 711, "o": 0.35 },
+        "BS12ED": { "di": 12, "l": 854, "o": 0.34 },
+        "AGOiDK10": { "d": 254, "l": 1674, "o": 0.56 },
+        "AGOiDK12.5": { "d": 318, "l": 2128, "o": 0.54 },
+        "AGOiDK14.5": { "d": 368, "l": 2464, "o": 0.52 },
+        "AGOiDK17": { "d": 432, "l": 2884, "o": 0.49 },
+        "AGOiDK20": { "d": 508, "l": 3403, "o": 0.48 },
+        "dream16_3.75": { "di": 16, "f": 3.75, "o": 0.375 },
+        "MN-152": { "manufacturer": "Explore Scientific", "alias1": "MN6", "type": "Maksutov-Newton", "d": 152, "f": 5, "o": 0.32 },
+        "CDK12.5": { "d": 318, "l": 2541, "o": 0.37 },
+        "CDK14": { "d": 356, "l": 2563, "o": 0.24 },
+        "CDK17": { "d": 432, "l": 2939, "o": 0.24 },
+        "CDK20f7.77": { "d": 508, "l": 3951, "o": 0.15 },
+        "CDK20f6.8": { "d": 508, "l": 3454, "o": 0.15 },
+        "CDK24": { "d": 610, "l": 3974, "o": 0.22 },
+        "C8": { "di": 8, "f": 10, "o": 0.39 },
+        "C8-H3": { "di": 8, "l": 425, "o": 0.39 },
+        "C8-H4": { "di": 8, "l": 390, "o": 0.39 },
+        "C9.25": { "di": 9.25, "f": 10, "o": 0.36 },
+        "C11": { "di": 11, "f": 10, "o": 0.34 },
+        "C14": { "di": 14, "f": 10, "o": 0.32 },
+        "C14-H4": { "di": 14, "l": 715, "o": 0.32 },
+        "AT6RC": { "di": 6, "l": 1370, "o": 0.50 },
+        "AT10RC": { "di": 10, "l": 2000, "o": 0.43 },
+        "TSRC8": { "d": 203, "l": 1624, "o": 0.42 },
+        "GSRC10": { "d": 254, "l": 2000, "o": 0.44 },
+        "GSRC12": { "d": 304, "l": 2432, "o": 0.49 },
+        "GSRC14": { "di": 14, "l": 2854, "o": 0.5 },
+        "LX200-8f10": { "di": 8, "f": 10, "o": 0.38 },
+        "LX200-10f10": { "di": 10, "f": 10, "o": 0.37 },
+        "LX200-14f10": { "di": 14, "f": 10, "o": 0.32 },
+        "ACF10f8": { "di": 10, "f": 8, "o": 0.47 },
+        "ACF12f8": { "di": 12, "f": 8, "o": 0.41 },
+        "ACF14f8": { "di": 14, "f": 8, "o": 0.36 },
+        "SWE250PDS": { "d": 250, "l": 1200, "o": 0.25 },
+        "MEWLON180": { "d": 180, "l": 2160, "o": 0.3 },
+        "ONTC808": { "d": 203, "l": 800, "o": 0.36 },
+        "ONTC1010": { "d": 254, "l": 1000, "o": 0.31 },
+        "ONTC1212": { "d": 303, "l": 1200, "o": 0.29 },
+        "RH200": { "d": 200, "l": 600, "o": 0.55 },
+        "RH305": { "d": 305, "l": 1159, "o": 0.24 },
+        "RASA8": { "di": 8, "l": 400, "o": 0.46 },
+        "RASA11": { "di": 11, "l": 620, "o": 0.50 },
+        "HUBBLE": { "d": 2400, "l": 57600, "o": 0.127, "t": 0.85 },
+        "EUCLID": { "d": 1200, "l": 24500, "o": 0.0, "t": 0.0 },
+        "ELT": { "d": 39300, "l": 743400, "o": 0.104 },
+        "VLT": { "d": 8200,  "l": 120000, "o": 0.136 },
+        "GTC": { "d": 10400,  "l": 169900, "o": 0.115 },
+        "KECK_p": { "d": 10000,  "l": 17500 },
+        "KECK_sf15": { "d": 10000,  "l": 149600, "o": 0.145 },
+        "KECK_sf25": { "d": 10000,  "l": 249700, "o": 0.050 },
+        "KECK_sf40": { "d": 10000,  "l": 395000, "o": 0.050 },
+        "TMT": { "d": 30000,  "l": 450000, "o": 0.103 }
+    },
+    "cameras": {
+        "ASI071": { "h": 4944, "v": 3284, "p": 4.79, "q": 0.50 },
+        "ASI120": { "h": 1280, "v": 960, "p": 3.75, "q": 0.80 },
+        "ASI2400MC": { "m": "ZWO", "s": "IMX410", "sm": "Sony", "h": 6072, "v": 4042, "p": 5.94, "q": 0.8 },
+        "ASI2600": { "h": 6248, "v": 4176, "p": 3.76, "q": 0.8, "rn": 3.3, "dc": 0.0022, "fw": 50000 },
+        "ASI6200": { "m": "ZWO", "s": "IMX455", "sm": "Sony", "h": 9576, "v": 6388, "p": 3.76, "q": 0.91, "rn": 3.5, "dc": 0.0022, "fw": 51400 },
+        "ASI1600": { "h": 4656, "v": 3520, "p": 3.8, "q": 0.60, "rn": 3.6, "dc": 0.0067, "fw": 20000 },
+        "ASI462MC": { "h": 1936, "v": 1096, "p": 2.9, "q": 0.9 },
+        "ASI290": { "h": 1936, "v": 1096, "p": 2.9, "q": 0.8 },
+        "ASI294": { "h": 4144, "v": 2822, "p": 4.63, "q": 0.75, "rn": 7.3, "dc": 0.0090, "fw": 63700 },
+        "ASI385": { "h": 1936, "v": 1096, "p": 3.75, "q": 0.80 },
+        "ASI533": { "h": 3008, "v": 3008, "p": 3.76, "q": 0.80 },
+        "ASI183": { "h": 5496, "v": 3672, "p": 2.40, "q": 0.84, "rn": 3.0, "dc": 0.0022, "fw": 15000 },
+        "ATIK11000": { "h": 4007, "v": 2671, "p": 9.0, "q": 0.5 },
+        "ATIK4000": { "h": 2047, "v": 2047, "p": 7.4, "q": 0.55 },
+        "KAI11002": { "h": 4008, "v": 2672, "p": 9.0, "q": 0.5 },
+        "ATIK16200": { "h": 4499, "v": 3599, "p": 6.0, "q": 0.6 },
+        "ATIK383": { "h": 3354, "v": 2529, "p": 5.4, "q": 0.56 },
+        "ATIKONE6": { "h": 2749, "v": 2199, "p": 4.54, "q": 0.66 },
+        "ATIKONE9": { "h": 3380, "v": 2704, "p": 3.69, "q": 0.77 },
+        "AtikHorizonII": { "h": 4656, "v": 3520, "p": 3.8, "q": 0.60 },
+        "EOS40D": { "h": 3888, "v": 2592, "p": 5.7, "q": 0.33 },
+        "EOS500D": { "h": 4752 , "v": 3168 , "p": 4.68, "q": 0.38 },
+        "EOS550D": { "h": 5184 , "v": 3456, "p": 4.29, "q": 0.4 },
+        "EOS70D": { "h": 5472, "v": 3648, "p": 4.1, "q": 0.48 },
+        "EOS6D": { "h": 5472, "v": 3648, "p": 6.54, "q": 0.5 },
+        "D5300": { "h": 6000, "v": 4000, "p": 3.92, "q": 0.55 },
+        "D5600": { "h": 6000, "v": 4000, "p": 3.92, "q": 0.52 },
+        "D610": { "m": "Nikon", "h": 6016, "v": 4016, "p":  5.95, "q": 0.49 },
+        "KAF3200ME": { "h": 2184, "v": 1472, "p": 6.8, "q": 0.85 },
+        "KAF8300": { "h": 3326, "v": 2504, "p": 5.4, "q": 0.56, "rn": 9, "dc": 0.02, "fw": 25500 },
+        "QSI683": { "h": 3326, "v": 2504, "p": 5.4, "q": 0.57 },
+        "QSI6120": { "m": "QSI", "s": "ICX834", "sm": "Sony", "h": 4250, "v": 2838, "p": 3.1, "q": 0.77 },
+        "KAF16803": { "h": 4096, "v": 4096, "p": 9.0, "q": 0.6, "rn": 9, "dc": 0.02, "fw": 100000 },
+        "KL4040": { "m": "FLI", "s": "GSense4040", "sm": "GPixel", "h": 4096, "v": 4096, "p": 9.0, "q": 0.74 },
+        "QHY163": { "h": 4656, "v": 3522, "p": 3.8, "q": 0.6 },
+        "QHY183": { "h": 5544, "v": 3694, "p": 2.4, "q": 0.84 },
+        "QHY268M": { "m": "QHY", "sm": "Sony", "s": "IMX571", "h": 6280, "v": 4210, "p": 3.76, "q": 0.9, "rn": 3.5, "dc": 0.0022, "fw": 51000 },
+        "QHY23": { "h": 3468, "v": 2728, "p": 3.69, "q": 0.8 },
+        "ST10XME": { "m": "SBIG", "h": 2184, "v": 1472, "p": 6.8, "q": 0.5 },
+        "SX694": { "h": 2750, "v": 2200, "p": 4.54, "q": 0.77 },
+        "SONYA7S": { "h": 4240, "v": 2832, "p": 8.4, "q": 0.65 },
+        "IMX511": { "h": 5215, "v": 4927, "p": 1.12, "q": 0.8 },
+        "HAWAII-4RG": { "h": 4096, "v": 4096, "p": 15, "q": 0.70 },
+        "ACS": { "h": 4096, "v": 4096, "p": 15, "q": 0.9, "r": 1.09 },
+        "WFC3": { "h": 4096, "v": 4096, "p": 15, "q": 0.9, "r": 1.354 },
+        "EUCLID-VIS": { "h": 24576, "v": 24792, "p": 12, "q": 0.9 }
+    }
+}
+"""
+
+
+class CompareError(ValueError):
+    pass
+
+
+class Profile():
+    """
+    Wall time and call count per timed() stage while active as `with Profile() as profile:`, see report(). Stage
+    times exclude nested stages, so they add up, and merge() adds the stages of other processes.
+    """
+    def __init__(self):
+        self.stages = {}
+        self.start = time.perf_counter()
+        self._nested = []
+        self._previous = None
+
+    def __enter__(self):
+        global _profile
+        self._previous = _profile
+        _profile = self
+        return self
+
+    def __exit__(self, *exc_info):
+        global _profile
+        _profile = self._previous
+
+    def add(self, stage, seconds, calls=1):
+        totals = self.stages.setdefault(stage, [0, 0.0])
+        totals[0] += calls
+        totals[1] += seconds
+
+    def merge(self, stages):
+        for stage, (calls, seconds) in stages.items():
+            self.add(stage, seconds, calls)
+
+    def begin(self):
+        self._nested.append(0.0)
+        return time.perf_counter()
+
+    def end(self, stage, start):
+        elapsed = time.perf_counter() - start
+        self.add(stage, elapsed - self._nested.pop())
+        if self._nested:
+            self._nested[-1] += elapsed
+
+    def report(self):
+        info = resolve_ota.cache_info()
+        return {'seconds': time.perf_counter() - self.start,
+                'stages': {stage: {'calls': calls, 'seconds': seconds, 'us_per_call': 1e6 * seconds / calls}
+                           for stage, (calls, seconds) in sorted(self.stages.items(), key=lambda x: -x[1][1])},
+                'ota_cache': {'hits': info.hits, 'misses': info.misses, 'size': info.currsize}}
+
+
+_profile = None
+
+
+def timed(stage):
+    """Decorator that counts the calls and time of a function as stage of the active Profile, if any."""
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            profile = _profile
+            if profile is None:
+                return function(*args, **kwargs)
+            start = profile.begin()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                profile.end(stage, start)
+        return wrapper
+    return decorator
+
+
+@contextlib.contextmanager
+def profile_stage(stage):
+    """The timed() decorator as a context manager."""
+    profile = _profile
+    if profile is None:
+        yield
+        return
+    start = profile.begin()
+    try:
+        yield
+    finally:
+        profile.end(stage, start)
+
+
+class Gear():
+    """
+    The known telescopes and cameras: the default data above merged with the custom json file, whose entries replace
+    the default ones listed in collisions. Names are looked up case insensitively and by their alias1, alias2, ...
+    fields. The merged catalog is cached as JSON in file + '.cache'.
+    """
+    @timed('gear')
+    def __init__(self, file=None, cache=True):
+        if file is None:
+            file = default_gear_file()
+        self.file = file
+        key = self._cache_key()
+        data = self._read_cache(key) if cache else None
+        if data is None:
+            data = self._parse()
+            if cache:
+                self._write_cache(key, data)
+        self.default_data, self.file_data, self.scopes, self.cameras, self.aliases, self.collisions = data
+        self._indexes = {}
+
+    def _parse(self):
+        file_data = None
+        default_data = json.loads(default_json_data)
+        if os.path.isfile(self.file):
+            try:
+                with open(self.file) as json_file:
+                    file_data = json.load(json_file)
+            except ValueError as e:
+                raise CompareError('Cannot read {}: {}'.format(self.file, e))
+        custom = file_data if isinstance(file_data, dict) else {}
+        merged = {}
+        aliases = {}
+        collisions = []
+        for kind in ('scopes', 'cameras'):
+            entries = {name.lower(): entry for name, entry in default_data[kind].items()}
+            for name, entry in (custom.get(kind) or {}).items():
+                if name.lower() in entries:
+                    collisions.append((kind, name.lower()))
+                entries[name.lower()] = entry
+            merged[kind] = entries
+            aliases[kind] = alias_index(entries)
+        return default_data, file_data, merged['scopes'], merged['cameras'], aliases, collisions
+
+    def name(self, kind, name):
+        """The catalog key of a scopes or cameras name or alias, or None."""
+        key = name.lower()
+        if key in getattr(self, kind):
+            return key
+        return self.aliases[kind].get(key)
+
+    def _cache_key(self):
+        try:
+            stat = os.stat(self.file)
+            file_key = [os.path.realpath(self.file), stat.st_mtime_ns, stat.st_size]
+        except OSError:
+            file_key = None
+        return [GEAR_CACHE_VERSION, hashlib.sha1(default_json_data.encode()).hexdigest(), file_key]
+
+    def _read_cache(self, key):
+        data = read_cache(self.file + '.cache', key)
+        if not isinstance(data, list) or len(data) != 6 or not isinstance(data[5], list):
+            return None
+        data[5] = [tuple(collision) for collision in data[5]]
+        return data
+
+    def _write_cache(self, key, data):
+        write_cache(self.file + '.cache', key, data)
+
+    def list_scopes_and_cameras(self, as_json=None, scopes=None, cameras=None):
+        """Print all known gear, or only the given scope and camera names."""
+        if as_json:
+            print('Default data:')
+            print(json.dumps(self.default_data, indent=4, sort_keys=True))
+            print('Custom data:')
+            print(json.dumps(self.file_data, indent=4, sort_keys=True))
+        else:
+            if scopes is None and cameras is None:
+                scopes, cameras = self.scopes, self.cameras
+            items = sorted((name, self.scopes[name]) for name in scopes or ()) + \
+                sorted((name, self.cameras[name]) for name in cameras or ())
+            for name in items:
+                line = "{:15s}".format(name[0])
+                for key in name[1].keys():
+                    value = name[1][key]
+                    line += " --{:2s} {:<6}".format(key, value)
+                print("{}".format(line))
+
+    def query_scopes(self, **ranges):
+        """
+        Names of the scopes with every given attribute in its (low, high) range, bounds included and None for open.
+        Attributes are SCOPE_QUERY_KEYS, for example query_scopes(focal_length=(400, 800), o=(None, 0.3)).
+        """
+        return self._query('scopes', SCOPE_QUERY_KEYS, ranges)
+
+    def query_cameras(self, **ranges):
+        """Like query_scopes() for cameras, with CAMERA_QUERY_KEYS, for example query_cameras(p=(3, 4))."""
+        return self._query('cameras', CAMERA_QUERY_KEYS, ranges)
+
+    def _query(self, kind, keys, ranges):
+        unknown = [key for key in ranges if key not in keys]
+        if unknown:
+            raise CompareError('Unknown {} attributes {}'.format(kind[:-1], ', '.join(unknown)))
+        names = None
+        for key, (low, high) in ranges.items():
+            values, index_names = self._index(kind, key)
+            start = 0 if low is None else bisect.bisect_left(values, low)
+            end = len(values) if high is None else bisect.bisect_right(values, high)
+            found = set(index_names[start:end])
+            names = found if names is None else names & found
+            if not names:
+                break
+        return sorted(getattr(self, kind) if names is None else names)
+
+    def _index(self, kind, key):
+        """Sorted (values, names) of one attribute, built on first use."""
+        if (kind, key) not in self._indexes:
+            entries = getattr(self, kind)
+            pairs = []
+            for name, entry in entries.items():
+                value = self._attribute(kind, entry, key)
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    pairs.append((value, name))
+            pairs.sort()
+            self._indexes[kind, key] = [value for value, _ in pairs], [name for _, name in pairs]
+        return self._indexes[kind, key]
+
+    @staticmethod
+    def _attribute(kind, entry, key):
+        if kind == 'scopes':
+            if key in ('aperture', 'focal_length', 'focal_ratio'):
+                try:
+                    ota = resolve_ota(*(entry.get(field) for field in SCOPE_FIELDS))
+                except (CompareError, TypeError):
+                    return None
+                return getattr(ota, 'aperture_diameter' if key == 'aperture' else key)
+            return entry.get(key, {'o': 0, 't': 1}.get(key))
+        if key in ('width', 'height'):
+            pixels = entry.get('h' if key == 'width' else 'v')
+            try:
+                return pixels * entry.get('p') / 1000
+            except TypeError:
+                return None
+        return entry.get(key, {'r': 1}.get(key))
+
+    @timed('lookup')
+    def scope(self, name):
+        d = None
+        di = None
+        l = None
+        f = None
+        o = None
+        key = self.name('scopes', name)
+        if key is None:
+            raise CompareError('{} is an unknown telescope'.format(name))
+        scope_dict = self.scopes[key]
+        if 'd' in scope_dict:
+            d = scope_dict['d']
+        if 'di' in scope_dict:
+            di = scope_dict['di']
+        if 'l' in scope_dict:
+            l = scope_dict['l']
+        if 'f' in scope_dict:
+            f = scope_dict['f']
+        if 'o' in scope_dict:
+            o = scope_dict['o']
+        return d, di, l, f, o
+
+    @timed('lookup')
+    def camera(self, name):
+        h = None
+        v = None
+        p = None
+        q = None
+        r = 1
+        key = self.name('cameras', name)
+        if key is None:
+            raise CompareError('{} is an unknown camera'.format(name))
+        camera_dict = self.cameras[key]
+        if 'h' in camera_dict:
+            h = camera_dict['h']
+        if 'v' in camera_dict:
+            v = camera_dict['v']
+        if 'p' in camera_dict:
+            p = camera_dict['p']
+        if 'q' in camera_dict:
+            q = camera_dict['q']
+        if 'r' in camera_dict:
+            r = camera_dict['r']
+        return h, v, p, q, r
+
+    def telescope_spec(self, name, r=None, t=None):
+        """The Telescope of a known scope, with its catalog transmittance t unless t is given."""
+        d, di, l, f, o = self.scope(name)
+        scope_dict = self.scopes[self.name('scopes', name)]
+        return Telescope(d=d, di=di, l=l, f=f, o=o, r=r, t=t if t else scope_dict.get('t'),
+                         tc=curve(scope_dict.get('tc')))
+
+    def uncertainties(self, scope=None, camera=None):
+        """
+        The catalog uncertainties of a scope and a camera for monte_carlo(): the standard deviation of a field is
+        stored under its name with a u in front, like "uq": 0.05. Uncertainties of one catalog entry share their draws
+        between setups, so the same scope in 2 setups cancels out.
+        """
+        found = {}
+        for kind, name in (('scopes', scope), ('cameras', camera)):
+            key = self.name(kind, name) if name else None
+            if key:
+                entry = getattr(self, kind)[key]
+                for field in UNCERTAIN_KEYS:
+                    if entry.get('u' + field):
+                        found[field] = (entry['u' + field], (kind, key))
+        return found
+
+    def camera_spec(self, name, b=None, rn=None, dc=None, fw=None):
+        h, v, p, q, r = self.camera(name)
+        camera_dict = self.cameras[self.name('cameras', name)]
+        return Camera(h=h, v=v, p=p, q=q, b=b, r=r, qc=curve(camera_dict.get('qc')),
+                      rn=rn if rn is not None else camera_dict.get('rn'),
+                      dc=dc if dc is not None else camera_dict.get('dc'),
+                      fw=fw if fw is not None else camera_dict.get('fw'))
+
+
+GEAR_CACHE_VERSION = 3
+
+
+def read_cache(file, key):
+    """The data stored by write_cache() under the same key, or None. The key is a list, as JSON reads it back."""
+    try:
+        with open(file) as cache_file:
+            stored = json.load(cache_file)
+    except (OSError, ValueError):  # missing, unreadable or not JSON, rebuild it
+        return None
+    if not isinstance(stored, dict) or stored.get('key') != key:
+        return None
+    return stored.get('data')
+
+
+def write_cache(file, key, data):
+    """Store the key and data as JSON in file, atomically. A read-only location leaves no cache."""
+    temporary = '{}.{}'.format(file, os.getpid())
+    try:
+        with open(temporary, 'w') as cache_file:
+            json.dump({'key': key, 'data': data}, cache_file, separators=(',', ':'))
+        os.replace(temporary, file)
+    except OSError:  # read-only location, run without cache
+        try:
+            os.remove(temporary)
+        except OSError:
+            pass
+
+
+def alias_index(entries):
+    """{alias: name} of the alias1, alias2, ... fields of {name: entry} catalog entries, lowercased. Names win."""
+    index = {}
+    for name, entry in entries.items():
+        for key, value in entry.items():
+            if key.startswith('alias') and isinstance(value, str) and value.lower() not in entries:
+                index.setdefault(value.lower(), name)
+    return index
+
+
+# CatalogImport number fields, the others stay text
+SCOPE_NUMBER_FIELDS = ('d', 'di', 'l', 'f', 'o', 't', 'price') + tuple('u' + key for key in ('d', 'di', 'l', 'f', 'o', 't'))
+CAMERA_NUMBER_FIELDS = ('h', 'v', 'p', 'q', 'r', 'rn', 'dc', 'fw', 'price', 'up', 'uq')
+CATALOG_KINDS = {'scope': 'scopes', 'scopes': 'scopes', 'telescope': 'scopes', 'camera': 'cameras',
+                 'cameras': 'cameras'}
+
+
+def catalog_entry(row, kind=None):
+    """
+    Validate one vendor row into (kind, name, entry). The row has a name, a kind (scope or camera, else it follows
+    from the fields) and the catalog fields. Telescopes need exactly 2 of d or di, l and f, cameras need h, v and p,
+    and o, t and q are in 0-1. Empty values count as not given.
+    """
+    row = {key: value for key, value in row.items() if value is not None and value != ''}
+    name = row.pop('name', None)
+    if not isinstance(name, str) or not name.strip():
+        raise CompareError('Missing name')
+    name = name.strip()
+    kind = CATALOG_KINDS.get(str(row.pop('kind', kind)).lower())
+    if kind is None:
+        kind = 'scopes' if any(key in row for key in ('d', 'di', 'l', 'f')) else \
+            'cameras' if any(key in row for key in ('h', 'v', 'p')) else None
+    if kind is None:
+        raise CompareError('{}: cannot tell a telescope from a camera, add a kind'.format(name))
+    numbers = SCOPE_NUMBER_FIELDS if kind == 'scopes' else CAMERA_NUMBER_FIELDS
+    entry = {}
+    for key, value in row.items():
+        if key in numbers:
+            try:
+                if isinstance(value, bool):
+                    raise CompareError('Bad value for {}: {!r}'.format(key, value))
+                value = _row_value(row, key, _whole if key in ('h', 'v') else float)
+            except CompareError as e:
+                raise CompareError('{}: {}'.format(name, e))
+            if value < 0:
+                raise CompareError('{}: bad {} {!r}'.format(name, key, value))
+        elif key in ('qc', 'tc') and isinstance(value, str):
+            try:
+                value = json.loads(value)
+            except ValueError:
+                raise CompareError('{}: bad curve {} {!r}'.format(name, key, value))
+        entry[key] = value
+    for key in ('o', 't', 'q'):
+        if key in entry and entry[key] > 1:
+            raise CompareError('{}: {} {} is not in 0-1'.format(name, key, entry[key]))
+    if kind == 'scopes':
+        if 'd' in entry and 'di' in entry:
+            raise CompareError('{}: both d and di'.format(name))
+        given = [key for key in ('d', 'di', 'l', 'f') if key in entry]
+        if len(given) != 2 or any(not entry[key] for key in given):
+            raise CompareError('{}: need exactly 2 of d or di, l and f, got {}'.format(name, ', '.join(given) or 'none'))
+    else:
+        missing = [key for key in ('h', 'v', 'p') if not entry.get(key)]
+        if missing:
+            raise CompareError('{}: missing {}'.format(name, ', '.join(missing)))
+    return kind, name, entry
+
+
+class CatalogImport():
+    """
+    Streams vendor rows into a validated and deduplicated catalog on top of existing scopes and cameras, see read()
+    and catalog(). Duplicates by name, alias, or camera manufacturer, sensor and geometry add their names as aliases
+    and fill in missing fields; a duplicate with other values is a conflict and is left out.
+    """
+    def __init__(self, data=None):
+        data = data if isinstance(data, dict) else {}
+        self.entries = {kind: dict(data.get(kind) or {}) for kind in ('scopes', 'cameras')}
+        self.names = {kind: {} for kind in self.entries}  # lowercased name or alias: name
+        self.sensors = {}  # (m, s, h, v, p): camera name
+        self.counts = collections.Counter()
+        for kind, entries in self.entries.items():
+            for name, entry in entries.items():
+                self._index(kind, name, entry)
+
+    def add(self, row, kind=None):
+        """Add one row, returns (kind, name, 'added' or 'duplicate of <name>'). Raises CompareError when bad."""
+        kind, name, entry = catalog_entry(row, kind)
+        existing = self._find(kind, name, entry)
+        if existing is None:
+            self.entries[kind][name] = entry
+            self._index(kind, name, entry)
+            self.counts['added'] += 1
+            return kind, name, 'added'
+        first = self.entries[kind][existing]
+        different = [key for key in entry if key in first and not key.startswith('alias') and
+                     self._identity(key, first[key]) != self._identity(key, entry[key])]
+        if different:
+            self.counts['conflicts'] += 1
+            raise CompareError('{} conflicts with {}: {}'.format(name, existing, ', '.join(
+                '{} {!r} != {!r}'.format(key, entry[key], first[key]) for key in different)))
+        known = {existing.lower()} | {value.lower() for key, value in first.items()
+                                      if key.startswith('alias') and isinstance(value, str)}
+        for value in [name] + [value for key, value in entry.items() if key.startswith('alias')]:
+            if isinstance(value, str) and value.lower() not in known:
+                first['alias{}'.format(sum(key.startswith('alias') for key in first) + 1)] = value
+                known.add(value.lower())
+        for key, value in entry.items():
+            first.setdefault(key, value)
+        self._index(kind, existing, first)
+        self.counts['duplicates'] += 1
+        return kind, name, 'duplicate of {}'.format(existing)
+
+    def read(self, lines, kind=None):
+        """add() every JSON or CSV line like batch(), yielding (line number, add() result or CompareError)."""
+        for number, row in read_rows(lines):
+            if not isinstance(row, CompareError):
+                try:
+                    row = self.add(row, kind)
+                except CompareError as e:
+                    row = e
+            if isinstance(row, CompareError):
+                self.counts['errors'] += 1
+            yield number, row
+
+    def catalog(self):
+        return {'scopes': self.entries['scopes'], 'cameras': self.entries['cameras']}
+
+    def _find(self, kind, name, entry):
+        names = self.names[kind]
+        for value in [name] + [value for key, value in entry.items() if key.startswith('alias')]:
+            if isinstance(value, str) and value.lower() in names:
+                return names[value.lower()]
+        signature = self._sensor(entry) if kind == 'cameras' else None
+        return self.sensors.get(signature) if signature else None
+
+    def _index(self, kind, name, entry):
+        names = self.names[kind]
+        names.setdefault(name.lower(), name)
+        for key, value in entry.items():
+            if key.startswith('alias') and isinstance(value, str):
+                names.setdefault(value.lower(), name)
+        signature = self._sensor(entry) if kind == 'cameras' else None
+        if signature:
+            self.sensors.setdefault(signature, name)
+
+    @staticmethod
+    def _identity(key, value):
+        """Manufacturer and sensor compare like _sensor() matches them: case insensitive."""
+        return str(value).strip().lower() if key in ('m', 'manufacturer', 's') else value
+
+    @classmethod
+    def _sensor(cls, entry):
+        manufacturer = entry.get('m', entry.get('manufacturer'))
+        if not entry.get('s') or not manufacturer:
+            return None
+        return cls._identity('m', manufacturer), cls._identity('s', entry['s']), entry.get('h'), entry.get('v'), \
+            entry.get('p')
+
+
+def default_gear_file():
+    return os.path.join(os.path.dirname(os.path.realpath(__file__)), 'telescopes-and-cameras.json')
+
+
+ARCSEC_PER_RADIAN = (360 / (2 * math.pi)) * 60 * 60  # 206265.something
+OTA_CACHE_SIZE = 4096  # resolved OTAs kept by resolve_ota()
+
+SCOPE_FIELDS = ('d', 'di', 'l', 'f', 'o')
+CAMERA_FIELDS = ('h', 'v', 'p', 'q', 'r')
+# Gear.query_*() attributes: the catalog fields, resolved optics, and sensor width and height in mm
+SCOPE_QUERY_KEYS = ('d', 'di', 'l', 'f', 'o', 't', 'aperture', 'focal_length', 'focal_ratio')
+CAMERA_QUERY_KEYS = ('h', 'v', 'p', 'q', 'r', 'width', 'height')
+PRODUCT_LABELS = ('scope', 'reducer', 'camera', 'binning')
+PRODUCT_METRICS = ('focal_ratio', 'focal_length', 'aperture_diameter', 'obstruction_ratio', 'aperture_area',
+                   'transmittance_factor', 'pixels_h', 'pixels_v', 'pixel_size', 'qe', 'sensor_area', 'arcsec_p',
+                   'view_h', 'view_v', 'view_a', 'extended_object_irradiance', 'point_object_irradiance', 'etendue',
+                   'pixel_etendue', 'pixel_signal', 'object_signal')
+RATIO_METRICS = ('view_a', 'extended_object_irradiance', 'point_object_irradiance', 'etendue', 'pixel_etendue',
+                 'pixel_signal', 'object_signal', 'aperture_area', 'sensor_area')
+OPTIMIZE_METRICS = ('pixel_signal', 'pixel_etendue', 'etendue', 'object_signal')
+# Constraints on the combination rather than the catalog entry: focal length and ratio with the reducer, pixel scale
+# ["/pixel] with the binning, and the field of view [arcmin]
+OPTIMIZE_KEYS = ('focal_length', 'focal_ratio', 'res', 'fovh', 'fovv')
+# pareto() objectives: pixel_signal and view_a (larger is better), the distance of arcsec_p to the target pixel
+# scale, the aperture_diameter (size, weight and cost) and the price fields of the scope and camera added
+PARETO_OBJECTIVES = ('ps', 'fov', 'res', 'aperture', 'price')
+PARETO_CHUNK = 1 << 20  # combinations per pareto() process chunk
+PARETO_BLOCK = 1024  # skyline() rows per vectorized dominance check
+SHORT_NAMES = {'res': 'arcsec_p', 'fov': 'view_a', 'eoi': 'extended_object_irradiance',
+               'poi': 'point_object_irradiance', 'e': 'etendue', 'pe': 'pixel_etendue', 'ps': 'pixel_signal',
+               'os': 'object_signal'}
+
+# Filter passbands (start, end) [nm]
+FILTERS = collections.OrderedDict((
+    ('L', (400, 700)), ('R', (600, 700)), ('G', (500, 600)), ('B', (400, 500)),
+    ('Ha', (652.8, 659.8)), ('OIII', (497.2, 504.2)), ('SII', (668.9, 675.9))))
+
+# exposure_grid() defaults: a dark site, and a cooled CMOS camera at its lowest gain when the camera has no rn, dc, fw
+SKY_SQM = 21.0  # [mag/arcsec²]
+READ_NOISE = 3.5  # [e-]
+DARK_CURRENT = 0.003  # [e-/s]
+FULL_WELL = 50000  # [e-]
+MAG0_PHOTON_RATE = 3.0e10  # photons/s/m² of a mag 0 source over the 400-700nm visual band, approximately
+EXPOSURE_COLUMNS = ('setup', 'sky', 'target', 'target_rate', 'sky_rate', 'dark_rate', 'snr', 'time', 'max_sub')
+# seeing_histogram() bins [arcsec], FWHM beyond SEEING_MAX share the last bin, and the read size [bytes]
+SEEING_BIN = 0.01
+SEEING_MAX = 20.0
+SEEING_CHUNK = 1 << 24
+SEEING_CACHE_VERSION = 3
+SAMPLING = (2.0, 3.0)  # well sampled between 2 and 3 pixels per FWHM, after Nyquist
+SEEING_COLUMNS = ('setup', 'arcsec_p', 'count', 'median', 'under', 'well', 'over')
+# simulate() defaults: a mag 12 star field seen through the SKY_SQM sky, at the wavelength of resolving_power
+STAR_MAGNITUDE = 12.0
+WAVELENGTH = 550e-6  # [mm]
+SIMULATION_TILE = 2048  # [pixels] per side of a rendered tile
+SIMULATION_COLUMNS = ('setup', 'stars', 'star_rate', 'pixel_rate', 'peak_rate', 'predicted_star_rate',
+                      'predicted_pixel_rate', 'predicted_peak_rate')
+# monte_carlo() fields with a standard deviation, and the ratios it reports
+UNCERTAIN_KEYS = ('d', 'di', 'l', 'f', 'o', 't', 'p', 'q')
+UNCERTAINTY_METRICS = ('extended_object_irradiance', 'point_object_irradiance', 'etendue', 'pixel_etendue',
+                       'pixel_signal', 'object_signal')
+UNCERTAINTY_COLUMNS = ('setup', 'metric', 'nominal', 'median', 'low', 'high', 'above')
+# WhatIf inputs per setup, the telescope and camera spec fields with cr for the reducer of the camera
+WHAT_IF_TELESCOPE_KEYS = ('d', 'di', 'l', 'f', 'o', 'r', 't')
+WHAT_IF_CAMERA_KEYS = ('h', 'v', 'p', 'q', 'b', 'cr')
+LATENCY_WINDOW = 10000  # latest requests per endpoint in the Server latency percentiles
+SERVER_ENDPOINTS = ('/compare', '/batch', '/sweep', '/query', '/stats')
+SERVER_SWEEP_ROWS = 1000000  # most rows of one Server /sweep
+MOSAIC_BLOCK = 4096  # mosaic() targets per numpy block
+MOSAIC_COLUMNS = ('line', 'target', 'setup', 'width', 'height', 'panels_h', 'panels_v', 'panels', 'rotated',
+                  'coverage', 'time', 'error')
+
+# Inputs, named after the --d1/--c1h/... command line options. None means not given.
+# tc and qc are optional transmittance and QE curves, tuples of (wavelength [nm], factor) pairs, see spectral_bands().
+Telescope = collections.namedtuple('Telescope', ('d', 'di', 'l', 'f', 'o', 'r', 't', 'tc'), defaults=(None,) * 8)
+# rn, dc and fw are the read noise [e-], dark current [e-/s] and full well [e-] of one unbinned pixel, see exposure_grid().
+Camera = collections.namedtuple('Camera', ('h', 'v', 'p', 'q', 'b', 'r', 'qc', 'rn', 'dc', 'fw'), defaults=(None,) * 10)
+
+# Outputs
+Ota = collections.namedtuple('Ota', (
+    'aperture_diameter', 'focal_length', 'focal_ratio', 'focal_reducer', 'obstruction_ratio', 'obstruction_diameter',
+    'obstruction_area', 'aperture_area', 'resolving_power', 'plate_scale', 'transmittance_factor'))
+Setup = collections.namedtuple('Setup', Ota._fields + (
+    'pixels_h', 'pixels_v', 'pixel_size', 'binning', 'qe', 'sensor_area', 'arcsec_p', 'view_h', 'view_v', 'view_a',
+    'extended_object_irradiance', 'point_object_irradiance', 'etendue', 'pixel_etendue', 'pixel_signal',
+    'object_signal'))
+Ratios = collections.namedtuple('Ratios', RATIO_METRICS)
+SpectralBand = collections.namedtuple('SpectralBand', (
+    'wavelength', 'resolving_power', 'qe', 'transmittance_factor', 'pixel_signal', 'object_signal'))
+Sampling = collections.namedtuple('Sampling', ('count', 'median', 'under', 'well', 'over'))
+Optimum = collections.namedtuple('Optimum', PRODUCT_LABELS + ('setup',))
+Comparison = collections.namedtuple('Comparison', ('setup1', 'setup2', 'ratios12', 'ratios21', 'url'))
+
+
+@timed('optics')
+def resolve_ota(d=None, di=None, l=None, f=None, o=None, r=None, t=None):
+    """
+    Resolve aperture diameter, focal length and focal ratio like telescope 1 on the command line: 2 out of 3 are
+    needed, missing ones become d=100mm and f/10, and the reducer factor r scales the focal length and ratio.
+    Results are kept in a bounded LRU cache, see resolve_ota.cache_info().
+    """
+    if o and not 0 <= o < 1:
+        raise CompareError('Obstruction ratio {} is not between 0 and 1'.format(o))
+    # as floats, or 100 and 100.0 would share a cache entry and the output type would depend on the call order
+    return _resolve_ota(float(d) if d else None, float(di) if di else None, float(l) if l else None,
+                        float(f) if f else None, float(o) if o else 0.0, float(r) if r else 1.0,
+                        float(t) if t else 1.0)
+
+
+@functools.lru_cache(maxsize=OTA_CACHE_SIZE)
+def _resolve_ota(d, di, l, f, o, r, t):
+    aperture_diameter = d if d else di * 25.4 if di else None
+    focal_reducer = r
+    if aperture_diameter:
+        if l:
+            if f:
+                raise CompareError('Need ONLY 2 out of 3 of aperture Diameter, Focal length, Focal ratio')
+            focal_length = l * focal_reducer
+            focal_ratio = focal_length / aperture_diameter
+        else:
+            focal_ratio = (f if f else 10) * focal_reducer  # choose f/10
+            focal_length = aperture_diameter * focal_ratio
+    elif l:
+        focal_length = l * focal_reducer
+        if f:
+            focal_ratio = f * focal_reducer
+            aperture_diameter = focal_length / focal_ratio
+        else:
+            aperture_diameter = 100  # choose d=100mm
+            focal_ratio = focal_length / aperture_diameter
+    else:
+        aperture_diameter = 100  # choose d=100mm
+        focal_ratio = (f if f else 10) * focal_reducer  # choose f/10
+        focal_length = aperture_diameter * focal_ratio
+    return _ota(aperture_diameter, focal_length, focal_ratio, focal_reducer, o, t)
+
+
+resolve_ota.cache_info = _resolve_ota.cache_info
+resolve_ota.cache_clear = _resolve_ota.cache_clear
+
+
+def _ota(aperture_diameter, focal_length, focal_ratio, focal_reducer, obstruction_ratio, transmittance_factor):
+    obstruction_diameter = obstruction_ratio * aperture_diameter
+    obstruction_area = math.pi * (obstruction_diameter / 2) ** 2
+    aperture_area = math.pi * (aperture_diameter / 2) ** 2 - obstruction_area
+    resolving_power = 1.22 * 500e-9 * 180 / (aperture_diameter / 1000 * math.pi) * 3600  # for green
+    plate_scale = ARCSEC_PER_RADIAN / (focal_ratio * aperture_diameter)
+    return Ota(aperture_diameter, focal_length, focal_ratio, focal_reducer, obstruction_ratio, obstruction_diameter,
+               obstruction_area, aperture_area, resolving_power, plate_scale, transmittance_factor)
+
+
+@timed('metrics')
+def setup_metrics(ota, h, v, p, q, b):
+    """Combine a resolved OTA with an unbinned camera (all values given) into the absolute metrics of the setup."""
+    h /= b
+    v /= b
+    p *= b
+    arcsec_p = ARCSEC_PER_RADIAN / ota.focal_length * p / 1000
+    view_h = h * arcsec_p
+    view_v = v * arcsec_p
+    view_a = view_h * view_v
+    pixel_etendue = ota.aperture_area * arcsec_p ** 2
+    return Setup(*ota, pixels_h=h, pixels_v=v, pixel_size=p, binning=b, qe=q, sensor_area=h * p * v * p,
+                 arcsec_p=arcsec_p, view_h=view_h, view_v=view_v, view_a=view_a,
+                 extended_object_irradiance=1 / ota.focal_ratio ** 2,
+                 point_object_irradiance=ota.aperture_area / ota.focal_ratio ** 2,
+                 etendue=ota.aperture_area * view_a / 1e6,  # / (57.296**2 * 3600**2)
+                 pixel_etendue=pixel_etendue,
+                 pixel_signal=pixel_etendue * q * ota.transmittance_factor,
+                 object_signal=ota.aperture_area * q * ota.transmittance_factor)
+
+
+@timed('metrics')
+def ratios(setup_a, setup_b):
+    """How many times more setup a has than setup b, for every RATIO_METRICS."""
+    return Ratios(*(getattr(setup_a, metric) / getattr(setup_b, metric) for metric in RATIO_METRICS))
+
+
+def compare(telescope1, camera1=None, telescope2=None, camera2=None):
+    """
+    Compare 2 setups with the same rules as the command line: camera 2 copies camera 1 where not given, and a
+    telescope 2 without aperture diameter and focal length copies telescope 1.
+    Specs are Telescope/Camera tuples, dicts with the same keys, or None.
+    """
+    telescope1 = _spec(Telescope, telescope1)
+    telescope2 = _spec(Telescope, telescope2)
+    camera1 = _spec(Camera, camera1)
+    camera2 = _spec(Camera, camera2)
+    setup1, setup2 = resolve_setups([(telescope1, camera1), (telescope2, camera2)])
+    return Comparison(setup1, setup2, ratios(setup1, setup2), ratios(setup2, setup1),
+                      url_args(telescope1, camera1, telescope2, camera2))
+
+
+def curve(points):
+    """A catalog curve [[nm, factor], ...] as a hashable tuple sorted by wavelength, None stays None."""
+    if points is None:
+        return None
+    try:
+        points = tuple(sorted((float(nm), float(value)) for nm, value in points))
+    except (TypeError, ValueError):
+        raise CompareError('Bad curve {!r}, expected [[wavelength nm, factor], ...]'.format(points))
+    if not points:
+        raise CompareError('Empty curve')
+    return points
+
+
+def interpolate(points, wavelength):
+    """Linear interpolation of a curve(), constant beyond its ends."""
+    i = bisect.bisect_left(points, (wavelength,))
+    if i == 0:
+        return points[0][1]
+    if i == len(points):
+        return points[-1][1]
+    (x0, y0), (x1, y1) = points[i - 1], points[i]
+    return y0 + (y1 - y0) * (wavelength - x0) / (x1 - x0)
+
+
+@functools.lru_cache(maxsize=1024)
+def band_efficiency(qe, t, band):
+    """
+    Mean QE, mean transmittance and mean QE * transmittance over a (start, end) [nm] filter band, integrated on a
+    1nm grid with the trapezoid rule. qe and t are a curve() or a constant factor. Cached per combination.
+    """
+    if not isinstance(qe, tuple) and not isinstance(t, tuple):
+        return qe, t, qe * t
+    start, end = band
+    steps = max(int(math.ceil(end - start)), 1)
+    numpy = _optional_numpy()
+    if numpy is not None:
+        grid = numpy.linspace(start, end, steps + 1)
+        trapezoid = getattr(numpy, 'trapezoid', None) or numpy.trapz  # numpy < 2 only has trapz
+
+        def values(curve):
+            if not isinstance(curve, tuple):
+                return numpy.full(len(grid), float(curve))
+            return numpy.interp(grid, [x for x, _ in curve], [y for _, y in curve])
+
+        qe_values, t_values = values(qe), values(t)
+        return tuple(float(trapezoid(y, dx=1 / steps)) for y in (qe_values, t_values, qe_values * t_values))
+    grid = [start + (end - start) * i / steps for i in range(steps + 1)]
+    qe_values = [interpolate(qe, nm) for nm in grid] if isinstance(qe, tuple) else [qe] * len(grid)
+    t_values = [interpolate(t, nm) for nm in grid] if isinstance(t, tuple) else [t] * len(grid)
+
+    def mean(values):
+        return (sum(values) - (values[0] + values[-1]) / 2) / steps
+
+    return mean(qe_values), mean(t_values), mean([a * b for a, b in zip(qe_values, t_values)])
+
+
+def spectral_bands(setup, telescope=None, camera=None, filters=None, first=None):
+    """
+    Per filter band SpectralBand values of a resolved setup from the band averaged telescope.tc and camera.qc curves,
+    or the constant factors without curves. first is the (telescope, camera) spec of setup 1, whose curves and factors
+    this setup copies like resolve_setups() does.
+    """
+    telescope = _spec(Telescope, telescope)
+    camera = _spec(Camera, camera)
+    tc, qc = telescope.tc, camera.qc
+    if first is not None:
+        telescope1, camera1 = _spec(Telescope, first[0]), _spec(Camera, first[1])
+        if not (telescope.d or telescope.di or telescope.l):
+            tc = telescope1.tc
+        if not (camera.q or camera.qc):
+            qc = camera1.qc
+    bands = collections.OrderedDict()
+    for name, band in (filters if filters else FILTERS).items():
+        qe, t, qe_t = band_efficiency(qc if qc else setup.qe, tc if tc else setup.transmittance_factor, band)
+        wavelength = (band[0] + band[1]) / 2
+        bands[name] = SpectralBand(
+            wavelength=wavelength,
+            resolving_power=1.22 * wavelength * 1e-9 * 180 / (setup.aperture_diameter / 1000 * math.pi) * 3600,
+            qe=qe, transmittance_factor=t, pixel_signal=setup.pixel_etendue * qe_t,
+            object_signal=setup.aperture_area * qe_t)
+    return bands
+
+
+@timed('metrics')
+def exposure_grid(setups, cameras, sky=(SKY_SQM,), target=(22.0,), snr=10, integration=3600, sub=300):
+    """
+    Absolute signal to noise of every resolved setup with its camera spec for every sky and target surface brightness
+    [mag/arcsec²], as EXPOSURE_COLUMNS columns with one row per setup, sky and target (setup counts from 1). Cameras
+    without rn, dc or fw take them from the first camera like compare() does, or from the defaults.
+    """
+    columns = {column: [] for column in EXPOSURE_COLUMNS}
+    cameras = [_spec(Camera, camera) for camera in cameras]
+    camera1 = cameras[0] if cameras else Camera()
+    # electrons/s per pixel is pixel_signal [mm² arcsec²] times the photon rate per mm² per arcsec²
+    sky_rates = [MAG0_PHOTON_RATE / 1e6 * 10 ** (-0.4 * value) for value in sky]
+    target_rates = [MAG0_PHOTON_RATE / 1e6 * 10 ** (-0.4 * value) for value in target]
+    sqrt_integration = math.sqrt(integration)
+    numpy = _optional_numpy()
+    if numpy is not None:
+        return _exposure_grid_numpy(numpy, setups, cameras, camera1, sky, target, sky_rates, target_rates, snr,
+                                    sqrt_integration, sub)
+    for n, (setup, camera) in enumerate(zip(setups, cameras), 1):
+        rn = camera.rn if camera.rn is not None else camera1.rn if camera1.rn is not None else READ_NOISE
+        dc = camera.dc if camera.dc is not None else camera1.dc if camera1.dc is not None else DARK_CURRENT
+        fw = camera.fw if camera.fw else camera1.fw if camera1.fw else FULL_WELL
+        pixels = setup.binning ** 2
+        dark_rate = dc * pixels
+        read_rate = rn ** 2 * pixels / sub
+        full_well = fw * pixels
+        for sky_value, sky_rate in zip(sky, sky_rates):
+            sky_rate *= setup.pixel_signal
+            for target_value, target_rate in zip(target, target_rates):
+                target_rate *= setup.pixel_signal
+                noise_rate = target_rate + sky_rate + dark_rate
+                columns['setup'].append(n)
+                columns['sky'].append(sky_value)
+                columns['target'].append(target_value)
+                columns['target_rate'].append(target_rate)
+                columns['sky_rate'].append(sky_rate)
+                columns['dark_rate'].append(dark_rate)
+                columns['snr'].append(target_rate * sqrt_integration / math.sqrt(noise_rate + read_rate))
+                columns['time'].append(snr ** 2 * (noise_rate + read_rate) / target_rate ** 2)
+                columns['max_sub'].append(full_well / noise_rate)
+    return columns
+
+
+def _exposure_grid_numpy(numpy, setups, cameras, camera1, sky, target, sky_rates, target_rates, snr,
+                         sqrt_integration, sub):
+    """exposure_grid() on (setup, sky, target) arrays."""
+    count = min(len(setups), len(cameras))
+    rn = numpy.array([camera.rn if camera.rn is not None else camera1.rn if camera1.rn is not None else READ_NOISE
+                      for camera in cameras[:count]], dtype=float)
+    dc = numpy.array([camera.dc if camera.dc is not None else camera1.dc if camera1.dc is not None else DARK_CURRENT
+                      for camera in cameras[:count]], dtype=float)
+    fw = numpy.array([camera.fw if camera.fw else camera1.fw if camera1.fw else FULL_WELL
+                      for camera in cameras[:count]], dtype=float)
+    pixels = numpy.array([setup.binning for setup in setups[:count]], dtype=float) ** 2
+    pixel_signal = numpy.array([setup.pixel_signal for setup in setups[:count]], dtype=float)
+    shape = (count, len(sky), len(target))
+    dark_rate = (dc * pixels)[:, None, None]
+    read_rate = (rn ** 2 * pixels / sub)[:, None, None]
+    full_well = (fw * pixels)[:, None, None]
+    sky_rate = (numpy.array(sky_rates, dtype=float) * pixel_signal[:, None])[:, :, None]
+    target_rate = (numpy.array(target_rates, dtype=float) * pixel_signal[:, None])[:, None, :]
+    noise_rate = target_rate + sky_rate + dark_rate
+    columns = {
+        'setup': [n for n in range(1, count + 1) for _ in sky for _ in target],
+        'sky': [value for _ in range(count) for value in sky for _ in target],
+        'target': [value for _ in range(count) for _ in sky for value in target]}
+    for column, values in (('target_rate', target_rate), ('sky_rate', sky_rate), ('dark_rate', dark_rate),
+                           ('snr', target_rate * sqrt_integration / numpy.sqrt(noise_rate + read_rate)),
+                           ('time', snr ** 2 * (noise_rate + read_rate) / target_rate ** 2),
+                           ('max_sub', full_well / noise_rate)):
+        columns[column] = numpy.broadcast_to(values, shape).ravel().tolist()
+    return columns
+
+
+def target_extent(row):
+    """
+    Width (along RA) and height (along Dec) [arcmin] of a target row: width and height [arcmin], or ra_min, ra_max,
+    dec_min and dec_max [degrees] where the RA extent shrinks with the cosine of the mean declination.
+    """
+    width = _row_value(row, 'width', float)
+    height = _row_value(row, 'height', float)
+    if width is None and height is None:
+        ra_min, ra_max, dec_min, dec_max = (_row_value(row, key, float)
+                                            for key in ('ra_min', 'ra_max', 'dec_min', 'dec_max'))
+        if None in (ra_min, ra_max, dec_min, dec_max):
+            raise CompareError('Need width and height, or ra_min, ra_max, dec_min and dec_max')
+        ra_extent = (ra_max - ra_min) % 360  # across RA 0
+        width = ra_extent * math.cos(math.radians((dec_min + dec_max) / 2)) * 60
+        height = abs(dec_max - dec_min) * 60
+    if width is None or height is None or width <= 0 or height <= 0:
+        raise CompareError('Need a positive width and height')
+    return width, height
+
+
+def mosaic_panels(view, extent, overlap):
+    """Panels of view [arcmin] that overlap by the overlap fraction to cover extent [arcmin], at least 1."""
+    if extent <= view:
+        return 1
+    return int(math.ceil((extent - view) / (view * (1 - overlap)) - 1e-9)) + 1
+
+
+@timed('metrics')
+def mosaic(setups, lines, overlap=0.1, integration=3600):
+    """
+    Plan a mosaic for every target line (JSON or CSV like batch(), see target_extent()) with every resolved setup,
+    yielding one MOSAIC_COLUMNS record per target and setup (setup counts from 1), or one with the error of a bad
+    line. The panel grid is the camera as is or rotated by 90 degrees, whichever needs fewer panels.
+    """
+    if not 0 <= overlap < 1:
+        raise CompareError('Overlap {} is not in 0-1'.format(overlap))
+    # the camera FOV per setup [arcmin], hoisted out of the target loop
+    views = [(n, setup.view_h / 60, setup.view_v / 60) for n, setup in enumerate(setups, 1)]
+    targets = _mosaic_targets(lines)
+    numpy = _optional_numpy()
+    if numpy is not None:
+        for block in iter(lambda: list(itertools.islice(targets, MOSAIC_BLOCK)), []):
+            yield from _mosaic_block(numpy, views, block, overlap, integration)
+        return
+    for number, name, width, height, error in targets:
+        if error:
+            yield {'line': number, 'error': error}
+            continue
+        area = width * height
+        for n, view_h, view_v in views:
+            panels_h = mosaic_panels(view_h, width, overlap)
+            panels_v = mosaic_panels(view_v, height, overlap)
+            rotated_h = mosaic_panels(view_v, width, overlap)
+            rotated_v = mosaic_panels(view_h, height, overlap)
+            rotated = rotated_h * rotated_v < panels_h * panels_v
+            if rotated:
+                panels_h, panels_v, view_h, view_v = rotated_h, rotated_v, view_v, view_h
+            panels = panels_h * panels_v
+            mosaic_h = view_h * (panels_h - (panels_h - 1) * overlap)
+            mosaic_v = view_v * (panels_v - (panels_v - 1) * overlap)
+            yield {'line': number, 'target': name, 'setup': n, 'width': width, 'height': height,
+                   'panels_h': panels_h, 'panels_v': panels_v, 'panels': panels, 'rotated': int(rotated),
+                   'coverage': min(area / (mosaic_h * mosaic_v), 1.0), 'time': panels * integration}
+
+
+def _mosaic_targets(lines):
+    """(line number, name, width, height, None) of every target line, or (line number, None, None, None, error)."""
+    for number, row in read_rows(lines):
+        try:
+            if isinstance(row, CompareError):
+                raise row
+            width, height = target_extent(row)
+        except CompareError as e:
+            yield number, None, None, None, str(e)
+            continue
+        yield number, row.get('name', row.get('target')), width, height, None
+
+
+def _mosaic_block(numpy, views, block, overlap, integration):
+    """mosaic() records of a block of _mosaic_targets(), computed as target x setup arrays."""
+    good = [target for target in block if target[4] is None]
+    if good and views:
+        width = numpy.array([target[2] for target in good])[:, None]
+        height = numpy.array([target[3] for target in good])[:, None]
+        view_h = numpy.array([view for _, view, _ in views])[None, :]
+        view_v = numpy.array([view for _, _, view in views])[None, :]
+
+        def panels(view, extent):  # mosaic_panels()
+            return numpy.where(extent <= view, 1, numpy.ceil((extent - view) / (view * (1 - overlap)) - 1e-9) + 1) \
+                .astype(int)
+
+        panels_h, panels_v = panels(view_h, width), panels(view_v, height)
+        rotated_h, rotated_v = panels(view_v, width), panels(view_h, height)
+        rotated = rotated_h * rotated_v < panels_h * panels_v
+        panels_h, panels_v = numpy.where(rotated, rotated_h, panels_h), numpy.where(rotated, rotated_v, panels_v)
+        view_h, view_v = numpy.where(rotated, view_v, view_h), numpy.where(rotated, view_h, view_v)
+        count = panels_h * panels_v
+        coverage = numpy.minimum(width * height / (view_h * (panels_h - (panels_h - 1) * overlap) *
+                                                   (view_v * (panels_v - (panels_v - 1) * overlap))), 1.0)
+        columns = [values.tolist() for values in (panels_h, panels_v, count, rotated.astype(int), coverage)]
+    rows = iter(range(len(good)))
+    for number, name, width, height, error in block:
+        if error:
+            yield {'line': number, 'error': error}
+            continue
+        i = next(rows)
+        for j, (n, _, _) in enumerate(views):
+            panels_h, panels_v, count, rotated, coverage = (column[i][j] for column in columns)
+            yield {'line': number, 'target': name, 'setup': n, 'width': width, 'height': height,
+                   'panels_h': panels_h, 'panels_v': panels_v, 'panels': count, 'rotated': rotated,
+                   'coverage': coverage, 'time': count * integration}
+
+
+@timed('seeing')
+def seeing_histogram(file, column=-1, cache=True):
+    """
+    Counts per SEEING_BIN of the seeing FWHM [arcsec] values in a log file, in the given column of comma or
+    whitespace separated fields (default the last). Lines without a positive number there are skipped. The file is
+    read through mmap and the histogram is cached as JSON in file + '.hist'.
+    """
+    try:
+        stat = os.stat(file)
+    except OSError as e:
+        raise CompareError('Cannot read {}: {}'.format(file, e))
+    key = [SEEING_CACHE_VERSION, os.path.realpath(file), stat.st_mtime_ns, stat.st_size, column, SEEING_BIN,
+           SEEING_MAX]
+    last = int(SEEING_MAX / SEEING_BIN)
+    histogram = read_cache(file + '.hist', key) if cache else None
+    if isinstance(histogram, list) and len(histogram) == last + 1 and \
+            all(type(count) is int and count >= 0 for count in histogram):
+        return histogram
+    histogram = [0] * (last + 1)
+    if stat.st_size:
+        with open(file, 'rb') as log_file, mmap.mmap(log_file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            rest = b''
+            for start in range(0, len(data), SEEING_CHUNK):
+                lines = (rest + data[start:start + SEEING_CHUNK]).split(b'\n')
+                rest = lines.pop()
+                _count_seeing(histogram, lines, column, last)
+            _count_seeing(histogram, [rest], column, last)
+    if cache:
+        write_cache(file + '.hist', key, histogram)
+    return histogram
+
+
+
+def _count_seeing(histogram, lines, column, last):
+    for line in lines:
+        fields = line.split(b',') if b',' in line else line.split()
+        try:
+            value = float(fields[column])
+        except (IndexError, ValueError):
+            continue
+        if value > 0:
+            histogram[min(int(value / SEEING_BIN), last)] += 1
+
+
+def sampling(histogram, arcsec_p, under=SAMPLING[0], over=SAMPLING[1]):
+    """
+    The Sampling of a pixel scale [arcsec/pixel] over a seeing_histogram(): the measurement count, the median FWHM
+    and the fractions that are under-sampled (FWHM < under pixels), well sampled, and over-sampled (FWHM > over
+    pixels). Accurate to a SEEING_BIN.
+    """
+    if not 0 < under <= over:
+        raise CompareError('Bad sampling thresholds {}:{}, expected 0 < under <= over'.format(under, over))
+    count = sum(histogram)
+    if not count:
+        raise CompareError('No seeing measurements')
+    cumulative = list(itertools.accumulate(histogram))
+    median = (bisect.bisect_left(cumulative, count / 2) + 0.5) * SEEING_BIN
+    bins = int(under * arcsec_p / SEEING_BIN)  # bins entirely below the under-sampling FWHM
+    below = cumulative[min(bins, len(cumulative)) - 1] if bins else 0
+    above = count - cumulative[min(int(over * arcsec_p / SEEING_BIN), len(cumulative) - 1)]
+    return Sampling(count, median, below / count, (count - below - above) / count, above / count)
+
+
+def resolve_setups(setups):
+    """
+    Absolute metrics of any number of (telescope, camera) specs. Every setup after the first copies the first one
+    the way telescope 2 and camera 2 do in compare().
+    """
+    setups = [(_spec(Telescope, telescope), _spec(Camera, camera)) for telescope, camera in setups]
+    if not setups:
+        return []
+    telescope1, camera1 = setups[0]
+    ota1 = _resolve_telescope(1, telescope1, camera1)
+    c1_h = camera1.h if camera1.h else 1000  # picked some defaults to work with
+    c1_v = camera1.v if camera1.v else 1000
+    c1_p = camera1.p if camera1.p else 3.8
+    c1_q = camera1.q if camera1.q else 1
+    resolved = [setup_metrics(ota1, c1_h, c1_v, c1_p, c1_q, camera1.b if camera1.b else 1)]
+    for n, (telescope, camera) in enumerate(setups[1:], 2):
+        ota = _setup_ota(n, telescope, camera, ota1)
+        resolved.append(setup_metrics(ota, camera.h if camera.h else c1_h, camera.v if camera.v else c1_v,
+                                      camera.p if camera.p else c1_p, camera.q if camera.q else c1_q,
+                                      camera.b if camera.b else 1))
+    return resolved
+
+
+def _setup_ota(n, telescope, camera, ota1):
+    """The OTA of setup n after the first, which copies ota1 without aperture diameter and focal length."""
+    if telescope.d or telescope.di or telescope.l:
+        return _resolve_telescope(n, telescope, camera)
+    reducer = (telescope.r if telescope.r else 1) * (camera.r if camera.r else 1)
+    if telescope.f:
+        focal_ratio = telescope.f * reducer
+    elif telescope.r:
+        focal_ratio = (ota1.focal_ratio / ota1.focal_reducer) * reducer
+    else:
+        focal_ratio = ota1.focal_ratio
+    return _ota(ota1.aperture_diameter, ota1.aperture_diameter * focal_ratio, focal_ratio, reducer,
+                ota1.obstruction_ratio, ota1.transmittance_factor)
+
+
+def ratio_table(setups, baseline=None):
+    """
+    Ratios between resolved setups: a list with every setup against setups[baseline], or without baseline the full
+    matrix where table[a][b] is setup a against setup b.
+    """
+    if baseline is not None:
+        return [ratios(setup, setups[baseline]) for setup in setups]
+    return [[ratios(setup_a, setup_b) for setup_b in setups] for setup_a in setups]
+
+
+@timed('url')
+def url_args(telescope1, camera1, telescope2, camera2):
+    """Permalink to the web version with the given (not the defaulted) values."""
+    url = 'https://lambermont.dyndns.org/astro/code/compare-telescopes.html?a'
+    for n, telescope, camera in (('1', telescope1, camera1), ('2', telescope2, camera2)):
+        for key in ('d', 'di', 'o', 'l', 'f', 'r', 't'):
+            value = getattr(telescope, key)
+            url += '&{}{}={}'.format(key, n, value) if value else ''
+        for key in ('h', 'v', 'p', 'q', 'b'):
+            value = getattr(camera, key)
+            url += '&c{}{}={}'.format(n, key, value) if value else ''
+    return url
+
+
+@timed('output')
+def flatten(comparison):
+    """One flat dict per comparison: t1_*/t2_* absolute metrics, t1_t2_*/t2_t1_* ratios and the url."""
+    record = {}
+    for prefix, values in (('t1', comparison.setup1), ('t2', comparison.setup2),
+                           ('t1_t2', comparison.ratios12), ('t2_t1', comparison.ratios21)):
+        for key, value in values._asdict().items():
+            record['{}_{}'.format(prefix, key)] = value
+    record['url'] = comparison.url
+    return record
+
+
+def setup_record(n, setup, ratios):
+    """One flat dict of SETUP_COLUMNS for setup n and its Ratios against the baseline."""
+    record = {'setup': n}
+    record.update(setup._asdict())
+    for key, value in ratios._asdict().items():
+        record['ratio_' + key] = value
+    return record
+
+
+RECORD_FIELDS = tuple('{}_{}'.format(prefix, key) for prefix, keys in (
+    ('t1', Setup._fields), ('t2', Setup._fields), ('t1_t2', Ratios._fields), ('t2_t1', Ratios._fields))
+    for key in keys) + ('url',)
+# --setup records: the setup number, its absolute metrics and its ratio_* against the baseline
+SETUP_COLUMNS = ('setup',) + Setup._fields + tuple('ratio_' + key for key in Ratios._fields)
+# --matrix records, one per cell: the cross product labels, or the setup row and column, and the ratio
+MATRIX_COLUMNS = PRODUCT_LABELS + ('ratio',)
+SETUP_MATRIX_COLUMNS = ('setup', 'against', 'ratio')
+STRING_FIELDS = frozenset(('url', 'error', 's1', 's2', 'c1', 'c2', 'scope', 'camera', 'target'))
+OUTPUT_FORMATS = ('jsonl', 'csv', 'npy')
+
+
+def result_record(keys, row, result):
+    """The row values of keys, then the flattened Comparison, or the error of a CompareError."""
+    record = {key: row[key] for key in keys}
+    if isinstance(result, CompareError):
+        record['error'] = str(result)
+    else:
+        record.update(flatten(result))
+    return record
+
+
+@timed('output')
+def encode_record(format, fields, record):
+    """
+    One record as bytes in one of OUTPUT_FORMATS, with exactly the given fields in that order; missing ones become
+    null, an empty CSV value or NaN. npy rows hold only the numeric fields (see RecordWriter).
+    """
+    if format == 'jsonl':
+        return (json.dumps({field: record.get(field) for field in fields}) + '\n').encode()
+    if format == 'csv':
+        return (','.join(_csv_value(record.get(field)) for field in fields) + '\n').encode()
+    if format == 'npy':
+        return struct.pack('<{}d'.format(len(fields)), *(_npy_value(record.get(field)) for field in fields))
+    raise CompareError('{} is an unknown output format'.format(format))
+
+
+def encode_result(format, fields, keys, row, result):
+    """encode_record() of a result_record(), picklable through functools.partial for sweep(convert=...)."""
+    return encode_record(format, fields, result_record(keys, row, result))
+
+
+class RecordWriter():
+    """
+    Streams records with a fixed schema to a binary stream: JSON lines, CSV with a header line, or a NumPy .npy
+    structured float64 array of the numeric fields (STRING_FIELDS are left out). close() patches in the npy shape, so
+    npy needs a seekable stream.
+    """
+    def __init__(self, stream, format, fields, header=True):
+        if format not in OUTPUT_FORMATS:
+            raise CompareError('{} is an unknown output format'.format(format))
+        self.stream = stream
+        self.format = format
+        self.fields = [field for field in fields if field not in STRING_FIELDS] if format == 'npy' else list(fields)
+        self.count = 0
+        if format == 'csv' and header:
+            stream.write((','.join(self.fields) + '\n').encode())
+        elif format == 'npy':
+            if not stream.seekable():
+                raise CompareError('npy output needs a file, not a pipe')
+            self.start = stream.tell()
+            stream.write(self._npy_header())
+
+    def write(self, record):
+        self.write_encoded(encode_record(self.format, self.fields, record))
+
+    def write_encoded(self, data):
+        """Write a record that was already encoded with encode_record(), for example in a sweep() worker."""
+        self.stream.write(data)
+        self.count += 1
+
+    def close(self):
+        if self.format == 'npy':
+            end = self.stream.tell()
+            self.stream.seek(self.start)
+            self.stream.write(self._npy_header())
+            self.stream.seek(end)
+        self.stream.flush()
+
+    def _npy_header(self):
+        descr = [(field, '<f8') for field in self.fields]
+        header = "{{'descr': {!r}, 'fortran_order': False, 'shape': ({},), }}".format(descr, self.count)
+        # room for the final row count, and padded to a multiple of 64 bytes including the 10 byte preamble
+        header += ' ' * (20 - len(str(self.count)))
+        header += ' ' * (63 - (10 + len(header)) % 64) + '\n'
+        return b'\x93NUMPY\x01\x00' + struct.pack('<H', len(header)) + header.encode('latin1')
+
+
+def _csv_value(value):
+    if value is None:
+        return ''
+    text = repr(value) if isinstance(value, float) else str(value)
+    if any(c in text for c in ',"\n\r'):
+        return '"{}"'.format(text.replace('"', '""'))
+    return text
+
+
+def _npy_value(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return math.nan
+
+
+TELESCOPE_KEYS = ('d', 'di', 'l', 'f', 'o', 'r', 't')
+CAMERA_KEYS = ('h', 'v', 'p', 'q', 'b', 'rn', 'dc', 'fw')
+ROW_KEYS = frozenset(['s1', 's2', 'c1', 'c2'] + ['{}{}'.format(key, n) for key in TELESCOPE_KEYS for n in '12'] +
+                     ['c{}{}'.format(n, key) for key in CAMERA_KEYS for n in '12'])
+
+
+def row_specs(gear, row):
+    """
+    Turn a row keyed like the command line options (d1, l1, c1h, s1, c1, ...) into
+    (telescope1, camera1, telescope2, camera2) specs for compare(). Empty values count as not given.
+    """
+    unknown = set(row) - ROW_KEYS
+    if unknown:
+        raise CompareError('Unknown keys {}'.format(', '.join(sorted(str(key) for key in unknown))))
+    specs = []
+    for n in '12':
+        values = {key: _row_value(row, key + n, float) for key in TELESCOPE_KEYS}
+        name = _row_value(row, 's' + n, str)
+        specs.append(gear.telescope_spec(name, r=values['r'], t=values['t']) if name else Telescope(**values))
+        values = {key: _row_value(row, 'c' + n + key, int if key in ('h', 'v') else float) for key in CAMERA_KEYS}
+        name = _row_value(row, 'c' + n, str)
+        specs.append(gear.camera_spec(name, b=values['b'], rn=values['rn'], dc=values['dc'], fw=values['fw']) if name
+                     else Camera(**values))
+    return specs[0], specs[1], specs[2], specs[3]
+
+
+SETUP_KEYS = frozenset(('s', 'c') + TELESCOPE_KEYS + CAMERA_KEYS)
+
+
+def setup_specs(gear, setup):
+    """(telescope, camera) specs of one setup keyed like the options without their number: s, c, d, l, h, p, ..."""
+    unknown = set(setup) - SETUP_KEYS
+    if unknown:
+        raise CompareError('Unknown keys {}'.format(', '.join(sorted(str(key) for key in unknown))))
+    row = {'c1' + key if key in CAMERA_KEYS else key + '1': value for key, value in setup.items()}
+    telescope, camera, _, _ = row_specs(gear, row)
+    return telescope, camera
+
+
+def read_rows(lines):
+    """
+    Yield (line number, row) for JSON lines, or for CSV lines after a header line. A line that does not parse
+    yields a CompareError as row instead of stopping the stream.
+    """
+    lines = enumerate(lines, 1)
+    for number, first in lines:
+        if first.strip():
+            break
+    else:
+        return
+    if first.lstrip().startswith('{'):
+        for number, line in itertools.chain([(number, first)], lines):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError as e:
+                row = CompareError('Bad JSON: {}'.format(e))
+            else:
+                if not isinstance(row, dict):
+                    row = CompareError('Bad JSON: not an object')
+            yield number, row
+    else:
+        header = next(csv.reader([first]))
+        for number, line in lines:
+            if line.strip():
+                values = next(csv.reader([line]))
+                yield number, dict(zip(header, values)) if len(values) == len(header) else \
+                    CompareError('Expected {} CSV fields, got {}'.format(len(header), len(values)))
+
+
+def batch(gear, lines):
+    """Compare one row per input line, yielding (line number, Comparison or CompareError) as it goes."""
+    for number, row in read_rows(lines):
+        if not isinstance(row, CompareError):
+            try:
+                row = compare(*row_specs(gear, row))
+            except CompareError as e:
+                row = e
+            except ArithmeticError as e:  # a zero or huge value the checks let through, keep the stream going
+                row = CompareError('Cannot compare: {}'.format(e))
+        yield number, row
+
+
+def sweep_values(text, limit=None):
+    """
+    Values of one sweep parameter: 'start:stop:step' with stop included, or a comma separated list.
+    '0.6:1.0:0.1' gives [0.6, 0.7, 0.8, 0.9, 1.0], 'RASA8,TEC140' gives ['RASA8', 'TEC140'].
+    A range of more than limit values is a CompareError.
+    """
+    if ':' in text:
+        try:
+            start, stop, step = (float(x) for x in text.split(':'))
+        except ValueError:
+            raise CompareError('Bad range {}, expected start:stop:step'.format(text))
+        if step <= 0 or stop < start:
+            raise CompareError('Bad range {}, expected start <= stop and step > 0'.format(text))
+        count = int(round((stop - start) / step, 10)) + 1
+        if limit is not None and count > limit:
+            raise CompareError('Range {} has {} values, more than {}'.format(text, count, limit))
+        return [round(start + i * step, 10) for i in range(count)]
+    values = []
+    for value in text.split(','):
+        try:
+            values.append(float(value))
+        except ValueError:
+            values.append(value)
+    return values
+
+
+def sweep_rows(base, parameters):
+    """
+    Lazily yield the Cartesian product of the (key, values) parameters, each on top of the base row.
+    Keys are the row keys of row_specs().
+    """
+    unknown = [key for key, _ in parameters if key not in ROW_KEYS]
+    if unknown:
+        raise CompareError('Unknown keys {}'.format(', '.join(unknown)))
+    keys = [key for key, _ in parameters]
+    for values in itertools.product(*(values for _, values in parameters)):
+        row = dict(base)
+        row.update(zip(keys, values))
+        yield row
+
+
+def sweep(rows, file=None, jobs=None, chunk_size=1000, convert=None):
+    """
+    Compare every row, yielding (row, Comparison or CompareError) in input order, over a pool of jobs processes
+    (default: all cores) with their own Gear from file. Rows may come from an endless generator. A picklable
+    convert(row, result) runs in the workers and its return value replaces the result.
+    """
+    jobs = jobs if jobs else os.cpu_count()
+    rows = iter(rows)
+    chunks = iter(lambda: list(itertools.islice(rows, chunk_size)), [])
+    if jobs == 1:
+        global _sweep_gear
+        _sweep_gear = Gear(file)
+        for chunk in chunks:
+            yield from zip(chunk, _compare_rows(chunk, convert))
+        return
+    profile = _profile
+    with concurrent.futures.ProcessPoolExecutor(jobs, initializer=_init_sweep_worker, initargs=(file, bool(profile))) \
+            as executor:
+        pending = collections.deque()
+        for chunk in chunks:
+            pending.append((chunk, executor.submit(_compare_chunk, chunk, convert)))
+            if len(pending) > 2 * jobs:
+                yield from _sweep_results(profile, *pending.popleft())
+        while pending:
+            yield from _sweep_results(profile, *pending.popleft())
+
+
+def _sweep_results(profile, chunk, future):
+    results, stages = future.result()
+    if profile:
+        profile.merge(stages)
+    return zip(chunk, results)
+
+
+_sweep_gear = None
+_sweep_profiled = False
+
+
+def _init_sweep_worker(file, profiled=False):
+    global _sweep_gear, _sweep_profiled, _profile
+    _sweep_profiled = profiled
+    _profile = Profile() if profiled else None  # not the copy of the parent's that fork() gave us
+    _sweep_gear = Gear(file)
+
+
+def _compare_row(gear, row):
+    if not isinstance(row, dict):
+        return CompareError('Expected a row of key values, got {!r}'.format(row))
+    try:
+        return compare(*row_specs(gear, row))
+    except CompareError as e:
+        return e
+    except ArithmeticError as e:  # like batch(), one bad grid point is one error row
+        return CompareError('Cannot compare: {}'.format(e))
+
+
+def _compare_rows(rows, convert=None):
+    results = []
+    for row in rows:
+        result = _compare_row(_sweep_gear, row)
+        results.append(convert(row, result) if convert else result)
+    return results
+
+
+def _compare_chunk(rows, convert=None):
+    """_compare_rows() in a worker process, with the stages of its Profile since the previous chunk."""
+    results = _compare_rows(rows, convert)
+    if not _sweep_profiled:
+        return results, {}
+    stages = _profile.stages
+    _profile.stages = {}
+    return results, stages
+
+
+def _row_value(row, key, cast):
+    value = row.get(key)
+    if value is None or value == '':
+        return None
+    try:
+        result = cast(value)
+    except (TypeError, ValueError, OverflowError):
+        raise CompareError('Bad value for {}: {!r}'.format(key, value))
+    if isinstance(result, float) and not math.isfinite(result):
+        raise CompareError('Bad value for {}: {!r}'.format(key, value))
+    return result
+
+
+def _whole(value):
+    """A number as int when it is whole, like the pixel counts of a catalog, else as float."""
+    number = float(value)
+    return int(number) if number.is_integer() else number
+
+
+def _resolve_telescope(n, telescope, camera):
+    if telescope.o and not 0 <= telescope.o < 1:
+        raise CompareError('Telescope {} obstruction ratio {} is not between 0 and 1'.format(n, telescope.o))
+    try:
+        return resolve_ota(*telescope[:5], r=(telescope.r if telescope.r else 1) * (camera.r if camera.r else 1),
+                           t=telescope.t)
+    except CompareError:
+        raise CompareError('Need ONLY 2 out of 3 of Telescope {} aperture Diameter, Focal length, Focal ratio'.format(n))
+
+
+def _spec(cls, value):
+    if value is None:
+        return cls()
+    if isinstance(value, cls):
+        return value
+    if isinstance(value, dict):
+        try:
+            return cls(**value)
+        except TypeError as e:
+            raise CompareError('Bad {} spec: {}'.format(cls.__name__, e))
+    raise CompareError('Bad {} spec: {!r}'.format(cls.__name__, value))
+
+
+def catalog_columns(entries, fields):
+    """Turn a {name: {field: value}} catalog into a sorted name list and one value list per field."""
+    names = sorted(entries)
+    return names, {field: [entries[name].get(field) for name in names] for field in fields}
+
+
+@timed('metrics')
+def cross_product(scopes, cameras, reducers=(1,), binnings=(1,)):
+    """
+    The metrics of every scope x reducer x camera x binning combination of the scopes and cameras (catalog dicts)
+    in one pass, as equally long columns keyed by PRODUCT_LABELS and PRODUCT_METRICS, in scope-major order. A scope's
+    t field is its transmittance, like the --t1 option.
+    """
+    scope_names, s = catalog_columns(scopes, SCOPE_FIELDS + ('t',))
+    camera_names, c = catalog_columns(cameras, CAMERA_FIELDS)
+    reducers = list(dict.fromkeys(reducers))
+    binnings = list(dict.fromkeys(binnings))
+
+    cam_name = [name for name in camera_names for _ in binnings]
+    cam_b = [b if b else 1 for _ in camera_names for b in binnings]
+    cam_r = [r if r else 1 for r in c['r'] for _ in binnings]
+    cam_h = [(h if h else 1000) / b for h, b in zip([h for h in c['h'] for _ in binnings], cam_b)]
+    cam_v = [(v if v else 1000) / b for v, b in zip([v for v in c['v'] for _ in binnings], cam_b)]
+    cam_p = [(p if p else 3.8) * b for p, b in zip([p for p in c['p'] for _ in binnings], cam_b)]
+    cam_q = [q if q else 1 for q in c['q'] for _ in binnings]
+    cam_a = [h * p * v * p for h, v, p in zip(cam_h, cam_v, cam_p)]
+    cam_rows = list(zip(cam_h, cam_v, cam_p, cam_q, cam_r))
+
+    numpy = _optional_numpy()
+    if numpy is not None:
+        return _cross_product_numpy(numpy, scope_names, s, reducers, cam_name, cam_b, cam_r, cam_h, cam_v, cam_p,
+                                    cam_q, cam_a)
+
+    product = {key: [] for key in PRODUCT_LABELS + PRODUCT_METRICS}
+    for i, scope_name in enumerate(scope_names):
+        spec = [s[field][i] for field in SCOPE_FIELDS]
+        for reducer in reducers:
+            otas = {r: resolve_ota(*spec, r=(reducer if reducer else 1) * r, t=s['t'][i]) for r in set(cam_r)}
+            rows = [otas[r] for r in cam_r]
+            arcsec_p = [ARCSEC_PER_RADIAN / ota.focal_length * p / 1000 for ota, p in zip(rows, cam_p)]
+            view_h = [h * a for h, a in zip(cam_h, arcsec_p)]
+            view_v = [v * a for v, a in zip(cam_v, arcsec_p)]
+            view_a = [h * v for h, v in zip(view_h, view_v)]
+            pixel_etendue = [ota.aperture_area * a ** 2 for ota, a in zip(rows, arcsec_p)]
+
+            product['scope'] += [scope_name] * len(cam_rows)
+            product['reducer'] += [reducer] * len(cam_rows)
+            product['camera'] += cam_name
+            product['binning'] += cam_b
+            product['focal_ratio'] += [ota.focal_ratio for ota in rows]
+            product['focal_length'] += [ota.focal_length for ota in rows]
+            product['aperture_diameter'] += [ota.aperture_diameter for ota in rows]
+            product['obstruction_ratio'] += [ota.obstruction_ratio for ota in rows]
+            product['aperture_area'] += [ota.aperture_area for ota in rows]
+            product['transmittance_factor'] += [ota.transmittance_factor for ota in rows]
+            product['pixels_h'] += cam_h
+            product['pixels_v'] += cam_v
+            product['pixel_size'] += cam_p
+            product['qe'] += cam_q
+            product['sensor_area'] += cam_a
+            product['arcsec_p'] += arcsec_p
+            product['view_h'] += view_h
+            product['view_v'] += view_v
+            product['view_a'] += view_a
+            product['extended_object_irradiance'] += [1 / ota.focal_ratio ** 2 for ota in rows]
+            product['point_object_irradiance'] += [ota.aperture_area / ota.focal_ratio ** 2 for ota in rows]
+            product['etendue'] += [ota.aperture_area * a / 1e6 for ota, a in zip(rows, view_a)]
+            product['pixel_etendue'] += pixel_etendue
+            product['pixel_signal'] += [pe * q * ota.transmittance_factor for pe, q, ota in zip(pixel_etendue, cam_q, rows)]
+            product['object_signal'] += [ota.aperture_area * q * ota.transmittance_factor for q, ota in zip(cam_q, rows)]
+    return product
+
+
+def _cross_product_numpy(numpy, scope_names, s, reducers, cam_name, cam_b, cam_r, cam_h, cam_v, cam_p, cam_q, cam_a):
+    """cross_product() on (scope x reducer, camera x binning) arrays, from its catalog and camera columns."""
+    distinct = sorted(set(cam_r))
+    column = [distinct.index(r) for r in cam_r]
+    rows = []
+    for i in range(len(scope_names)):
+        spec = [s[field][i] for field in SCOPE_FIELDS]
+        for reducer in reducers:
+            rows.append([resolve_ota(*spec, r=(reducer if reducer else 1) * r, t=s['t'][i]) for r in distinct])
+    optics = {field: numpy.array([[getattr(ota, field) for ota in row] for row in rows], dtype=float)
+              .reshape(len(rows), len(distinct))[:, column]
+              for field in ('focal_ratio', 'focal_length', 'aperture_diameter', 'obstruction_ratio', 'aperture_area',
+                            'transmittance_factor')}
+    h, v, p, q = (numpy.array(values, dtype=float) for values in (cam_h, cam_v, cam_p, cam_q))
+    area, ratio, transmittance = optics['aperture_area'], optics['focal_ratio'], optics['transmittance_factor']
+    arcsec_p = ARCSEC_PER_RADIAN / optics['focal_length'] * p / 1000
+    view_h = h * arcsec_p
+    view_v = v * arcsec_p
+    view_a = view_h * view_v
+    pixel_etendue = area * arcsec_p ** 2
+    shape = arcsec_p.shape
+    columns = dict(optics)
+    columns.update(
+        pixels_h=h, pixels_v=v, pixel_size=p, qe=q, sensor_area=numpy.array(cam_a, dtype=float), arcsec_p=arcsec_p,
+        view_h=view_h, view_v=view_v, view_a=view_a, extended_object_irradiance=1 / ratio ** 2,
+        point_object_irradiance=area / ratio ** 2, etendue=area * view_a / 1e6, pixel_etendue=pixel_etendue,
+        pixel_signal=pixel_etendue * q * transmittance, object_signal=area * q * transmittance)
+    product = {
+        'scope': [name for name in scope_names for _ in reducers for _ in cam_name],
+        'reducer': [reducer for _ in scope_names for reducer in reducers for _ in cam_name],
+        'camera': cam_name * len(rows),
+        'binning': cam_b * len(rows)}
+    for key in PRODUCT_METRICS:
+        product[key] = numpy.broadcast_to(columns[key], shape).ravel().tolist()
+    return product
+
+
+@timed('metrics')
+def ratio_matrix(product, baseline, metric):
+    """
+    Return the ratios of one metric of a cross_product() against a baseline (a dict with that metric, for example
+    a single row cross_product()), as one row per scope x reducer with one column per camera x binning.
+    """
+    width = len(product['scope']) // max(len(set(zip(product['scope'], product['reducer']))), 1)
+    reference = baseline[metric][0] if isinstance(baseline[metric], list) else baseline[metric]
+    values = [value / reference for value in product[metric]]
+    return [values[i:i + width] for i in range(0, len(values), width)]
+
+
+@timed('metrics')
+def optimize(gear, constraints=None, metric='pixel_signal', top=10, reducers=(1,), binnings=(1,)):
+    """
+    The top scope x reducer x camera x binning combinations of the gear catalog by one of OPTIMIZE_METRICS, best
+    first, as Optimum tuples. constraints is a {key: (low, high)} dict of SCOPE_QUERY_KEYS, CAMERA_QUERY_KEYS and
+    OPTIMIZE_KEYS. Branches are visited best bound first, so most combinations are never computed.
+    """
+    if metric not in OPTIMIZE_METRICS:
+        raise CompareError('{} can not be optimized, choose from {}'.format(metric, ', '.join(OPTIMIZE_METRICS)))
+    if top < 1:
+        raise CompareError('Need at least the top 1, got {}'.format(top))
+    limits, scopes, cameras = _constraints(gear, constraints)
+    if not scopes or not cameras:
+        return []
+
+    # (pixel size / camera reducer, name, h, v, q, camera reducer), the pixel size key gives the pixel scale at 1mm
+    candidates = []
+    for name in cameras:
+        entry = gear.cameras[name]
+        p = entry.get('p') if entry.get('p') else 3.8
+        r = entry.get('r') if entry.get('r') else 1
+        candidates.append((p / r, name, entry.get('h') if entry.get('h') else 1000,
+                           entry.get('v') if entry.get('v') else 1000, entry.get('q') if entry.get('q') else 1, r))
+    candidates.sort()
+    keys = [candidate[0] for candidate in candidates]
+    widest = max(key * h for key, _, h, _, _, _ in candidates)
+    tallest = max(key * v for key, _, _, v, _, _ in candidates)
+    best_q = max(q for _, _, _, _, q, _ in candidates)
+
+    def inside(value, bounds):
+        return (bounds[0] is None or value >= bounds[0]) and (bounds[1] is None or value <= bounds[1])
+
+    res_low, res_high = limits['res']
+    branches = []
+    for scope_name in scopes:
+        spec = [gear.scopes[scope_name].get(field) for field in SCOPE_FIELDS]
+        for reducer in dict.fromkeys(reducers):
+            try:
+                ota = resolve_ota(*spec, r=reducer, t=gear.scopes[scope_name].get('t'))
+            except CompareError:
+                continue
+            if not inside(ota.focal_length, limits['focal_length']) or \
+                    not inside(ota.focal_ratio, limits['focal_ratio']):
+                continue
+            scale = ARCSEC_PER_RADIAN / ota.focal_length / 1000  # arcsec per μm of pixel
+            if limits['fovh'][0] is not None and widest * scale / 60 < limits['fovh'][0] or \
+                    limits['fovv'][0] is not None and tallest * scale / 60 < limits['fovv'][0]:
+                continue
+            for b in dict.fromkeys(binnings):
+                start = 0 if res_low is None else bisect.bisect_left(keys, res_low / (b * scale))
+                end = len(keys) if res_high is None else bisect.bisect_right(keys, res_high / (b * scale))
+                if start == end:
+                    continue
+                arcsec_p = keys[end - 1] * b * scale
+                if metric == 'pixel_etendue':
+                    bound = ota.aperture_area * arcsec_p ** 2
+                elif metric == 'pixel_signal':
+                    bound = ota.aperture_area * arcsec_p ** 2 * best_q * ota.transmittance_factor
+                elif metric == 'etendue':
+                    bound = ota.aperture_area * widest * tallest * scale ** 2 / 1e6
+                else:
+                    bound = ota.aperture_area * best_q * ota.transmittance_factor
+                branches.append((-bound, scope_name, reducer, b, start, end, ota, scale))
+    branches.sort(key=lambda branch: branch[0])
+
+    best = []  # heap of (value, order, scope, reducer, camera, binning) with the worst of the top first
+    for order, (bound, scope_name, reducer, b, start, end, ota, scale) in enumerate(branches):
+        if len(best) == top and -bound <= best[0][0]:
+            break
+        for key, camera_name, h, v, q, _ in candidates[start:end]:
+            arcsec_p = key * b * scale
+            view_h = h * key * scale
+            view_v = v * key * scale
+            if not inside(view_h / 60, limits['fovh']) or not inside(view_v / 60, limits['fovv']):
+                continue
+            if metric == 'pixel_etendue':
+                value = ota.aperture_area * arcsec_p ** 2
+            elif metric == 'pixel_signal':
+                value = ota.aperture_area * arcsec_p ** 2 * q * ota.transmittance_factor
+            elif metric == 'etendue':
+                value = ota.aperture_area * view_h * view_v / 1e6
+            else:
+                value = ota.aperture_area * q * ota.transmittance_factor
+            item = (value, -order, scope_name, reducer, camera_name, b)
+            if len(best) < top:
+                heapq.heappush(best, item)
+            elif item > best[0]:
+                heapq.heapreplace(best, item)
+
+    return [_optimum(gear, scope_name, reducer, camera_name, b)
+            for _, _, scope_name, reducer, camera_name, b in sorted(best, reverse=True)]
+
+
+def _constraints(gear, constraints):
+    """Split optimize() constraints into the OPTIMIZE_KEYS limits and the scope and camera names within the rest."""
+    constraints = dict(constraints or {})
+    unknown = [key for key in constraints
+               if key not in OPTIMIZE_KEYS and key not in SCOPE_QUERY_KEYS and key not in CAMERA_QUERY_KEYS]
+    if unknown:
+        raise CompareError('Unknown constraints {}'.format(', '.join(unknown)))
+    limits = {key: constraints.pop(key, (None, None)) for key in OPTIMIZE_KEYS}
+    scopes = gear.query_scopes(**{key: bounds for key, bounds in constraints.items() if key in SCOPE_QUERY_KEYS})
+    cameras = gear.query_cameras(**{key: bounds for key, bounds in constraints.items() if key in CAMERA_QUERY_KEYS})
+    return limits, scopes, cameras
+
+
+def _optimum(gear, scope_name, reducer, camera_name, b):
+    camera = gear.cameras[camera_name]
+    ota = resolve_ota(*(gear.scopes[scope_name].get(field) for field in SCOPE_FIELDS),
+                      r=reducer * (camera.get('r') if camera.get('r') else 1), t=gear.scopes[scope_name].get('t'))
+    return Optimum(scope_name, reducer, camera_name, b, setup_metrics(
+        ota, camera.get('h') if camera.get('h') else 1000, camera.get('v') if camera.get('v') else 1000,
+        camera.get('p') if camera.get('p') else 3.8, camera.get('q') if camera.get('q') else 1, b))
+
+
+def skyline(points, block=PARETO_BLOCK):
+    """
+    The row indexes of the non-dominated rows of a 2d array, smaller is better in every column, by a sort-filter
+    skyline in vectorized block x block dominance checks. Equal rows are all kept or all dropped. Needs numpy.
+    """
+    numpy = _numpy()
+    points = numpy.asarray(points, dtype=float)
+    if not len(points):
+        return numpy.zeros(0, dtype=int)
+    points, inverse = numpy.unique(points, axis=0, return_inverse=True)
+    low, high = points.min(axis=0), points.max(axis=0)
+    score = ((points - low) / numpy.where(high > low, high - low, 1)).sum(axis=1)
+    order = numpy.lexsort(tuple(points.T[::-1]) + (score,))
+    frontier = points[:0]
+    kept = []
+    for start in range(0, len(order), block):
+        index = order[start:start + block]
+        rows = points[index]
+        for first in range(0, len(frontier), block):
+            rows, index = _undominated(numpy, frontier[first:first + block], rows, index)
+        rows, index = _undominated(numpy, rows, rows, index, itself=True)
+        frontier = numpy.concatenate((frontier, rows))
+        kept.append(index)
+    unique = numpy.zeros(len(points), dtype=bool)
+    unique[numpy.concatenate(kept)] = True
+    return numpy.flatnonzero(unique[inverse.reshape(-1)])
+
+
+def _undominated(numpy, by, rows, index, itself=False):
+    """The distinct rows and their index that no other row of by is at least as small as everywhere."""
+    dominated = by[:, None, 0] <= rows[None, :, 0]
+    for column in range(1, rows.shape[1]):
+        dominated &= by[:, None, column] <= rows[None, :, column]
+    if itself:
+        numpy.fill_diagonal(dominated, False)
+    alive = ~dominated.any(axis=0)
+    return rows[alive], index[alive]
+
+
+@timed('metrics')
+def pareto(gear, constraints=None, objectives=PARETO_OBJECTIVES[:4], target=1.0, reducers=(1,), binnings=(1,),
+           jobs=None, chunk=PARETO_CHUNK):
+    """
+    The combinations of the gear catalog that no other one beats or equals on every one of the PARETO_OBJECTIVES, as
+    Optimum tuples by pixel_signal, best first. target is the wanted res ["/pixel], constraints are like optimize(), and
+    chunks of the combinations are reduced over jobs processes (default: all cores). Needs numpy.
+    """
+    numpy = _numpy()
+    unknown = [objective for objective in objectives if objective not in PARETO_OBJECTIVES]
+    if unknown or not objectives:
+        raise CompareError('Unknown objectives {}, choose from {}'.format(', '.join(unknown) or 'none',
+                                                                        ', '.join(PARETO_OBJECTIVES)))
+    limits, scopes, cameras = _constraints(gear, constraints)
+    reducers = list(dict.fromkeys(reducers))
+    binnings = list(dict.fromkeys(binnings))
+    if not scopes or not cameras:
+        return []
+    jobs = jobs if jobs else os.cpu_count()
+
+    entries = [gear.cameras[name] for name in cameras]
+    camera_reducers = [entry.get('r') if entry.get('r') else 1 for entry in entries]
+    distinct = sorted(set(camera_reducers))
+    columns = {
+        'h': numpy.array([entry.get('h') if entry.get('h') else 1000 for entry in entries], dtype=float),
+        'v': numpy.array([entry.get('v') if entry.get('v') else 1000 for entry in entries], dtype=float),
+        'p': numpy.array([entry.get('p') if entry.get('p') else 3.8 for entry in entries], dtype=float),
+        'q': numpy.array([entry.get('q') if entry.get('q') else 1 for entry in entries], dtype=float),
+        'price': numpy.array([entry.get('price', math.nan) for entry in entries], dtype=float),
+        'r': numpy.array([distinct.index(r) for r in camera_reducers]),
+        'b': numpy.array(binnings, dtype=float)}
+    # scope x reducer x distinct camera reducer optics, nan where the scope can not be resolved
+    fields = ('focal_length', 'focal_ratio', 'aperture_area', 'aperture_diameter', 'transmittance_factor')
+    optics = {field: numpy.full((len(scopes), len(reducers), len(distinct)), math.nan) for field in fields}
+    for i, scope_name in enumerate(scopes):
+        spec = [gear.scopes[scope_name].get(field) for field in SCOPE_FIELDS]
+        for j, reducer in enumerate(reducers):
+            for k, r in enumerate(distinct):
+                try:
+                    ota = resolve_ota(*spec, r=reducer * r, t=gear.scopes[scope_name].get('t'))
+                except CompareError:
+                    continue
+                for field in fields:
+                    optics[field][i, j, k] = getattr(ota, field)
+    prices = numpy.array([gear.scopes[name].get('price', math.nan) for name in scopes], dtype=float)
+
+    step = max(1, chunk // (len(reducers) * len(cameras) * len(binnings)))
+    work = [({field: optics[field][start:start + step] for field in fields}, prices[start:start + step], start)
+            for start in range(0, len(scopes), step)]
+    evaluate = functools.partial(_pareto_chunk, columns, tuple(objectives), target, limits)
+    if jobs == 1 or len(work) == 1:
+        parts = list(map(evaluate, work))
+    else:
+        with concurrent.futures.ProcessPoolExecutor(min(jobs, len(work))) as executor:
+            parts = list(executor.map(evaluate, work))
+    indexes = numpy.concatenate([part[1] for part in parts])
+    if len(parts) > 1:
+        indexes = indexes[skyline(numpy.concatenate([part[0] for part in parts]))]
+    frontier = [_optimum(gear, scopes[i], reducers[j], cameras[k], binnings[b]) for i, j, k, b in indexes.tolist()]
+    frontier.sort(key=lambda optimum: -optimum.setup.pixel_signal)
+    return frontier
+
+
+def _pareto_chunk(columns, objectives, target, limits, work):
+    """
+    The skyline() of the combinations of a chunk of scopes within the limits, as (objective values, (scope,
+    reducer, camera, binning) indexes).
+    """
+    numpy = _numpy()
+    optics, prices, start = work
+    b = columns['b']
+    focal_length, focal_ratio, aperture_area, aperture_diameter, transmittance_factor = (
+        optics[field][:, :, columns['r'], None] for field in (
+            'focal_length', 'focal_ratio', 'aperture_area', 'aperture_diameter', 'transmittance_factor'))
+    arcsec_p = ARCSEC_PER_RADIAN / focal_length * (columns['p'][:, None] * b) / 1000
+    view_h = columns['h'][:, None] / b * arcsec_p
+    view_v = columns['v'][:, None] / b * arcsec_p
+    metrics = {
+        'ps': -(aperture_area * arcsec_p ** 2 * columns['q'][:, None] * transmittance_factor),
+        'fov': -(view_h * view_v),
+        'res': numpy.abs(arcsec_p - target),
+        'aperture': aperture_diameter,
+        'price': prices[:, None, None, None] + columns['price'][:, None]}
+    shape = arcsec_p.shape
+    inside = numpy.ones(shape, dtype=bool)
+    for values, key in ((focal_length, 'focal_length'), (focal_ratio, 'focal_ratio'), (arcsec_p, 'res'),
+                        (view_h / 60, 'fovh'), (view_v / 60, 'fovv')):
+        low, high = limits[key]
+        if low is not None:
+            inside &= values >= low
+        if high is not None:
+            inside &= values <= high
+    values = numpy.stack([numpy.broadcast_to(metrics[objective], shape) for objective in objectives], axis=-1)
+    inside &= numpy.isfinite(values).all(axis=-1)
+    values = values[inside]
+    indexes = numpy.argwhere(inside)
+    indexes[:, 0] += start
+    keep = skyline(values)
+    return values[keep], indexes[keep]
+
+
+def _numpy():
+    try:
+        import numpy
+    except ImportError:
+        raise CompareError('Needs numpy, pip install numpy')
+    return numpy
+
+
+def _optional_numpy():
+    """numpy, or None when it is not installed and the caller has a pure Python path."""
+    try:
+        import numpy
+    except ImportError:
+        return None
+    return numpy
+
+
+def _bessel_j1(numpy, x):
+    """Bessel function J1 of an array, after the rational approximations of Numerical Recipes (bessj1)."""
+    ax = numpy.abs(x)
+    small = numpy.minimum(ax, 8.0)
+    y = small * small
+    near = small * (72362614232.0 + y * (-7895059235.0 + y * (242396853.1 + y * (-2972611.439 + y * (
+        15704.48260 + y * -30.16036606))))) / (144725228442.0 + y * (2300535178.0 + y * (18583304.74 + y * (
+            99447.43394 + y * (376.9991397 + y)))))
+    large = numpy.maximum(ax, 8.0)
+    z = 8.0 / large
+    y = z * z
+    xx = large - 2.356194491
+    p = 1.0 + y * (0.183105e-2 + y * (-0.3516396496e-4 + y * (0.2457520174e-5 + y * -0.240337019e-6)))
+    q = 0.04687499995 + y * (-0.2002690873e-3 + y * (0.8449199096e-5 + y * (-0.88228987e-6 + y * 0.105787412e-6)))
+    far = numpy.sqrt(0.636619772 / large) * (numpy.cos(xx) * p - z * numpy.sin(xx) * q) * numpy.sign(x)
+    return numpy.where(ax < 8.0, near, far)
+
+
+def psf_stamps(setup, fwhm=0.0):
+    """
+    The point spread function of a resolved setup as an array [k, k, size, size] of pixel stamps normalized to 1,
+    its center shifted by (i/k, j/k) pixels: the obstructed aperture's diffraction at WAVELENGTH, blurred by Gaussian
+    seeing of fwhm [arcsec].
+    """
+    numpy = _numpy()
+    airy = 1.22 * WAVELENGTH / setup.aperture_diameter * ARCSEC_PER_RADIAN  # first dark ring [arcsec]
+    radius = min(int(math.ceil(max(3 * fwhm, 6 * airy) / setup.arcsec_p)) + 1, 64)  # [pixels]
+    k = min(max(5, int(math.ceil(3 * setup.arcsec_p / airy))), 32)  # samples per pixel per axis
+    step = setup.arcsec_p / k
+    n = (2 * radius + 2) * k
+    offsets = (numpy.arange(n) - n / 2 + 0.5) * step
+    theta = numpy.hypot(*numpy.meshgrid(offsets, offsets)) / ARCSEC_PER_RADIAN
+    x = numpy.maximum(math.pi * setup.aperture_diameter / WAVELENGTH * theta, 1e-12)
+    e = setup.obstruction_ratio
+    amplitude = 2 * _bessel_j1(numpy, x) / x
+    if e:
+        amplitude -= e * e * 2 * _bessel_j1(numpy, e * x) / (e * x)
+    image = amplitude ** 2
+    if fwhm:
+        sigma = fwhm / (2 * math.sqrt(2 * math.log(2)))
+        seeing = numpy.exp(-(offsets[:, None] ** 2 + offsets[None, :] ** 2) / (2 * sigma ** 2))
+        image = numpy.fft.irfft2(numpy.fft.rfft2(image) * numpy.fft.rfft2(numpy.fft.ifftshift(seeing)), image.shape)
+        image = numpy.maximum(image, 0)
+    size = 2 * radius + 1
+    stamps = numpy.empty((k, k, size, size))
+    for i in range(k):
+        for j in range(k):
+            cut = image[i:i + size * k, j:j + size * k].reshape(size, k, size, k).sum(axis=(1, 3))
+            stamps[i, j] = cut / cut.sum()
+    return stamps
+
+
+@timed('simulate')
+def simulate(setups, cameras, stars=1000, magnitude=STAR_MAGNITUDE, sky=SKY_SQM, exposure=300, fwhm=0.0,
+             tile=SIMULATION_TILE, jobs=None, seed=1):
+    """
+    Render a synthetic star field of exposure seconds with every resolved setup and its camera spec, in tiles over
+    jobs processes (default: all cores), and return one SIMULATION_COLUMNS dict per setup (setup counts from 1) with
+    the measured and predicted e-/s of isolated stars, sky pixels and star peaks. Needs numpy.
+    """
+    numpy = _numpy()
+    jobs = jobs if jobs else os.cpu_count()
+    cameras = [_spec(Camera, camera) for camera in cameras]
+    camera1 = cameras[0] if cameras else Camera()
+    results = []
+    for n, (setup, camera) in enumerate(zip(setups, cameras), 1):
+        rn = camera.rn if camera.rn is not None else camera1.rn if camera1.rn is not None else READ_NOISE
+        star_rate = MAG0_PHOTON_RATE / 1e6 * 10 ** (-0.4 * magnitude) * setup.object_signal
+        pixel_rate = MAG0_PHOTON_RATE / 1e6 * 10 ** (-0.4 * sky) * setup.pixel_signal
+        peak_rate = min(star_rate * setup.aperture_area / (WAVELENGTH * setup.focal_length) ** 2 *
+                        (setup.pixel_size / 1000) ** 2, star_rate)
+        stamps = psf_stamps(setup, fwhm)
+        k, _, size, _ = stamps.shape
+        radius = size // 2
+        width, height = int(setup.pixels_h), int(setup.pixels_v)
+        rng = numpy.random.default_rng([seed, n])
+        positions = numpy.column_stack((rng.integers(0, width, stars), rng.integers(0, height, stars),
+                                        rng.integers(0, k, stars), rng.integers(0, k, stars)))
+        positions = positions.tolist()
+        cells = {}  # stars per stamp sized cell, to find the ones whose stamp overlaps another star's
+        for x, y, _, _ in positions:
+            cells.setdefault((x // size, y // size), []).append((x, y))
+        tiles = {}
+        for x, y, i, j in positions:
+            isolated = sum(abs(x - u) < size and abs(y - v) < size
+                           for cx in (x // size - 1, x // size, x // size + 1)
+                           for cy in (y // size - 1, y // size, y // size + 1)
+                           for u, v in cells.get((cx, cy), ())) == 1
+            for ty in range(max(y - radius, 0) // tile, min(y + radius, height - 1) // tile + 1):
+                for tx in range(max(x - radius, 0) // tile, min(x + radius, width - 1) // tile + 1):
+                    tiles.setdefault((tx, ty), []).append((x, y, i, j, isolated))
+        work = [(tx * tile, ty * tile, min(tile, width - tx * tile), min(tile, height - ty * tile),
+                 tiles.get((tx, ty), []), [seed, n, tx, ty])
+                for ty in range(-(-height // tile)) for tx in range(-(-width // tile))]
+        render = functools.partial(_render_tile, stamps, star_rate * exposure, pixel_rate * exposure,
+                                   rn * setup.binning)
+        if jobs == 1:
+            parts = list(map(render, work))
+        else:
+            with concurrent.futures.ProcessPoolExecutor(jobs) as executor:
+                parts = list(executor.map(render, work))
+        background, count, fluxes, peaks = 0.0, 0, [], []
+        for part in parts:
+            background += part[0]
+            count += part[1]
+            fluxes += part[2]
+            peaks += part[3]
+        results.append({'setup': n, 'stars': len(fluxes),
+                        'star_rate': sum(fluxes) / len(fluxes) / exposure if fluxes else math.nan,
+                        'pixel_rate': background / count / exposure if count else math.nan,
+                        'peak_rate': sum(peaks) / len(peaks) / exposure if peaks else math.nan,
+                        'predicted_star_rate': star_rate, 'predicted_pixel_rate': pixel_rate,
+                        'predicted_peak_rate': peak_rate})
+    return results
+
+
+def _render_tile(stamps, star_electrons, sky_electrons, read_noise, work):
+    """
+    Render one tile and measure it: the sum and count of the pixels outside the star stamps, and the background
+    subtracted flux and peak of the isolated stars whose stamp lies inside the tile.
+    """
+    numpy = _numpy()
+    x0, y0, width, height, stars, seed = work
+    size = stamps.shape[2]
+    radius = size // 2
+    rng = numpy.random.default_rng(seed)
+    expected = numpy.full((height, width), sky_electrons)
+    sky = numpy.ones((height, width), dtype=bool)
+    inside = []
+    for x, y, i, j, isolated in stars:
+        left, top = x - radius - x0, y - radius - y0
+        a, b = max(top, 0), min(top + size, height)
+        c, d = max(left, 0), min(left + size, width)
+        expected[a:b, c:d] += star_electrons * stamps[i, j, a - top:b - top, c - left:d - left]
+        sky[a:b, c:d] = False
+        if isolated and top >= 0 and left >= 0 and top + size <= height and left + size <= width:
+            inside.append((top, left))
+    frame = rng.poisson(expected).astype(float)
+    del expected
+    frame += rng.normal(0, read_noise, frame.shape)
+    background_sum = float(frame[sky].sum())
+    background_count = int(sky.sum())
+    background = background_sum / background_count if background_count else sky_electrons
+    fluxes = []
+    peaks = []
+    for top, left in inside:
+        stamp = frame[top:top + size, left:left + size]
+        fluxes.append(float(stamp.sum()) - background * size * size)
+        peaks.append(float(stamp.max()) - background)
+    return background_sum, background_count, fluxes, peaks
+
+
+@timed('metrics')
+def monte_carlo(setups, specs, uncertainties, samples=100000, baseline=0, confidence=0.95, seed=1):
+    """
+    Propagate spec uncertainties, one {UNCERTAIN_KEYS key: (standard deviation, group)} dict per setup, to the ratios
+    against setups[baseline]; equal key and group share draws, and fields copied from setup 1 reuse its samples.
+    Returns one UNCERTAINTY_COLUMNS dict per other setup (counting from 1) and UNCERTAINTY_METRICS. Needs numpy.
+    """
+    numpy = _numpy()
+    if not 0 < confidence < 1:
+        raise CompareError('Confidence {} is not in 0-1'.format(confidence))
+    if samples < 1:
+        raise CompareError('Need at least 1 sample, got {}'.format(samples))
+    rng = numpy.random.default_rng(seed)
+    draws = {}
+
+    def vary(value, uncertain, key, scale=1.0):
+        if key not in uncertain:
+            return value
+        sd, group = uncertain[key]
+        if (key, group) not in draws:
+            draws[key, group] = rng.standard_normal(samples)
+        return value + draws[key, group] * sd * scale
+
+    metrics = []
+    first = {}  # the samples of setup 1, for the fields that the other setups copy from it
+    for n, (setup, (telescope, camera), uncertain) in enumerate(zip(setups, specs, uncertainties), 1):
+        telescope = _spec(Telescope, telescope)
+        camera = _spec(Camera, camera)
+        unknown = [key for key in uncertain if key not in UNCERTAIN_KEYS]
+        if unknown:
+            raise CompareError('Unknown uncertainties {}'.format(', '.join(unknown)))
+        reducer = setup.focal_reducer
+        copies = set()  # the fields this setup copies from setup 1, like resolve_setups() does
+        if n > 1:
+            if not (telescope.d or telescope.di or telescope.l):
+                copies.update(('d', 'di', 'l', 'o', 't') if telescope.f else ('d', 'di', 'l', 'f', 'o', 't'))
+            copies.update(key for key in ('p', 'q') if not getattr(camera, key))
+        fixed = [key for key in uncertain if key in copies]
+        if fixed:
+            raise CompareError('Setup {} copies {} from setup 1, give the uncertainty there'.format(
+                n, ', '.join(fixed)))
+        if 'd' in copies:
+            d, o, t = first['d'], first['o'], first['t']
+            if telescope.f:
+                f = numpy.maximum(vary(setup.focal_ratio, uncertain, 'f', reducer), 1e-9)
+            else:
+                f = first['f'] * setup.focal_ratio / setups[0].focal_ratio
+            l = f * d
+        else:
+            # 2 of aperture, focal length and focal ratio are given (or defaults), the third follows from them
+            derived = 'd' if telescope.l and telescope.f and not (telescope.d or telescope.di) else \
+                'f' if telescope.l else 'l'
+            given = [key for key in uncertain if key == derived or derived == 'd' and key == 'di']
+            if given:
+                raise CompareError('Setup {} {} follows from its other specs and can not vary'.format(n, given[0]))
+            if derived != 'd':
+                d = numpy.maximum(vary(vary(setup.aperture_diameter, uncertain, 'd'), uncertain, 'di', 25.4), 1e-9)
+            if derived != 'l':
+                l = numpy.maximum(vary(setup.focal_length, uncertain, 'l', reducer), 1e-9)
+            if derived != 'f':
+                f = numpy.maximum(vary(setup.focal_ratio, uncertain, 'f', reducer), 1e-9)
+            if derived == 'd':
+                d = l / f
+            elif derived == 'f':
+                f = l / d
+            else:
+                l = f * d
+            o = numpy.clip(vary(setup.obstruction_ratio, uncertain, 'o'), 0, 1)
+            t = numpy.clip(vary(setup.transmittance_factor, uncertain, 't'), 0, 1)
+        if 'p' in copies:
+            p = first['p'] * setup.pixel_size / setups[0].pixel_size  # setup 1 pixels at this binning
+        else:
+            p = numpy.maximum(vary(setup.pixel_size, uncertain, 'p', setup.binning), 0)
+        q = first['q'] if 'q' in copies else numpy.clip(vary(setup.qe, uncertain, 'q'), 0, 1)
+        if n == 1:
+            first = {'d': d, 'f': f, 'o': o, 't': t, 'p': p, 'q': q}
+        area = math.pi * (d / 2) ** 2 * (1 - o ** 2)
+        arcsec_p = ARCSEC_PER_RADIAN / l * p / 1000
+        pixel_etendue = area * arcsec_p ** 2
+        metrics.append({'extended_object_irradiance': 1 / f ** 2, 'point_object_irradiance': area / f ** 2,
+                        'etendue': area * setup.pixels_h * setup.pixels_v * arcsec_p ** 2 / 1e6,
+                        'pixel_etendue': pixel_etendue, 'pixel_signal': pixel_etendue * q * t,
+                        'object_signal': area * q * t})
+    tail = (1 - confidence) / 2
+    results = []
+    for n, (setup, values) in enumerate(zip(setups, metrics), 1):
+        if n - 1 == baseline:
+            continue
+        for metric in UNCERTAINTY_METRICS:
+            ratio = numpy.broadcast_to(values[metric] / metrics[baseline][metric], (samples,))
+            low, median, high = numpy.quantile(ratio, (tail, 0.5, 1 - tail))
+            results.append({'setup': n, 'metric': metric,
+                            'nominal': getattr(setup, metric) / getattr(setups[baseline], metric),
+                            'median': float(median), 'low': float(low), 'high': float(high),
+                            'above': float(numpy.count_nonzero(ratio > 1)) / samples})
+    return results
+
+
+class Graph():
+    """
+    Lazily evaluated values with dirty tracking. Inputs are set(), nodes are functions of other values that are only
+    recomputed when they are read after a value they depend on changed, and a recomputed node that comes out the same
+    stops the change from spreading any further. changes() tells which values changed since its previous call.
+    """
+    def __init__(self):
+        self._nodes = {}  # name: (function, dependencies)
+        self._dependents = collections.defaultdict(list)
+        self._values = {}
+        self._stale = set()
+        self._changed = {}  # name: stamp of its last change
+        self._computed = {}  # name: stamp of its last computation
+        self._stamp = 0
+        self._log = collections.OrderedDict()  # name: (old, new) since changes()
+        self.evaluations = 0
+
+    def node(self, name, function, *dependencies):
+        self._nodes[name] = (function, dependencies)
+        for dependency in dependencies:
+            self._dependents[dependency].append(name)
+
+    def set(self, name, value):
+        if name in self._values and self._values[name] == value:
+            return
+        self._stamp += 1
+        self._record(name, value)
+        pending = list(self._dependents[name])
+        while pending:
+            dependent = pending.pop()
+            if dependent not in self._stale:
+                self._stale.add(dependent)
+                pending.extend(self._dependents[dependent])
+
+    def get(self, name):
+        if name in self._nodes and (name not in self._values or name in self._stale):
+            function, dependencies = self._nodes[name]
+            values = [self.get(dependency) for dependency in dependencies]
+            if name not in self._values or any(self._changed[dependency] > self._computed[name]
+                                               for dependency in dependencies):
+                value = function(*values)
+                self.evaluations += 1
+                self._computed[name] = self._stamp
+                if name not in self._values or self._values[name] != value:
+                    self._record(name, value)
+            self._stale.discard(name)
+        return self._values[name]
+
+    def __contains__(self, name):
+        return name in self._nodes or name in self._values
+
+    def changes(self):
+        """[(name, old, new)] of every value that changed since the previous call, old is None for new values."""
+        changes = [(name, old, new) for name, (old, new) in self._log.items() if old != new]
+        self._log.clear()
+        return changes
+
+    def _record(self, name, value):
+        old = self._log[name][0] if name in self._log else self._values.get(name)
+        self._log[name] = (old, value)
+        self._values[name] = value
+        self._changed[name] = self._stamp
+
+
+class WhatIf():
+    """
+    Any number of setups for what-if sessions: set(setup, key, value) changes one spec field, and only the Graph
+    nodes that depend on it ('<setup>.<field>' and '<setup>/<other>.<metric>') are recomputed when read. Setups count
+    from 1 and copy the first one like resolve_setups() does.
+    """
+    def __init__(self, specs):
+        self.graph = Graph()
+        self.count = len(specs)
+        for n, (telescope, camera) in enumerate(specs, 1):
+            telescope = _spec(Telescope, telescope)
+            camera = _spec(Camera, camera)
+            for key in WHAT_IF_TELESCOPE_KEYS:
+                self.graph.set('{}.{}'.format(n, key), getattr(telescope, key))
+            for key in WHAT_IF_CAMERA_KEYS:
+                self.graph.set('{}.{}'.format(n, key), camera.r if key == 'cr' else getattr(camera, key))
+            self._setup_nodes(n)
+        self.graph.changes()
+
+    def _setup_nodes(self, n):
+        def name(field, setup=n):
+            return '{}.{}'.format(setup, field)
+
+        node = self.graph.node
+        inputs = [name(key) for key in WHAT_IF_TELESCOPE_KEYS + ('cr',)]
+
+        def ota(d, di, l, f, o, r, t, cr, ota1=None):
+            telescope, camera = Telescope(d=d, di=di, l=l, f=f, o=o, r=r, t=t), Camera(r=cr)
+            return _resolve_telescope(n, telescope, camera) if ota1 is None else \
+                _setup_ota(n, telescope, camera, ota1)
+
+        node(name('ota'), ota, *(inputs + ([name('ota', 1)] if n > 1 else [])))
+        for field in Ota._fields:
+            node(name(field), operator.attrgetter(field), name('ota'))
+        for key, default in (('h', 1000), ('v', 1000), ('p', 3.8), ('q', 1)):  # like resolve_setups()
+            if n == 1:
+                node(name('camera_' + key), lambda value, default=default: value if value else default, name(key))
+            else:
+                node(name('camera_' + key), lambda value, first: value if value else first, name(key),
+                     name('camera_' + key, 1))
+        node(name('binning'), lambda b: b if b else 1, name('b'))
+        node(name('pixels_h'), operator.truediv, name('camera_h'), name('binning'))
+        node(name('pixels_v'), operator.truediv, name('camera_v'), name('binning'))
+        node(name('pixel_size'), operator.mul, name('camera_p'), name('binning'))
+        node(name('qe'), lambda q: q, name('camera_q'))
+        node(name('sensor_area'), lambda h, v, p: h * p * v * p, name('pixels_h'), name('pixels_v'), name('pixel_size'))
+        node(name('arcsec_p'), lambda l, p: ARCSEC_PER_RADIAN / l * p / 1000, name('focal_length'), name('pixel_size'))
+        node(name('view_h'), operator.mul, name('pixels_h'), name('arcsec_p'))
+        node(name('view_v'), operator.mul, name('pixels_v'), name('arcsec_p'))
+        node(name('view_a'), operator.mul, name('view_h'), name('view_v'))
+        node(name('extended_object_irradiance'), lambda f: 1 / f ** 2, name('focal_ratio'))
+        node(name('point_object_irradiance'), lambda a, f: a / f ** 2, name('aperture_area'), name('focal_ratio'))
+        node(name('etendue'), lambda a, view: a * view / 1e6, name('aperture_area'), name('view_a'))
+        node(name('pixel_etendue'), lambda a, arcsec_p: a * arcsec_p ** 2, name('aperture_area'), name('arcsec_p'))
+        node(name('pixel_signal'), lambda pe, q, t: pe * q * t, name('pixel_etendue'), name('qe'),
+             name('transmittance_factor'))
+        node(name('object_signal'), lambda a, q, t: a * q * t, name('aperture_area'), name('qe'),
+             name('transmittance_factor'))
+
+    def set(self, setup, key, value):
+        """Change one WHAT_IF_TELESCOPE_KEYS or WHAT_IF_CAMERA_KEYS field of a setup, None for not given."""
+        if key not in WHAT_IF_TELESCOPE_KEYS + WHAT_IF_CAMERA_KEYS:
+            raise CompareError('{} is an unknown telescope or camera field'.format(key))
+        self._check(setup)
+        self.graph.set('{}.{}'.format(setup, key), value)
+
+    def inputs(self):
+        """{(setup, key): value} of every set() field, to restore() later."""
+        return {(n, key): self.graph.get('{}.{}'.format(n, key))
+                for n in range(1, self.count + 1) for key in WHAT_IF_TELESCOPE_KEYS + WHAT_IF_CAMERA_KEYS}
+
+    def restore(self, inputs):
+        """Set the fields back to an inputs() snapshot."""
+        for (n, key), value in inputs.items():
+            self.set(n, key, value)
+
+    def setup(self, n):
+        """The Setup of setup n, computing only what changed since it was last read."""
+        self._check(n)
+        return Setup(*(self.graph.get('{}.{}'.format(n, field)) for field in Setup._fields))
+
+    def ratios(self, a, b):
+        """The Ratios of setup a against setup b, like ratios()."""
+        self._check(a)
+        self._check(b)
+        values = []
+        for metric in RATIO_METRICS:
+            name = '{}/{}.{}'.format(a, b, metric)
+            if name not in self.graph:
+                self.graph.node(name, operator.truediv, '{}.{}'.format(a, metric), '{}.{}'.format(b, metric))
+            values.append(self.graph.get(name))
+        return Ratios(*values)
+
+    def changes(self):
+        """[(name, old, new)] of the inputs, intermediate values and metrics that changed since the previous call."""
+        return self.graph.changes()
+
+    def _check(self, n):
+        if not 1 <= n <= self.count:
+            raise CompareError('{} is not one of the {} setups'.format(n, self.count))
+
+
+class Server(http.server.ThreadingHTTPServer):
+    """
+    Local HTTP service on one warm Gear, a thread per connection with keep-alive, serving SERVER_ENDPOINTS as the
+    README describes. Bad input answers 400 with {"error": ...}, and a sweep is limited to SERVER_SWEEP_ROWS rows.
+    """
+    daemon_threads = True
+
+    def __init__(self, address, gear):
+        super().__init__(address, _Handler)
+        self.gear = gear
+        self.latencies = {}
+        self.lock = threading.Lock()
+
+    def record(self, endpoint, seconds):
+        with self.lock:
+            self.latencies.setdefault(endpoint, collections.deque(maxlen=LATENCY_WINDOW)).append(seconds)
+
+    def stats(self):
+        with self.lock:
+            latencies = {endpoint: sorted(values) for endpoint, values in self.latencies.items()}
+        return {endpoint: dict([('requests', len(values))] + [
+            ('p{}'.format(p), 1000 * values[min(int(len(values) * p / 100), len(values) - 1)]) for p in (50, 90, 99)])
+            for endpoint, values in latencies.items()}
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # keep-alive
+    disable_nagle_algorithm = True  # headers and body are separate writes, do not wait for the ACK in between
+
+    def do_GET(self):
+        self._handle()
+
+    def do_POST(self):
+        self._handle()
+
+    def log_message(self, format, *args):  # quiet, /stats has the numbers
+        pass
+
+    def _handle(self):
+        start = time.perf_counter()
+        url = urllib.parse.urlsplit(self.path)
+        endpoint = url.path.rstrip('/')
+        self.sent = False
+        try:
+            body = self._read_body()
+            query = dict(urllib.parse.parse_qsl(url.query))
+            if endpoint == '/compare':
+                row = json.loads(body) if body.strip() else query
+                result = _compare_row(self.server.gear, row)
+                if isinstance(result, CompareError):
+                    raise result
+                self._send_json(flatten(result))
+            elif endpoint == '/batch':
+                self._send_records(result_record(('line',), {'line': number}, result)
+                                   for number, result in batch(self.server.gear, body.splitlines()))
+            elif endpoint == '/sweep':
+                request = json.loads(body)
+                if not isinstance(request, dict):
+                    raise CompareError('Expected a JSON object')
+                for key in ('base', 'sweep'):
+                    if not isinstance(request.get(key) or {}, dict):
+                        raise CompareError('Expected a JSON object for {}'.format(key))
+                parameters = [(key, sweep_values(str(values), SERVER_SWEEP_ROWS) if not isinstance(values, list)
+                               else values) for key, values in (request.get('sweep') or {}).items()]
+                count = functools.reduce(operator.mul, (len(values) for _, values in parameters), 1)
+                if count > SERVER_SWEEP_ROWS:
+                    raise CompareError('The sweep has {} rows, more than {}'.format(count, SERVER_SWEEP_ROWS))
+                keys = [key for key, _ in parameters]
+                rows = sweep_rows(request.get('base') or {}, parameters)
+                self._send_records(result_record(keys, row, result) for row, result in
+                                   ((row, _compare_row(self.server.gear, row)) for row in rows))
+            elif endpoint == '/query':
+                ranges = {}
+                for key, bounds in query.items():
+                    if key not in SCOPE_QUERY_KEYS and key not in CAMERA_QUERY_KEYS:
+                        raise CompareError('{} is an unknown telescope or camera attribute'.format(key))
+                    low, _, high = bounds.partition(':')
+                    try:
+                        ranges[key] = (float(low) if low else None, float(high) if high else None)
+                    except ValueError:
+                        raise CompareError('Bad range {}={}, expected KEY=MIN:MAX'.format(key, bounds))
+                gear = self.server.gear
+                self._send_json({
+                    'scopes': gear.query_scopes(**{k: v for k, v in ranges.items() if k in SCOPE_QUERY_KEYS}),
+                    'cameras': gear.query_cameras(**{k: v for k, v in ranges.items() if k in CAMERA_QUERY_KEYS})})
+            elif endpoint == '/stats':
+                self._send_json(self.server.stats())
+            else:
+                self._send_json({'error': 'Unknown endpoint {}'.format(url.path)}, 404)
+        except (CompareError, ValueError) as e:  # json and int() errors are ValueErrors too
+            self._send_error(400, e)
+        except Exception as e:
+            self._send_error(500, e)
+            raise
+        finally:
+            self.server.record(endpoint if endpoint in SERVER_ENDPOINTS else 'other', time.perf_counter() - start)
+
+    def _read_body(self):
+        length = self.headers.get('Content-Length')
+        if length is None and self.command == 'POST':
+            self.close_connection = True
+            raise CompareError('Content-Length required')
+        length = int(length or 0)
+        if length < 0:
+            self.close_connection = True
+            raise CompareError('Bad Content-Length {}'.format(length))
+        return self.rfile.read(length).decode()
+
+    def _send_error(self, status, error):
+        """Answer the error, or end a response that already started, which can not change its status."""
+        if self.sent:
+            self.close_connection = True
+        else:
+            self._send_json({'error': str(error)}, status)
+
+    def _send_json(self, data, status=200):
+        body = (json.dumps(data) + '\n').encode()
+        self.sent = True
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_records(self, records):
+        """JSON lines in chunked transfer encoding, so large results stream instead of piling up."""
+        records = iter(records)
+        first = next(records, None)  # errors in the request itself still get a 400
+        self.sent = True
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/x-ndjson')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        chunk = []
+        size = 0
+        for record in itertools.chain([first] if first is not None else [], records):
+            line = (json.dumps(record) + '\n').encode()
+            chunk.append(line)
+            size += len(line)
+            if size >= 65536:
+                self._write_chunk(b''.join(chunk))
+                chunk = []
+                size = 0
+        if chunk:
+            self._write_chunk(b''.join(chunk))
+        self.wfile.write(b'0\r\n\r\n')
+
+    def _write_chunk(self, data):
+        self.wfile.write('{:x}\r\n'.format(len(data)).encode() + data + b'\r\n')
+
+
+def serve(gear, host='127.0.0.1', port=8000):
+    """Run a Server on host and port until interrupted."""
+    with Server((host, port), gear) as server:
+        server.serve_forever()
@@ -0,0 +1,366 @@
+import json
+import socket
+import threading
+import urllib.error
+import urllib.request
+
+import pytest
+
+import compare_telescopes
+from compare_telescopes import CatalogImport, Camera, CompareError, Comparison, Gear, PRODUCT_LABELS, Profile, \
+    Server, SETUP_COLUMNS, Telescope, WhatIf, batch, catalog_entry, compare, cross_product, exposure_grid, mosaic, \
+    monte_carlo, optimize, pareto, ratio_matrix, ratio_table, resolve_setups, seeing_histogram, setup_record, \
+    simulate, skyline, spectral_bands, sweep, timed
+
+
+def test_compare_matches_the_original_script():
+    # the --detail example of the README, numbers as the single file script printed them
+    comparison = compare(Telescope(di=14, f=10.8, o=0.32, t=0.85), Camera(h=4096, v=4096, p=9, q=65),
+                         Telescope(di=11, f=10, o=0.31, t=0.85), Camera(h=4656, v=3520, p=3.8, q=75))
+    setup1, setup2 = comparison.setup1, comparison.setup2
+    assert round(setup1.focal_length) == 3840 and round(setup1.aperture_diameter) == 356
+    assert round(setup1.resolving_power, 3) == 0.354 and round(setup1.plate_scale, 3) == 53.708
+    assert round(setup1.aperture_area, 2) == 89144.84 and round(setup2.aperture_area, 2) == 55419.56
+    assert round(setup1.sensor_area / 1e6, 2) == 1358.95 and round(setup1.arcsec_p, 4) == 0.4834  # μm² here
+    assert round(setup1.etendue, 2) == 349446.26 and round(setup2.etendue, 2) == 71479.81
+    assert round(setup1.pixel_etendue, 2) == 20828.62 and round(setup2.pixel_etendue, 2) == 4361.42
+    assert round(comparison.ratios12.pixel_signal, 2) == 4.14 and round(comparison.ratios21.pixel_signal, 2) == 0.24
+    # the brief line, with telescope 2 copying camera 1
+    ratios = compare(Telescope(d=100, l=500), Camera(h=3000, v=2000, p=4, q=0.8), Telescope(d=80, f=7),
+                     Camera(b=2)).ratios12
+    assert [round(value, 2) for value in ratios[:7]] == [1.25, 1.96, 3.06, 1.96, 0.49, 0.49, 1.56]
+
+
+def test_profile_stage_counts():
+    @timed('outer')
+    def outer():
+        return compare(Telescope(d=200, l=400), Camera(p=3.76), Telescope(d=140, f=7), None)
+
+    with Profile() as profile:
+        for _ in range(3):
+            outer()
+    assert {stage: calls for stage, (calls, _) in profile.stages.items()} == {
+        'outer': 3, 'optics': 6, 'metrics': 12, 'url': 3}
+    report = profile.report()
+    assert sum(stage['seconds'] for stage in report['stages'].values()) <= report['seconds']  # nested time counts once
+    outer()
+    assert profile.stages['outer'][0] == 3
+
+
+@pytest.mark.parametrize('kind, ranges', [
+    ('scopes', {'focal_length': (400, 800)}),
+    ('scopes', {'aperture': (100, None), 'o': (None, 0.3)}),
+    ('scopes', {'f': (5, 5)}),
+    ('cameras', {'p': (3, 4), 'width': (None, 20)}),
+    ('cameras', {'q': (90, 100), 'h': (10000, 1000)}),
+])
+def test_query_ranges(kind, ranges):
+    gear = Gear()
+    query = gear.query_scopes if kind == 'scopes' else gear.query_cameras
+    expected = []
+    for name, entry in getattr(gear, kind).items():
+        values = [Gear._attribute(kind, entry, key) for key in ranges]
+        if all(isinstance(value, (int, float)) and (low is None or value >= low) and (high is None or value <= high)
+               for value, (low, high) in zip(values, ranges.values())):
+            expected.append(name)
+    assert query(**ranges) == sorted(expected)
+    assert len(query()) == len(getattr(gear, kind))
+
+
+@pytest.mark.parametrize('metric, constraints', [
+    ('pixel_signal', {'res': (0.8, 2), 'fovh': (60, None)}),
+    ('pixel_etendue', {'focal_ratio': (None, 6), 'p': (3, 6)}),
+    ('etendue', {'fovv': (None, 90)}),
+    ('object_signal', {'focal_length': (1000, 3000), 'res': (None, 1)}),
+])
+def test_optimize_matches_brute_force(metric, constraints):
+    gear = Gear()
+    reducers, binnings = (1, 0.8), (1, 2)
+    found = optimize(gear, constraints, metric, 5, reducers, binnings)
+    limits, scopes, cameras = compare_telescopes._constraints(gear, constraints)
+    ranges = {'focal_length': 'focal_length', 'focal_ratio': 'focal_ratio', 'res': 'arcsec_p'}
+    values = []
+    for scope in scopes:
+        for reducer in reducers:
+            for camera in cameras:
+                for b in binnings:
+                    try:
+                        setup = compare_telescopes._optimum(gear, scope, reducer, camera, b).setup
+                    except CompareError:
+                        continue
+                    checks = {key: getattr(setup, field) for key, field in ranges.items()}
+                    checks.update(fovh=setup.view_h / 60, fovv=setup.view_v / 60)
+                    if all((limits[key][0] is None or value >= limits[key][0]) and
+                           (limits[key][1] is None or value <= limits[key][1]) for key, value in checks.items()):
+                        values.append(getattr(setup, metric))
+    assert len(found) == 5
+    assert [getattr(optimum.setup, metric) for optimum in found] == pytest.approx(sorted(values, reverse=True)[:5])
+
+
+def _dominated(rows):
+    return [any(all(a <= b for a, b in zip(other, row)) and other != row for other in rows) for row in rows]
+
+
+@pytest.mark.parametrize('block', [1, 7, 1024])
+def test_skyline_matches_reference(block):
+    numpy = pytest.importorskip('numpy')
+    rows = numpy.random.default_rng(block).integers(0, 6, (300, 3)).tolist()
+    rows += rows[:20]  # equal rows are all kept or all dropped
+    assert skyline(rows, block).tolist() == [i for i, dominated in enumerate(_dominated(rows)) if not dominated]
+
+
+def test_pareto_matches_reference():
+    pytest.importorskip('numpy')
+    gear = Gear()
+    constraints = {'aperture': (None, 150), 'p': (3.5, 4.5), 'focal_length': (300, 1000)}
+    reducers, binnings = (1, 0.8), (1, 2)
+    found = pareto(gear, constraints, reducers=reducers, binnings=binnings, jobs=1, chunk=50)
+    _, scopes, cameras = compare_telescopes._constraints(gear, constraints)
+    combinations, rows = [], []
+    for scope in scopes:
+        for reducer in reducers:
+            for camera in cameras:
+                for b in binnings:
+                    try:
+                        setup = compare_telescopes._optimum(gear, scope, reducer, camera, b).setup
+                    except CompareError:
+                        continue
+                    if 300 <= setup.focal_length <= 1000:
+                        combinations.append((scope, reducer, camera, b))
+                        rows.append((-setup.pixel_signal, -setup.view_h * setup.view_v, abs(setup.arcsec_p - 1),
+                                     setup.aperture_diameter))
+    expected = {combination for combination, dominated in zip(combinations, _dominated(rows)) if not dominated}
+    assert len(expected) > 1
+    assert {optimum[:4] for optimum in found} == expected
+    signals = [optimum.setup.pixel_signal for optimum in found]
+    assert signals == sorted(signals, reverse=True)
+
+
+def test_resolve_ota_cache_keeps_types():
+    records = set()
+    for order in ((100, 100.0), (100.0, 100)):
+        compare_telescopes.resolve_ota.cache_clear()
+        for d in order:
+            records.add(json.dumps(compare(Telescope(d=d, l=500)).setup1._asdict()))
+    assert len(records) == 1
+
+
+def test_batch_error_rows(monkeypatch):
+    lines = ['{"d1": 100, "o1": 1}', 'not json', '{"d1": 100, "d2": 80}']
+    results = list(batch(Gear(), lines))
+    assert [number for number, _ in results] == [1, 2, 3]
+    assert str(results[0][1]) == 'Telescope 1 obstruction ratio 1.0 is not between 0 and 1'
+    assert isinstance(results[1][1], CompareError)
+    assert results[2][1].ratios12.aperture_area == pytest.approx(100 ** 2 / 80 ** 2)
+    monkeypatch.setattr(compare_telescopes, 'compare', lambda *specs: 1 / 0)
+    assert isinstance(list(batch(Gear(), lines[2:]))[0][1], CompareError)
+
+
+def test_sweep_list_rows():
+    rows = [{'s1': 'RASA8', 'c1': 'ASI2600', 's2': 'TEC140'}, {'d1': 200, 'l1': 1000, 'd2': 100}]
+    results = list(sweep(rows, jobs=1, chunk_size=1))
+    assert [row for row, _ in results] == rows
+    assert all(isinstance(result, Comparison) for _, result in results)
+
+@pytest.mark.parametrize('jobs', [1, 2])
+def test_sweep_error_rows(jobs, monkeypatch):
+    rows = [{'d1': 100, 'f1': 5, 'o1': o} for o in (0, 0.5, 1)]
+    results = [result for _, result in sweep(rows, jobs=jobs)]
+    assert isinstance(results[1], Comparison)
+    assert str(results[2]) == 'Telescope 1 obstruction ratio 1.0 is not between 0 and 1'
+    monkeypatch.setattr(compare_telescopes, 'compare', lambda *specs: 1 / 0)
+    assert all(isinstance(result, CompareError) for _, result in sweep(rows, jobs=jobs))
+
+
+@pytest.mark.parametrize('row', [
+    {'name': 'cam', 'kind': 'camera', 'h': 'abc', 'v': 4000, 'p': 3.76},
+    {'name': 'cam', 'kind': 'camera', 'h': 'nan', 'v': 4000, 'p': 3.76},
+    {'name': 'cam', 'kind': 'camera', 'h': 6000, 'v': 'inf', 'p': 3.76},
+    {'name': 'scope', 'kind': 'scope', 'd': float('inf'), 'f': 5},
+    {'name': 'scope', 'kind': 'scope', 'd': 'Infinity', 'f': 5},
+    {'name': 'scope', 'kind': 'scope', 'd': float('nan'), 'f': 5},
+])
+def test_catalog_entry_rejects_bad_numbers(row):
+    with pytest.raises(CompareError):
+        catalog_entry(row)
+
+
+def test_catalog_import_rejects_bad_csv_rows():
+    catalog = CatalogImport()
+    lines = ['name,kind,h,v,p', 'a,camera,abc,4000,3.76', 'b,camera,nan,4000,3.76', 'c,camera,6000,4000.0,3.76']
+    results = [result for _, result in catalog.read(lines)]
+    assert [isinstance(result, CompareError) for result in results] == [True, True, False]
+    assert catalog.catalog()['cameras'] == {'c': {'h': 6000, 'v': 4000, 'p': 3.76}}
+
+
+def test_catalog_import_merges_sensor_case():
+    catalog = CatalogImport()
+    catalog.add({'name': 'cam-a', 'kind': 'camera', 'm': 'zwo', 's': 'IMX571', 'h': 6248, 'v': 4176, 'p': 3.76})
+    kind, name, status = catalog.add(
+        {'name': 'cam-b', 'kind': 'camera', 'm': 'ZWO ', 's': 'imx571', 'h': 6248, 'v': 4176, 'p': 3.76})
+    assert status == 'duplicate of cam-a'
+    assert catalog.catalog()['cameras']['cam-a']['alias1'] == 'cam-b'
+
+
+def test_gear_json_cache(tmp_path):
+    file = tmp_path / 'gear.json'
+    file.write_text(json.dumps({'scopes': {'RASA8': {'d': 200, 'l': 400}}, 'cameras': {}}))
+    gear = Gear(file=str(file))
+    assert json.loads((tmp_path / 'gear.json.cache').read_text())['data'][2]['rasa8'] == {'d': 200, 'l': 400}
+    assert Gear(file=str(file)).collisions == gear.collisions == [('scopes', 'rasa8')]
+    (tmp_path / 'gear.json.cache').write_bytes(b'\x80\x04not json')
+    assert Gear(file=str(file)).scopes['rasa8'] == {'d': 200, 'l': 400}
+
+
+def test_seeing_histogram_json_cache(tmp_path):
+    log = tmp_path / 'seeing.csv'
+    log.write_text('time,fwhm\n1,2.5\n2,2.5\n3,3.0\n')
+    histogram = seeing_histogram(str(log))
+    stored = json.loads((tmp_path / 'seeing.csv.hist').read_text())
+    assert stored['data'] == histogram
+    assert histogram[250] == 2 and histogram[300] == 1
+    (tmp_path / 'seeing.csv.hist').write_bytes(b'\x80\x04not json')
+    assert seeing_histogram(str(log)) == histogram
+
+
+def test_monte_carlo():
+    pytest.importorskip('numpy')
+    gear = Gear()
+    specs = [(gear.telescope_spec('RASA8'), gear.camera_spec('ASI2600')), (gear.telescope_spec('TEC140'), None)]
+    setups = resolve_setups(specs)
+    rows = {row['metric']: row for row in monte_carlo(setups, specs, [{'q': (0.05, ('setup', 1))}, {}], 20000)}
+    copied = rows['pixel_signal']  # camera 2 copies camera 1 and its QE samples
+    assert copied['low'] == pytest.approx(copied['nominal']) and copied['high'] == pytest.approx(copied['nominal'])
+    rows = {row['metric']: row for row in monte_carlo(setups, specs, [{'d': (5, ('setup', 1))}, {}], 20000)}
+    varied = rows['pixel_signal']
+    assert varied['low'] < varied['nominal'] < varied['high']
+    assert varied['median'] == pytest.approx(varied['nominal'], rel=0.01)
+    specs = [(Telescope(d=100, f=5), None), (Telescope(d=80, f=6), None)]
+    with pytest.raises(CompareError):
+        monte_carlo(resolve_setups(specs), specs, [{'l': (10, ('setup', 1))}, {}], 100)
+
+
+def test_simulate_matches_predicted_rates():
+    pytest.importorskip('numpy')
+    specs = [(Telescope(d=200, l=400, o=0.4), Camera(h=400, v=300, p=3.76, q=80)),
+             (Telescope(d=100, f=5), Camera(h=300, v=200, p=5, q=60, b=2))]
+    setups = resolve_setups(specs)
+    cameras = [camera for _, camera in specs]
+    results = simulate(setups, cameras, stars=100, magnitude=12, tile=128, jobs=1)
+    for result in results:
+        assert result['stars'] > 0
+        assert result['star_rate'] == pytest.approx(result['predicted_star_rate'], rel=0.01)
+        assert result['pixel_rate'] == pytest.approx(result['predicted_pixel_rate'], rel=0.01)
+        assert 0 < result['peak_rate'] <= result['predicted_peak_rate']
+    assert simulate(setups, cameras, stars=100, magnitude=12, tile=128, jobs=2) == results
+
+
+def test_spectral_bands_copy_curves():
+    specs = [(Telescope(d=100, l=500, tc=((400, 0.9), (700, 0.6))), Camera(q=0.8, qc=((400, 0.3), (700, 0.9)))),
+             (Telescope(f=6), Camera(b=2))]
+    setups = resolve_setups(specs)
+    bands = [spectral_bands(setup, *spec, first=specs[0]) for setup, spec in zip(setups, specs)]
+    for name, band in bands[0].items():
+        assert bands[1][name].qe == pytest.approx(band.qe)
+        assert bands[1][name].transmittance_factor == pytest.approx(band.transmittance_factor)
+    assert bands[1]['B'].qe < bands[1]['R'].qe
+
+
+def test_what_if_restore():
+    what_if = WhatIf([(Telescope(d=100, f=6), Camera(p=3.8)), (Telescope(d=80, f=7), None)])
+    before = what_if.setup(2)
+    inputs = what_if.inputs()
+    what_if.set(2, 'l', 1000)
+    with pytest.raises(CompareError):
+        what_if.setup(2)
+    what_if.restore(inputs)
+    what_if.set(1, 'b', 2)
+    assert what_if.setup(2) == before
+
+
+@pytest.fixture(scope='module')
+def server():
+    service = Server(('127.0.0.1', 0), Gear())
+    thread = threading.Thread(target=service.serve_forever, daemon=True)
+    thread.start()
+    yield 'http://127.0.0.1:{}'.format(service.server_address[1])
+    service.shutdown()
+    service.server_close()
+
+
+@pytest.mark.parametrize('path, body', [
+    ('/sweep', {'base': [1]}),
+    ('/sweep', {'base': {'d1': 100, 'f1': 5}, 'sweep': [1]}),
+    ('/sweep', [1]),
+    ('/query?focal_length=400:800&bogus=1:2', None),
+    ('/compare?d1=100&o1=1', None),
+    ('/sweep', {'sweep': {'d1': '1:1000:1', 'l1': '1:2000:1'}}),
+])
+def test_server_bad_requests(server, path, body):
+    data = json.dumps(body).encode() if body is not None else None
+    with pytest.raises(urllib.error.HTTPError) as error:
+        urllib.request.urlopen(server + path, data, timeout=10)
+    assert error.value.code == 400
+    assert 'error' in json.loads(error.value.read())
+
+
+@pytest.mark.parametrize('header', [b'Content-Length: -1\r\n', b''])
+def test_server_bad_content_length(server, header):
+    host, port = server.rpartition('/')[2].split(':')
+    with socket.create_connection((host, int(port)), timeout=10) as connection:
+        connection.sendall(b'POST /compare HTTP/1.1\r\nHost: localhost\r\n' + header + b'\r\n')
+        assert connection.recv(65536).startswith(b'HTTP/1.1 400 ')
+
+
+def test_server_sweep_error_rows(server):
+    body = json.dumps({'base': {'d1': 100, 'f1': 5}, 'sweep': {'o1': '0:1:0.25'}}).encode()
+    with urllib.request.urlopen(server + '/sweep', body, timeout=10) as response:
+        records = [json.loads(line) for line in response.read().splitlines()]
+    assert [record['o1'] for record in records] == [0, 0.25, 0.5, 0.75, 1]
+    assert [record.get('error') for record in records].count(None) == 4
+
+
+def test_setup_records():
+    gear = Gear()
+    setups = resolve_setups([(gear.telescope_spec('RASA8'), gear.camera_spec('ASI2600')),
+                             (gear.telescope_spec('TEC140'), gear.camera_spec('ASI6200', b=2))])
+    records = [setup_record(n, setup, ratios) for n, (setup, ratios) in enumerate(zip(setups, ratio_table(setups, 0)), 1)]
+    assert [tuple(record) for record in records] == [SETUP_COLUMNS] * 2
+    assert records[0]['ratio_pixel_signal'] == 1
+    assert records[1]['binning'] == 2
+
+
+@pytest.mark.parametrize('scope, camera', [('HUBBLE', 'WFC3'), ('RASA8', 'ASI2600')])
+def test_matrix_own_cell(scope, camera):
+    gear = Gear()
+    telescope, sensor = gear.telescope_spec(scope), gear.camera_spec(camera)
+    baseline = cross_product({'1': telescope._asdict()}, {'1': sensor._asdict()}, [telescope.r], [sensor.b])
+    product = cross_product(gear.scopes, gear.cameras, [1], [1])
+    ratios = sum(ratio_matrix(product, baseline, 'pixel_signal'), [])
+    cells = dict(zip(zip(product['scope'], product['camera']), ratios))
+    key = (gear.name('scopes', scope), gear.name('cameras', camera))
+    assert cells[key] == pytest.approx(1)
+    optimum = compare_telescopes._optimum(gear, key[0], 1, key[1], 1)
+    assert compare(telescope, sensor).setup1.pixel_signal == pytest.approx(optimum.setup.pixel_signal)
+
+
+def test_numpy_and_python_paths_agree(monkeypatch):
+    pytest.importorskip('numpy')
+    gear = Gear()
+    specs = [(gear.telescope_spec('RASA8'), gear.camera_spec('ASI2600', b=2)), (gear.telescope_spec('TEC140'), None)]
+    setups = resolve_setups(specs)
+    lines = ['name,width,height', 'M31,190,60', 'bad,,', 'M42,85,60']
+
+    def run():
+        return (cross_product(gear.scopes, gear.cameras, (1, 0.8), (1, 2)),
+                exposure_grid(setups, [camera for _, camera in specs], (18, 21), (20, 22, 24)),
+                list(mosaic(setups, lines, 0.15)))
+
+    fast = run()
+    monkeypatch.setattr(compare_telescopes, '_optional_numpy', lambda: None)
+    slow = run()
+    assert fast[1:] == slow[1:]
+    assert fast[0].keys() == slow[0].keys()
+    for key in fast[0]:
+        expected = slow[0][key] if key in PRODUCT_LABELS else pytest.approx(slow[0][key], rel=1e-12)
+        assert fast[0][key] == expected